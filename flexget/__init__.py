@@ -18,7 +18,7 @@ def main(args=None):
 
     logger.initialize()
 
-    plugin.load_plugins()
+    plugin.load_plugins(lazy=True)
 
     options = get_parser().parse_args(args)
 
@@ -1,6 +1,7 @@
 from __future__ import unicode_literals, division, absolute_import
 from collections import defaultdict
 from datetime import datetime
+import copy
 import os
 import re
 import urlparse
@@ -14,6 +15,12 @@ from flexget.utils.tools import parse_timedelta
 
 schema_paths = {}
 
+# Schemas resolved by `resolve_ref`, valid until a schema is registered
+_resolved_refs = {}
+
+# Parts of the root config which last passed validation, see `process_config`
+_valid_config_parts = {}
+
 
 # TODO: Rethink how config key and schema registration work
 def register_schema(path, schema):
@@ -24,6 +31,8 @@ def register_schema(path, schema):
     :param schema: The schema, or function which returns the schema
     """
     schema_paths[path] = schema
+    _resolved_refs.clear()
+    _valid_config_parts.clear()
 
 
 # Validator that handles root structure of config.
@@ -76,11 +85,14 @@ def resolve_ref(uri):
     """
     Finds and returns a schema pointed to by `uri` that has been registered in the register_schema function.
     """
+    if uri in _resolved_refs:
+        return _resolved_refs[uri]
     parsed = urlparse.urlparse(uri)
     if parsed.path in schema_paths:
         schema = schema_paths[parsed.path]
         if callable(schema):
-            return schema(**dict(urlparse.parse_qsl(parsed.query)))
+            schema = schema(**dict(urlparse.parse_qsl(parsed.query)))
+        _resolved_refs[uri] = schema
         return schema
     raise jsonschema.RefResolutionError("%s could not be resolved" % uri)
 
@@ -88,21 +100,16 @@ def resolve_ref(uri):
 def process_config(config, schema=None, set_defaults=True):
     """
     Validates the config, and sets defaults within it if `set_defaults` is set.
-    If schema is not given, uses the root config schema.
+    If schema is not given, uses the root config schema. In that case each task and other root level key is
+    validated on its own, and those which have not changed since they last passed validation are skipped.
 
     :returns: A list with :class:`jsonschema.ValidationError`s if any
 
     """
     if schema is None:
-        schema = get_schema()
-    resolver = RefResolver.from_schema(schema)
-    validator = SchemaValidator(schema, resolver=resolver, format_checker=format_checker)
-    if set_defaults:
-        validator.VALIDATORS['properties'] = validate_properties_w_defaults
-    try:
-        errors = list(validator.iter_errors(config))
-    finally:
-        validator.VALIDATORS['properties'] = jsonschema.Draft4Validator.VALIDATORS['properties']
+        errors = _process_root_config(config, set_defaults)
+    else:
+        errors = list(_iter_errors(config, schema, schema, set_defaults))
     # Customize the error messages
     for e in errors:
         set_error_message(e)
@@ -110,6 +117,58 @@ def process_config(config, schema=None, set_defaults=True):
     return errors
 
 
+def _iter_errors(instance, schema, root_schema, set_defaults):
+    validator_class = DefaultsValidator if set_defaults else SchemaValidator
+    validator = validator_class(schema, resolver=RefResolver.from_schema(root_schema), format_checker=format_checker)
+    return validator.iter_errors(instance)
+
+
+def _is_mapping_schema(schema):
+    """Tells whether `schema` is a dict of items which all match the same schema, like the tasks."""
+    return (schema.get('type') == 'object' and isinstance(schema.get('additionalProperties'), dict) and
+            set(schema) <= set(['type', 'additionalProperties', 'title', 'description']))
+
+
+def _process_root_config(config, set_defaults):
+    root_schema = get_schema()
+    if not isinstance(config, dict):
+        return list(_iter_errors(config, root_schema, root_schema, set_defaults))
+    # First check the root level keys themselves, leaving their values for later
+    shallow_schema = dict(root_schema, properties={})
+    for key, subschema in root_schema['properties'].iteritems():
+        shallow = dict((k, subschema[k]) for k in ['default'] if k in subschema)
+        if _is_mapping_schema(subschema):
+            shallow['type'] = 'object'
+        shallow_schema['properties'][key] = shallow
+    errors = list(_iter_errors(config, shallow_schema, root_schema, set_defaults))
+
+    parts = []
+    for key, subschema in root_schema['properties'].iteritems():
+        if key not in config:
+            continue
+        if _is_mapping_schema(subschema):
+            if isinstance(config[key], dict):
+                parts.extend(((key, name), config[key], name, subschema['additionalProperties'])
+                             for name in config[key])
+        else:
+            parts.append(((key,), config, key, subschema))
+
+    for path, parent, key, schema in parts:
+        valid = _valid_config_parts.get((set_defaults, path))
+        if valid is not None and valid[0] == parent[key]:
+            parent[key] = copy.deepcopy(valid[1])
+            continue
+        raw = copy.deepcopy(parent[key])
+        part_errors = list(_iter_errors(parent[key], schema, root_schema, set_defaults))
+        for e in part_errors:
+            e.path.extendleft(reversed(path))
+        if part_errors:
+            errors.extend(part_errors)
+        else:
+            _valid_config_parts[(set_defaults, path)] = (raw, copy.deepcopy(parent[key]))
+    return errors
+
+
 def parse_time(time_string):
     """Parse a time string from the config into a :class:`datetime.time` object."""
     formats = ['%I:%M %p', '%H:%M', '%H:%M:%S']
@@ -326,3 +385,6 @@ validators = {
 }
 
 SchemaValidator = jsonschema.validators.extend(jsonschema.Draft4Validator, validators)
+
+# Also fills in defaults from the schema while validating
+DefaultsValidator = jsonschema.validators.extend(SchemaValidator, {'properties': validate_properties_w_defaults})
@@ -3,6 +3,7 @@ from exceptions import Exception, UnicodeDecodeError, TypeError, KeyError
 import logging
 import copy
 import functools
+import weakref
 
 from flexget.plugin import PluginError
 from flexget.utils.imdb import extract_id, make_url
@@ -10,6 +11,8 @@ from flexget.utils.template import render_from_entry
 
 log = logging.getLogger('entry')
 
+_missing = object()
+
 
 class EntryUnicodeError(Exception):
     """This exception is thrown when trying to set non-unicode compatible field value to entry."""
@@ -30,20 +33,57 @@ class LazyField(object):
     ever.
 
     Stores callback function(s) to which populates :class:`Entry` fields.
-    Callback is ran when it's called or to get a string representation."""
+    Callback is ran when it's called or to get a string representation.
+
+    A callback may come with a prefetch function, which is given all the entries of the task still waiting on
+    that callback the first time any of them is evaluated. This allows lookups to be done in bulk."""
 
-    def __init__(self, entry, field, func):
+    def __init__(self, entry, field, func, prefetch=None):
         self.entry = entry
         self.field = field
         self.funcs = [func]
+        self.prefetch = {}
+        if prefetch:
+            self.prefetch[func] = prefetch
 
     def __call__(self):
         # Return a result from the first lookup function which succeeds
         for func in self.funcs[:]:
+            prefetch = self.prefetch.get(func)
+            if prefetch:
+                self.run_prefetch(func, prefetch)
+                if dict.get(self.entry, self.field) is not self:
+                    # Field was populated by the prefetch
+                    result = self.entry[self.field]
+                    if result is not None:
+                        return result
             result = func(self.entry, self.field)
             if result is not None:
                 return result
 
+    def run_prefetch(self, func, prefetch):
+        """Runs `prefetch` for this entry and all other entries of the task that are pending on `func`."""
+        entries = [self.entry]
+        self.entry.pop_prefetch(func)
+        task = self.entry.task
+        if task is not None:
+            entries.extend(e for e in task.all_entries if e is not self.entry and e.pop_prefetch(func))
+        log.debug('prefetching lazy fields for %s entries' % len(entries))
+        try:
+            prefetch(entries)
+        except Exception as e:
+            # Entries not populated by prefetch are still looked up one at a time
+            log.error('Prefetching lazy fields failed: %s' % e)
+            log.debug('prefetch traceback', exc_info=True)
+
+    def bind(self, entry):
+        """Returns a copy of this lazy field which populates `entry` instead."""
+        lazy = copy.copy(self)
+        lazy.entry = entry
+        lazy.funcs = self.funcs[:]
+        lazy.prefetch = self.prefetch.copy()
+        return lazy
+
     def __str__(self):
         return str(self())
 
@@ -68,9 +108,14 @@ class Entry(dict):
     and trigger :meth:`~flexget.task.Task.abort`.
     """
 
+    # Weak references to the containers holding this entry, which are told about state and field changes
+    _containers = ()
+    _current_state = 'undecided'
+
     def __init__(self, *args, **kwargs):
         self.traces = []
         self.snapshots = {}
+        self._containers = []
         self._state = 'undecided'
         self._hooks = {'accept': [], 'reject': [], 'fail': [], 'complete': []}
         self.task = None
@@ -83,6 +128,41 @@ class Entry(dict):
         # Make sure constructor does not escape our __setitem__ enforcement
         self.update(*args, **kwargs)
 
+    def __getstate__(self):
+        # Containers are not carried over to copies
+        state = self.__dict__.copy()
+        state.pop('_containers', None)
+        return state
+
+    def __setstate__(self, state):
+        if '_state' in state:
+            state['_current_state'] = state.pop('_state')
+        self.__dict__.update(state)
+        self._containers = []
+
+    def _add_container(self, container):
+        self._containers.append(weakref.ref(container))
+
+    def _remove_container(self, container):
+        self._containers = [ref for ref in self._containers if ref() is not None and ref() is not container]
+
+    def _notify_containers(self, method, *args):
+        for ref in self._containers:
+            container = ref()
+            if container is not None:
+                getattr(container, method)(self, *args)
+
+    @property
+    def _state(self):
+        return self._current_state
+
+    @_state.setter
+    def _state(self, state):
+        old_state = self._current_state
+        self._current_state = state
+        if self._containers and state != old_state:
+            self._notify_containers('entry_state_changed', old_state)
+
     def trace(self, message, operation=None, plugin=None):
         """
         Adds trace message to the entry which should contain useful information about why
@@ -243,7 +323,12 @@ class Entry(dict):
         except Exception as e:
             log.debug('trying to debug key `%s` value threw exception: %s' % (key, e))
 
-        dict.__setitem__(self, key, value)
+        if self._containers:
+            old_value = dict.get(self, key, _missing)
+            dict.__setitem__(self, key, value)
+            self._notify_containers('entry_field_changed', key, old_value)
+        else:
+            dict.__setitem__(self, key, value)
 
     def update(self, *args, **kwargs):
         """Overridden so our __setitem__ is not avoided."""
@@ -295,7 +380,7 @@ class Entry(dict):
         """Will cause lazy field lookup to occur and will return false if a field exists but is None."""
         return self.get(key) is not None
 
-    def register_lazy_fields(self, fields, func):
+    def register_lazy_fields(self, fields, func, prefetch=None):
         """Register a list of fields to be lazily loaded by callback func.
 
         :param list fields:
@@ -304,14 +389,32 @@ class Entry(dict):
           Callback function which is called when lazy field needs to be evaluated.
           Function call will get params (entry, field).
           See :class:`LazyField` class for more details.
+        :param prefetch:
+          Optional function which is called with a list of all the task's entries pending on `func`, before
+          the first one of them is evaluated. It should populate as many of those entries as it can at once.
         """
         for field in fields:
             if self.is_lazy(field):
                 # If the field is already a lazy field, append this function to it's list of functions
-                dict.get(self, field).funcs.append(func)
+                lazy_field = dict.get(self, field)
+                lazy_field.funcs.append(func)
+                if prefetch:
+                    lazy_field.prefetch[func] = prefetch
             elif not self.get(field, eval_lazy=False):
                 # If it is not a lazy field, and isn't already populated, make it a lazy field
-                self[field] = LazyField(self, field, func)
+                self[field] = LazyField(self, field, func, prefetch)
+
+    def pop_prefetch(self, func):
+        """
+        Removes pending prefetch of `func` from all lazy fields of this entry.
+
+        :return: True if there was a prefetch pending
+        """
+        pending = False
+        for value in self.itervalues():
+            if isinstance(value, LazyField) and value.prefetch.pop(func, None):
+                pending = True
+        return pending
 
     def unregister_lazy_fields(self, fields, func):
         """
@@ -328,6 +431,7 @@ class Entry(dict):
                 if func in lazy_funcs:
                     removed += 1
                     lazy_funcs.remove(func)
+                    dict.get(self, field).prefetch.pop(func, None)
                 if not lazy_funcs:
                     self[field] = None
         return removed
@@ -376,6 +480,22 @@ class Entry(dict):
                 log.warning('Snapshot `%s` is being overwritten for `%s`' % (name, self['title']))
             self.snapshots[name] = snapshot
 
+    def fresh_copy(self):
+        """
+        Returns a new undecided entry with the fields of this one. State, traces, hooks and snapshots are not copied.
+
+        Much cheaper than :meth:`take_snapshot`, values are shared with this entry, except for lists, dicts and sets
+        which are copied one level deep, and lazy fields which are bound to the new entry.
+        """
+        new = type(self)()
+        for field, value in self.iteritems():
+            if isinstance(value, LazyField):
+                value = value.bind(new)
+            elif isinstance(value, (list, dict, set)):
+                value = copy.copy(value)
+            dict.__setitem__(new, field, value)
+        return new
+
     def update_using_map(self, field_map, source_item, ignore_none=False):
         """
         Populates entry fields from a source object using a dictionary that maps from entry field names to
@@ -6,6 +6,7 @@ import signal
 import os
 import sys
 import shutil
+import sqlite3
 import logging
 import threading
 import pkg_resources
@@ -15,12 +16,14 @@ from datetime import datetime, timedelta
 import sqlalchemy
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.pool import SingletonThreadPool
+from sqlalchemy.pool import SingletonThreadPool, QueuePool
 from sqlalchemy.exc import OperationalError
 
 # These need to be declared before we start importing from other flexget modules, since they might import them
 Base = declarative_base()
 Session = sessionmaker()
+# Sessions for reading only, they do not have to wait for running tasks to commit
+ReadSession = sessionmaker()
 
 from flexget import config_schema, db_schema
 from flexget.event import fire_event
@@ -33,6 +36,13 @@ log = logging.getLogger('manager')
 manager = None
 DB_CLEANUP_INTERVAL = timedelta(days=7)
 
+# Set on every SQLite connection. With write-ahead logging readers never wait for the writer, and commits need not
+# be synced to disk before the next checkpoint
+SQLITE_PRAGMAS = ['journal_mode=WAL', 'synchronous=NORMAL', 'cache_size=-16000', 'mmap_size=268435456',
+                  'temp_store=MEMORY']
+# Number of read only connections kept open for the webui and cli commands
+READ_POOL_SIZE = 5
+
 
 @sqlalchemy.event.listens_for(Session, 'before_commit')
 def before_commit(session):
@@ -40,6 +50,73 @@ def before_commit(session):
         log.debug('BUG?: Database writes should not be tried when there is no database lock.')
 
 
+# Serializes database writes between threads (e.g. concurrently running tasks.) Each thread has its own connection, which
+# takes the lock before its first write statement and holds it until the transaction is committed or rolled back. Whether
+# a connection holds the lock is kept in the info of the connection, a thread may use more than one.
+db_write_lock = threading.RLock()
+
+
+def acquire_write_lock(conn, cursor, statement, parameters, context, executemany):
+    if conn.info.get('write_lock_held') or statement.lstrip()[:6].upper() in ('SELECT', 'PRAGMA'):
+        return
+    db_write_lock.acquire()
+    conn.info['write_lock_held'] = True
+
+
+def release_write_lock(conn):
+    _release_write_lock(conn.info)
+
+
+def release_write_lock_on_reset(dbapi_connection, connection_record):
+    _release_write_lock(connection_record.info)
+
+
+def _release_write_lock(info):
+    if info.pop('write_lock_held', False):
+        db_write_lock.release()
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record, read_only=False):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS + (['query_only=ON'] if read_only else []):
+            cursor.execute('PRAGMA %s' % pragma)
+    finally:
+        cursor.close()
+
+
+def set_read_only_pragmas(dbapi_connection, connection_record):
+    set_sqlite_pragmas(dbapi_connection, connection_record, read_only=True)
+
+
+def remove_database(filename):
+    """Removes SQLite database `filename` along with its write-ahead log and shared memory files."""
+    for path in (filename, filename + '-wal', filename + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def copy_database(source, destination):
+    """
+    Copies SQLite database `source` to `destination` in one read transaction. Unlike copying the file, this includes
+    commits still in the write-ahead log, and is consistent while another process is writing to it.
+    """
+    remove_database(destination)
+    conn = sqlite3.connect(source, isolation_level=None)
+    try:
+        if sqlite3.sqlite_version_info >= (3, 27, 0):
+            conn.execute('VACUUM INTO ?', (destination,))
+            return
+        conn.execute('BEGIN')
+        copy = sqlite3.connect(destination)
+        try:
+            copy.executescript('\n'.join(conn.iterdump()))
+        finally:
+            copy.close()
+    finally:
+        conn.close()
+
+
 class Manager(object):
 
     """Manager class for FlexGet
@@ -105,6 +182,7 @@ class Manager(object):
         self.config_path = None
         self.db_filename = None
         self.engine = None
+        self.read_engine = None
         self.lockfile = None
         self.database_uri = None
         self.db_upgraded = False
@@ -504,7 +582,10 @@ class Manager(object):
                 db_test_filename = os.path.join(self.config_base, 'test-%s.sqlite' % self.config_name)
                 log.info('Test mode, creating a copy from database ...')
                 if os.path.exists(self.db_filename):
-                    shutil.copy(self.db_filename, db_test_filename)
+                    copy_database(self.db_filename, db_test_filename)
+                else:
+                    # Log files of an earlier test database would be applied to the new one
+                    remove_database(db_test_filename)
                 self.db_filename = db_test_filename
                 # Different database, different lock file
                 self.lockfile = os.path.join(self.config_base, '.test-%s-lock' % self.config_name)
@@ -531,7 +612,25 @@ class Manager(object):
                   'You can try installing `pysqlite`. If you have compiled python yourself, '
                   'recompile it with SQLite support.', file=sys.stderr)
             sys.exit(1)
+        sqlalchemy.event.listen(self.engine, 'before_cursor_execute', acquire_write_lock)
+        sqlalchemy.event.listen(self.engine, 'commit', release_write_lock)
+        sqlalchemy.event.listen(self.engine, 'rollback', release_write_lock)
+        sqlalchemy.event.listen(self.engine.pool, 'reset', release_write_lock_on_reset)
+        if self.engine.dialect.name == 'sqlite':
+            sqlalchemy.event.listen(self.engine, 'connect', set_sqlite_pragmas)
         Session.configure(bind=self.engine)
+        # All writes go through the connections of the main engine, serialized by db_write_lock. Reads get a pool
+        # of their own, which WAL lets run while a task is writing. In-memory databases can not be shared.
+        if self.engine.dialect.name == 'sqlite' and self.engine.url.database not in (None, '', ':memory:'):
+            self.read_engine = sqlalchemy.create_engine(self.database_uri,
+                                                        echo=self.options.debug_sql,
+                                                        poolclass=QueuePool,
+                                                        pool_size=READ_POOL_SIZE,
+                                                        connect_args={'check_same_thread': False})
+            sqlalchemy.event.listen(self.read_engine, 'connect', set_read_only_pragmas)
+        else:
+            self.read_engine = self.engine
+        ReadSession.configure(bind=self.read_engine)
         # create all tables, doesn't do anything to existing tables
         try:
             def before_table_create(event, target, bind, tables=None, **kw):
@@ -730,13 +829,15 @@ class Manager(object):
         fire_event('manager.shutdown', self)
         if not self.unit_test:  # don't scroll "nosetests" summary results when logging is enabled
             log.debug('Shutting down')
+        if self.read_engine is not self.engine:
+            self.read_engine.dispose()
         self.engine.dispose()
         # remove temporary database used in test mode
         if self.options.test:
             if not 'test' in self.db_filename:
                 raise Exception('trying to delete non test database?')
             if self._has_lock:
-                os.remove(self.db_filename)
+                remove_database(self.db_filename)
                 log.info('Removed test database')
         if not self.unit_test:  # don't scroll "nosetests" summary results when logging is enabled
             log.debug('Shutdown completed')
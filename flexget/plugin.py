@@ -5,16 +5,21 @@ from __future__ import unicode_literals, division, absolute_import
 import sys
 import os
 import re
+import json
 import logging
 import time
 import pkgutil
+import importlib
+import tempfile
+import threading
 import warnings
 from itertools import ifilter
 
 from requests import RequestException
 
 from flexget import config_schema
-from flexget.event import add_event_handler as add_phase_handler, fire_event, remove_event_handlers
+from flexget.event import (add_event_handler as add_phase_handler, fire_event, get_events, remove_event_handlers,
+                           _events)
 from flexget import plugins as plugins_pkg
 
 log = logging.getLogger('plugin')
@@ -159,6 +164,15 @@ def priority(value):
 
 DEFAULT_PRIORITY = 128
 
+
+def requery_on_rerun(func):
+    """
+    Decorator for input phase methods which need to run again when the task is rerun. Other inputs are only ran
+    once per execution, reruns get fresh copies of the entries they produced the first time.
+    """
+    func.requery_on_rerun = True
+    return func
+
 plugin_contexts = ['task', 'root']
 
 # task phases, in order of their execution; note that this can be extended by
@@ -182,6 +196,12 @@ _loaded_plugins = {}
 _plugin_options = []
 _new_phase_queue = {}
 
+# Bump when the format of the plugin manifest changes
+MANIFEST_VERSION = 1
+
+# Serializes importing plugin modules on demand
+_lazy_load_lock = threading.RLock()
+
 
 def register_task_phase(name, before=None, after=None):
     """Adds a new task phase to the available phases."""
@@ -271,7 +291,13 @@ class PluginInfo(dict):
         self.plugin_class = plugin_class
         self.instance = None
 
-        if self.name in plugins:
+        existing = plugins.get(self.name)
+        if isinstance(existing, LazyPluginInfo):
+            # Module of a plugin from the manifest was imported, take over from the stand-in
+            self.builtin = existing.builtin
+            self.phase_handlers = existing.phase_handlers
+            plugins[self.name] = self
+        elif existing is not None:
             PluginInfo.dupe_counter += 1
             log.critical('Error while registering plugin %s. A plugin with the same name is already registered' %
                          self.name)
@@ -313,6 +339,11 @@ class PluginInfo(dict):
         """(Re)build phase_handlers in this plugin"""
         for phase, method_name in phase_methods.iteritems():
             if phase in self.phase_handlers:
+                event = self.phase_handlers[phase]
+                if event.plugin is not self:
+                    # Handler was created by a LazyPluginInfo, keep its (possibly adjusted) priority
+                    event.func = getattr(self.instance, method_name)
+                    event.plugin = self
                 continue
             if hasattr(self.instance, method_name):
                 method = getattr(self.instance, method_name)
@@ -345,6 +376,74 @@ class PluginInfo(dict):
 register = PluginInfo
 
 
+class LazyPluginInfo(PluginInfo):
+    """
+    Stands in for a plugin known from the plugin manifest until its module is needed.
+
+    Accessing the plugin instance or calling one of its phase handlers imports the module, after which the
+    real :class:`PluginInfo` takes the place of this one in :data:`plugins`.
+    """
+
+    def __init__(self, module, info):
+        dict.__init__(self)
+        self.module = module
+        self.name = info['name']
+        self.groups = info['groups']
+        self.builtin = info['builtin']
+        self.debug = info['debug']
+        self.api_ver = info['api_ver']
+        self.contexts = info['contexts']
+        self.category = info['category']
+        self.schema = info['schema']
+        self.priorities = info['priorities']
+        self.phase_handlers = {}
+        self.initialized = False
+        if self.name not in plugins:
+            plugins[self.name] = self
+
+    def __getattr__(self, attr):
+        if attr in self:
+            return self[attr]
+        if attr in ['instance', 'plugin_class']:
+            return getattr(self.load(), attr)
+        return dict.__getattribute__(self, attr)
+
+    def initialize(self):
+        if self.initialized:
+            return
+        self.initialized = True
+        if self.schema is not None:
+            config_schema.register_schema(self.schema['id'], self.schema)
+        for phase, handler_prio in self.priorities.iteritems():
+            if phase not in phase_methods:
+                continue
+            event = add_phase_handler('plugin.%s.%s' % (self.name, phase), self._lazy_handler(phase), handler_prio)
+            event.plugin = self
+            self.phase_handlers[phase] = event
+
+    def _lazy_handler(self, phase):
+        def lazy_handler(*args, **kwargs):
+            return self.load().phase_handlers[phase](*args, **kwargs)
+        lazy_handler.__name__ = str('lazy_%s_%s' % (self.name, phase))
+        return lazy_handler
+
+    def load(self):
+        """Imports the module of this plugin if needed and returns the real :class:`PluginInfo`."""
+        with _lazy_load_lock:
+            if plugins.get(self.name) is self:
+                _load_lazy_module(self.module)
+            plugin = plugins.get(self.name)
+            if plugin is None or isinstance(plugin, LazyPluginInfo):
+                raise DependencyError(missing=self.name, message='Plugin `%s` could not be loaded from module `%s`' %
+                                                                 (self.name, self.module))
+            return plugin
+
+    def __str__(self):
+        return '<LazyPluginInfo(name=%s)>' % self.name
+
+    __repr__ = __str__
+
+
 def _strip_trailing_sep(path):
     return path.rstrip("\\/")
 
@@ -368,14 +467,163 @@ def _get_standard_plugins_path():
     return paths
 
 
+def _get_manifest_path():
+    """
+    :returns: Path of the plugin manifest, see :func:`load_plugins`.
+    """
+    return os.environ.get('FLEXGET_PLUGIN_MANIFEST',
+                          os.path.join(os.path.expanduser('~'), '.flexget', 'plugin_manifest.json'))
+
+
+def _get_file_mtimes(dirs):
+    """
+    :returns: Dict mapping every python file under `dirs` to its modification time.
+    """
+    mtimes = {}
+    for plugin_dir in dirs:
+        for root, _, files in os.walk(plugin_dir):
+            for filename in files:
+                if filename.endswith('.py'):
+                    path = os.path.join(root, filename)
+                    mtimes[path] = os.path.getmtime(path)
+    return mtimes
+
+
+def _manifest_key(dirs):
+    from flexget import __version__
+    return {'version': MANIFEST_VERSION, 'flexget': __version__, 'dirs': dirs, 'files': _get_file_mtimes(dirs)}
+
+
+def _read_manifest(dirs):
+    """
+    :returns: The plugin manifest, or None if there is none or it does not match the plugin files anymore.
+    """
+    path = _get_manifest_path()
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError) as e:
+        log.debug('Could not read plugin manifest %s: %s' % (path, e))
+        return None
+    if not isinstance(manifest, dict) or not all(k in manifest for k in ('eager', 'lazy')):
+        log.debug('Plugin manifest %s is invalid, it needs to be rebuilt' % path)
+        return None
+    key = _manifest_key(dirs)
+    if any(manifest.get(k) != v for k, v in key.iteritems()):
+        log.debug('Plugin files have changed, plugin manifest needs to be rebuilt')
+        return None
+    return manifest
+
+
+def _write_manifest(dirs, modules, registered):
+    """
+    :param dirs: Directories plugins were loaded from
+    :param dict modules: Mapping of imported module name to whether it can be imported on demand
+    :param dict registered: Mapping of module name to names of plugins it registered
+    """
+    manifest = _manifest_key(dirs)
+    manifest['eager'] = []
+    manifest['lazy'] = {}
+    for module, lazy in modules.iteritems():
+        if lazy:
+            infos = []
+            for name in registered.get(module, []):
+                plugin = plugins[name]
+                infos.append({'name': plugin.name,
+                              'groups': plugin.groups,
+                              'builtin': plugin.builtin,
+                              'debug': plugin.debug,
+                              'api_ver': plugin.api_ver,
+                              'contexts': plugin.contexts,
+                              'category': plugin.category,
+                              'schema': plugin.schema,
+                              'priorities': dict((phase, event.priority)
+                                                 for phase, event in plugin.phase_handlers.iteritems())})
+            try:
+                json.dumps(infos)
+            except (TypeError, ValueError):
+                # Schema can't be stored, this module has to be imported every time
+                lazy = False
+            else:
+                manifest['lazy'][module] = infos
+        if not lazy:
+            manifest['eager'].append(module)
+    path = _get_manifest_path()
+    temp_path = None
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        # Written to a temporary file first and renamed in place, so other processes never see a partial manifest
+        fd, temp_path = tempfile.mkstemp(prefix='.plugin_manifest', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        if sys.platform.startswith('win') and os.path.exists(path):
+            # Renaming does not replace existing files on windows
+            os.remove(path)
+        os.rename(temp_path, path)
+        temp_path = None
+    except (IOError, OSError) as e:
+        log.debug('Could not write plugin manifest %s: %s' % (path, e))
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _side_effects():
+    """
+    Snapshot of the global state plugin modules may change when imported, other than registering plugins.
+    A module which doesn't change any of it can be imported once one of its plugins is actually used.
+    """
+    from flexget import db_schema
+    from flexget.manager import Base
+    return (dict((name, len(handlers)) for name, handlers in _events.iteritems() if name != 'plugin.register'),
+            list(task_phases), dict(_new_phase_queue), set(config_schema.schema_paths),
+            set(db_schema.plugin_schemas), set(Base.metadata.tables),
+            set(name for name in sys.modules if name.startswith(plugins_pkg.__name__ + '.')))
+
+
+def _import_plugin_module(name, load=importlib.import_module):
+    """
+    Imports plugin module `name`, logging any problems.
+
+    :returns: True if module was imported
+    """
+    try:
+        loaded_module = load(name)
+    except DependencyError as e:
+        if e.has_message():
+            msg = e.message
+        else:
+            msg = 'Plugin `%s` requires `%s` to load.' % (e.issued_by or name, e.missing or 'N/A')
+        if not e.silent:
+            log.warning(msg)
+        else:
+            log.debug(msg)
+    except ImportError as e:
+        log.critical('Plugin `%s` failed to import dependencies' % name)
+        log.exception(e)
+    except Exception as e:
+        log.critical('Exception while loading plugin %s' % name)
+        log.exception(e)
+        raise
+    else:
+        log.trace('Loaded module %s from %s' % (name, loaded_module.__file__))
+        return True
+    return False
+
+
 def _load_plugins_from_dirs(dirs):
     """
     :param list dirs: Directories from where plugins are loaded from
+    :returns: Dict mapping names of the imported modules to whether they can be imported on demand instead
     """
 
     log.debug('Trying to load plugins from: %s' % dirs)
     # add all dirs to plugins_pkg load path so that plugins are loaded from flexget and from ~/.flexget/plugins/
     plugins_pkg.__path__ = map(_strip_trailing_sep, dirs)
+    modules = {}
     for importer, name, ispkg in pkgutil.walk_packages(dirs, plugins_pkg.__name__ + '.'):
         if ispkg:
             continue
@@ -387,47 +635,93 @@ def _load_plugins_from_dirs(dirs):
         # Don't load from pyc files
         if not loader.filename.endswith('.py'):
             continue
-        try:
-            loaded_module = loader.load_module(name)
-        except DependencyError as e:
-            if e.has_message():
-                msg = e.message
-            else:
-                msg = 'Plugin `%s` requires `%s` to load.' % (e.issued_by or name, e.missing or 'N/A')
-            if not e.silent:
-                log.warning(msg)
-            else:
-                log.debug(msg)
-        except ImportError as e:
-            log.critical('Plugin `%s` failed to import dependencies' % name)
-            log.exception(e)
-        except Exception as e:
-            log.critical('Exception while loading plugin %s' % name)
-            log.exception(e)
-            raise
-        else:
-            log.trace('Loaded module %s from %s' % (name, loaded_module.__file__))
+        before = _side_effects()
+        loaded = _import_plugin_module(name, loader.load_module)
+        after = _side_effects()
+        after[-1].discard(name)
+        modules[name] = loaded and before == after
+
+    _check_phase_queue()
+    return modules
 
+
+def _load_plugins_from_manifest(dirs, manifest):
+    """
+    Imports the plugin modules which can't wait until they are needed, and creates a :class:`LazyPluginInfo` for the
+    plugins of all other modules.
+    """
+    log.debug('Loading plugins from: %s using the plugin manifest' % dirs)
+    plugins_pkg.__path__ = map(_strip_trailing_sep, dirs)
+    for name in manifest['eager']:
+        if name not in sys.modules:
+            _import_plugin_module(name)
+    _check_phase_queue()
+    _register_plugins()
+    for module, infos in manifest['lazy'].iteritems():
+        for info in infos:
+            LazyPluginInfo(module, info)
+
+
+def _load_lazy_module(name):
+    """Imports a plugin module after plugins have been loaded, and registers its plugins."""
+    log.debug('Loading plugin module %s on demand' % name)
+    if name not in sys.modules:
+        _import_plugin_module(name)
+    _register_plugins()
+    for plugin in plugins.values():
+        plugin.initialize()
+
+
+def _check_phase_queue():
     if _new_phase_queue:
         for phase, args in _new_phase_queue.iteritems():
             log.error('Plugin %s requested new phase %s, but it could not be created at requested '
                       'point (before, after). Plugin is not working properly.' % (args[0], phase))
 
 
-def load_plugins():
-    """Load plugins from the standard plugin paths."""
-    global plugins_loaded
+def _register_plugins():
+    """
+    Fires the plugin.register event.
 
-    start_time = time.time()
-    # Import all the plugins
-    _load_plugins_from_dirs(_get_standard_plugins_path())
-    # Register them
-    fire_event('plugin.register')
+    :returns: Dict mapping module names to the names of plugins they registered
+    """
+    registered = {}
+    if 'plugin.register' not in _events:
+        return registered
+    for handler in get_events('plugin.register'):
+        before = set(plugins)
+        handler()
+        registered.setdefault(handler.func.__module__, []).extend(set(plugins) - before)
     # Plugins should only be registered once, remove their handlers after
     remove_event_handlers('plugin.register')
+    return registered
+
+
+def load_plugins(lazy=False):
+    """
+    Load plugins from the standard plugin paths.
+
+    :param bool lazy: Use the plugin manifest to only import modules with plugins that are actually used, or which
+      need to be imported to register anything besides plugins (events, options, database tables ...). The
+      manifest is rebuilt by importing everything whenever plugin files change.
+    """
+    global plugins_loaded
+
+    start_time = time.time()
+    dirs = _get_standard_plugins_path()
+    manifest = _read_manifest(dirs) if lazy else None
+    if manifest:
+        _load_plugins_from_manifest(dirs, manifest)
+    else:
+        # Import all the plugins
+        modules = _load_plugins_from_dirs(dirs)
+        # Register them
+        registered = _register_plugins()
     # After they have all been registered, instantiate them
     for plugin in plugins.values():
         plugin.initialize()
+    if lazy and not manifest:
+        _write_manifest(dirs, modules, registered)
     took = time.time() - start_time
     plugins_loaded = True
     log.debug('Plugins took %.2f seconds to load' % took)
@@ -512,4 +806,6 @@ def get_plugin_by_name(name, issued_by='???'):
     """Get plugin by name, preferred way since this structure may be changed at some point."""
     if not name in plugins:
         raise DependencyError(issued_by=issued_by, missing=name, message='Unknown plugin %s' % name)
+    if isinstance(plugins[name], LazyPluginInfo):
+        return plugins[name].load()
     return plugins[name]
@@ -0,0 +1,460 @@
+from __future__ import unicode_literals, division, absolute_import
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+import sqlalchemy
+from sqlalchemy.pool import SingletonThreadPool
+
+import flexget
+from flexget import options
+from flexget.entry import Entry
+from flexget.event import event
+from flexget.manager import Base, Session, set_sqlite_pragmas
+from flexget.plugins.cli import performance
+from flexget.utils import qualities
+from flexget.utils.bittorrent import Torrent, bencode
+from flexget.utils.tools import console
+
+log = logging.getLogger('benchmark')
+
+# Benchmarks by name, in the order they are ran, see :func:`benchmark`
+BENCHMARKS = OrderedDict()
+
+WORDS = ['alpha', 'bravo', 'castle', 'dark', 'empire', 'falling', 'game', 'house', 'island', 'justice', 'kingdom',
+         'lost', 'modern', 'night', 'office', 'point', 'queen', 'river', 'street', 'trust', 'under', 'vampire',
+         'walking', 'wire', 'young', 'zero', 'blue', 'secret', 'doctor', 'family', 'heroes', 'legend', 'mind',
+         'north', 'order', 'prison', 'red', 'silicon', 'true', 'west']
+QUALITIES = ['720p HDTV x264', '1080p WEB-DL DD5.1 H.264', 'HDTV XviD', '480p WEBRip x264', '1080p BluRay x264 DTS',
+             'DVDRip XviD', 'PDTV', '720p WEB-DL AAC2.0 H264', '1080i HDTV MPEG2', 'REPACK 720p HDTV x264']
+GROUPS = ['LOL', 'DIMENSION', 'KILLERS', 'FlexGet', 'NTb', 'ASAP', 'FQM', 'IMMERSE']
+TEMPLATES = ['{{series_name}} - {{series_id}}',
+             '{{series_name|pathscrub}}/Season {{series_season}}/{{title}}',
+             '{{title|re_replace("[. ]", "_")}} ({{quality|upper}})',
+             '{% if series_id_type == "ep" %}S{{"%02d"|format(series_season)}}{% endif %} {{url}}']
+
+
+def benchmark(name, database=False):
+    """
+    Decorator registering a benchmark.
+
+    The function is called with the manager, a :class:`Workload` and a :class:`Timer`, it should only do the measured
+    work inside the timer block, and return the number of operations done.
+
+    :param bool database: The benchmark needs a fresh database, a temporary one is used for each run.
+    """
+
+    def decorator(func):
+        BENCHMARKS[name] = (func, database)
+        return func
+    return decorator
+
+
+class Timer(object):
+    """Measures the time and database queries spent in the blocks it is used for, can be entered several times."""
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.queries = 0
+        # Time and queries of each plugin of timed tasks, by phase and plugin name
+        self.plugins = {}
+        self._started = None
+
+    def __enter__(self):
+        self._started = (time.time(), time.clock(), performance.query_count)
+        return self
+
+    def __exit__(self, *args):
+        wall_time, cpu_time, queries = self._started
+        self.wall_time += time.time() - wall_time
+        self.cpu_time += time.clock() - cpu_time
+        self.queries += performance.query_count - queries
+
+    def add_task(self, task):
+        """Adds up the performance records of plugins ran by `task`."""
+        for record in getattr(task, 'performance', []):
+            plugin = self.plugins.setdefault('%s.%s' % (record['phase'], record['plugin']),
+                                             {'wall_time': 0.0, 'queries': 0})
+            plugin['wall_time'] = round(plugin['wall_time'] + record['wall_time'], 4)
+            plugin['queries'] += record['queries']
+
+
+class Workload(object):
+    """
+    Synthetic data for the benchmarks. The same `seed` and `scale` always give the same data, regardless of which
+    benchmarks are ran.
+    """
+
+    def __init__(self, workdir, seed=0, scale=1):
+        self.workdir = workdir
+        self.seed = seed
+        self.scale = scale
+
+    def random(self, name):
+        """Returns a random generator of its own for data set `name`."""
+        return random.Random('%s-%s' % (self.seed, name))
+
+    def count(self, base):
+        """Returns `base` number of items adjusted by scale."""
+        return max(1, int(base * self.scale))
+
+    def series_names(self):
+        rng = self.random('series_names')
+        names = OrderedDict()
+        while len(names) < self.count(200):
+            name = ' '.join(rng.sample(WORDS, rng.choice([1, 2, 2, 3]))).title()
+            names.setdefault(name.lower(), name)
+        return names.values()
+
+    def release_title(self, rng, name):
+        """Returns a release title of series `name` in one of the commonly used formats."""
+        quality = rng.choice(QUALITIES)
+        group = rng.choice(GROUPS)
+        style = rng.random()
+        if style < 0.7:
+            episode = 'S%02dE%02d' % (rng.randint(1, 12), rng.randint(1, 24))
+            if rng.random() < 0.5:
+                return '%s.%s.%s-%s' % (name.replace(' ', '.'), episode, quality.replace(' ', '.'), group)
+            return '%s %s %s-%s' % (name, episode, quality, group)
+        elif style < 0.85:
+            date = datetime(2010, 1, 1) + timedelta(days=rng.randint(0, 1500))
+            return '%s %s %s-%s' % (name, date.strftime('%Y.%m.%d'), quality, group)
+        return '[%s] %s - %03d [%s]' % (group, name, rng.randint(1, 500), quality)
+
+    def other_title(self, rng):
+        """Returns a title which does not belong to any series."""
+        words = ' '.join(rng.sample(WORDS, 4)).title()
+        return '%s %s %s' % (words, rng.randint(1950, 2014), rng.choice(QUALITIES))
+
+    def release_titles(self, name, base):
+        """Returns (series name, title) for `base` releases of known series, and a fifth as many other titles."""
+        rng = self.random(name)
+        series_names = self.series_names()
+        titles = [(rng.choice(series_names), None) for _ in xrange(self.count(base))]
+        titles = [(series_name, self.release_title(rng, series_name)) for series_name, title in titles]
+        titles.extend((None, self.other_title(rng)) for _ in xrange(self.count(base) // 5))
+        rng.shuffle(titles)
+        return titles
+
+    def entries(self, name, base):
+        """Returns mock input config for entries with titles from :meth:`release_titles`."""
+        return [{'title': title, 'url': 'http://localhost/benchmark/%s/%d' % (name, index)}
+                for index, (series_name, title) in enumerate(self.release_titles(name, base))]
+
+    def rss_file(self, base):
+        """Writes an RSS feed to the work directory and returns its path."""
+        path = os.path.join(self.workdir, 'benchmark.rss')
+        items = []
+        for index, (series_name, title) in enumerate(self.release_titles('rss', base)):
+            items.append('<item><title>%s</title><link>http://localhost/benchmark/rss/%d.torrent</link>'
+                         '<guid>benchmark-%d</guid><description>%s</description>'
+                         '<enclosure url="http://localhost/benchmark/rss/%d.torrent" length="%d" '
+                         'type="application/x-bittorrent"/></item>' %
+                         (escape(title), index, index, escape('Released by %s' % title), index, 1000000 + index))
+        with open(path, 'w') as f:
+            f.write('<?xml version="1.0" encoding="utf-8"?>\n<rss version="2.0"><channel><title>Benchmark</title>'
+                    '<link>http://localhost/benchmark</link><description>Benchmark feed</description>')
+            f.write('\n'.join(items).encode('utf-8'))
+            f.write('</channel></rss>')
+        return path
+
+    def torrents(self, base):
+        """Returns bencoded multi file torrents."""
+        rng = self.random('torrents')
+        result = []
+        for index in xrange(self.count(base)):
+            files = [{b'length': rng.randint(1, 2 ** 30),
+                      b'path': [b'Season %d' % rng.randint(1, 9), b'file %d.mkv' % number]}
+                     for number in xrange(rng.randint(1, 100))]
+            pieces = b''.join(chr(rng.randint(0, 255)) for _ in xrange(20 * rng.randint(10, 500)))
+            data = {b'announce': b'http://tracker.localhost/announce',
+                    b'announce-list': [[b'http://tracker.localhost/announce'], [b'udp://tracker.localhost:80']],
+                    b'info': {b'name': b'benchmark %d' % index, b'piece length': 262144, b'pieces': pieces,
+                              b'files': files}}
+            result.append(bencode(data))
+        return result
+
+    def populate_seen(self, session, base):
+        """Fills the seen tables, titles and urls of :meth:`entries` named 'seen' are seen."""
+        from flexget.plugins.filter.seen import SeenEntry, SeenField
+        now = datetime.now()
+        entries = self.entries('seen', base)
+        rng = self.random('populate_seen')
+        entries.extend({'title': self.other_title(rng), 'url': 'http://localhost/benchmark/old/%d' % index}
+                       for index in xrange(self.count(base) * 4))
+        session.execute(SeenEntry.__table__.insert(), [
+            {'id': index + 1, 'title': entry['title'], 'reason': 'benchmark', 'feed': 'benchmark', 'added': now,
+             'local': False} for index, entry in enumerate(entries)])
+        session.execute(SeenField.__table__.insert(), [
+            {'seen_entry_id': index + 1, 'field': field, 'value': entry[field], 'added': now}
+            for index, entry in enumerate(entries) for field in ('title', 'url')])
+
+    def populate_archive(self, session, base):
+        from flexget.plugins.generic.archive import ArchiveEntry
+        now = datetime.now()
+        session.execute(ArchiveEntry.__table__.insert(), [
+            {'title': entry['title'], 'url': entry['url'], 'description': 'Archived %s' % entry['title'],
+             'feed': 'benchmark', 'added': now} for entry in self.entries('archive', base)])
+
+    def populate_series(self, session, episodes):
+        """Adds all series from :meth:`series_names`, with `episodes` downloaded episodes each."""
+        from flexget.plugins.filter.series import Series, Episode, Release
+        now = datetime.now()
+        rng = self.random('populate_series')
+        all_series = []
+        for name in self.series_names():
+            series = Series()
+            series.name = name
+            series.identified_by = 'ep'
+            all_series.append(series)
+        session.add_all(all_series)
+        session.flush()
+        episode_rows = []
+        release_rows = []
+        for series in all_series:
+            for number in xrange(episodes):
+                season, episode = divmod(number, 24)
+                episode_rows.append({'id': len(episode_rows) + 1, 'identifier': 'S%02dE%02d' % (season + 1, episode + 1),
+                                     'season': season + 1, 'number': episode + 1, 'identified_by': 'ep',
+                                     'series_id': series.id})
+                for quality in rng.sample(QUALITIES, 2):
+                    release_rows.append({'episode_id': len(episode_rows), 'quality': qualities.Quality(quality).name,
+                                         'downloaded': len(release_rows) % 2 == 0, 'proper_count': 0,
+                                         'title': '%s %s %s' % (series.name, episode_rows[-1]['identifier'], quality),
+                                         'first_seen': now})
+        session.execute(Episode.__table__.insert(), episode_rows)
+        session.execute(Release.__table__.insert(), release_rows)
+
+
+@contextmanager
+def temporary_database(workdir):
+    """Points sessions to a new database in `workdir` with all tables created, the real database is left alone."""
+    path = tempfile.mkdtemp(dir=workdir)
+    engine = sqlalchemy.create_engine('sqlite:///%s' % os.path.join(path, 'benchmark.sqlite'),
+                                      poolclass=SingletonThreadPool, connect_args={'check_same_thread': False})
+    sqlalchemy.event.listen(engine, 'connect', set_sqlite_pragmas)
+    original_bind = Session.kw.get('bind')
+    Base.metadata.create_all(bind=engine)
+    Session.configure(bind=engine)
+    try:
+        yield engine
+    finally:
+        Session.configure(bind=original_bind)
+        engine.dispose()
+        shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def populated(populate, *args):
+    """Runs `populate` with a session, commits when done."""
+    session = Session()
+    try:
+        populate(session, *args)
+        session.commit()
+    finally:
+        session.close()
+    yield
+
+
+def run_task(manager, timer, name, config):
+    """Executes a task with `config` within `timer`, and returns it."""
+    from flexget.task import Task
+    task = Task(manager, 'benchmark_%s' % name, config=config, options={'allow_manual': True})
+    with timer:
+        task.execute()
+    timer.add_task(task)
+    return task
+
+
+@benchmark('series_parsing')
+def series_parsing(manager, workload, timer):
+    from flexget.utils.titles import SeriesParser, ParseWarning
+    titles = workload.release_titles('series_parsing', 5000)
+    # Titles of no series are tried against the first series, like the series plugin does for all of them
+    first = workload.series_names()[0]
+    parsers = dict((name, SeriesParser(name=name)) for name in workload.series_names())
+    with timer:
+        for series_name, title in titles:
+            try:
+                parsers[series_name or first].parse(title)
+            except ParseWarning:
+                pass
+    return len(titles)
+
+
+@benchmark('quality_parsing')
+def quality_parsing(manager, workload, timer):
+    titles = [title for series_name, title in workload.release_titles('quality_parsing', 5000)]
+    with timer:
+        for title in titles:
+            qualities.Quality(title)
+    return len(titles)
+
+
+@benchmark('template_rendering')
+def template_rendering(manager, workload, timer):
+    from flexget.utils.template import render_from_entry
+    entries = []
+    for config in workload.entries('template_rendering', 1000):
+        entry = Entry(config)
+        entry.update(task='benchmark', series_name='Benchmark Show', series_id='S01E01', series_season=1, series_id_type='ep',
+                     quality=qualities.Quality(entry['title']))
+        entries.append(entry)
+    with timer:
+        for template in TEMPLATES:
+            for entry in entries:
+                render_from_entry(template, entry)
+    return len(TEMPLATES) * len(entries)
+
+
+@benchmark('torrent_decode')
+def torrent_decode(manager, workload, timer):
+    torrents = workload.torrents(200)
+    with timer:
+        for data in torrents:
+            Torrent(data)
+    return len(torrents)
+
+
+@benchmark('torrent_encode')
+def torrent_encode(manager, workload, timer):
+    torrents = [Torrent(data) for data in workload.torrents(200)]
+    with timer:
+        for torrent in torrents:
+            torrent.encode()
+    return len(torrents)
+
+
+@benchmark('rss_input', database=True)
+def rss_input(manager, workload, timer):
+    config = {'rss': {'url': workload.rss_file(2000), 'all_entries': True}, 'accept_all': True}
+    return len(run_task(manager, timer, 'rss_input', config).all_entries)
+
+
+@benchmark('seen_filtering', database=True)
+def seen_filtering(manager, workload, timer):
+    with populated(workload.populate_seen, 5000):
+        config = {'mock': workload.entries('seen', 1000) + workload.entries('unseen', 1000), 'accept_all': True}
+        return len(run_task(manager, timer, 'seen_filtering', config).all_entries)
+
+
+@benchmark('task_execution', database=True)
+def task_execution(manager, workload, timer):
+    with populated(workload.populate_series, 48):
+        with populated(workload.populate_seen, 5000):
+            with populated(workload.populate_archive, 20000):
+                config = {'mock': workload.entries('task_execution', 2000),
+                          'series': workload.series_names(),
+                          'quality': '<=1080p',
+                          'archive': ['benchmark'],
+                          'regexp': {'reject': ['(?i)repack']}}
+                return len(run_task(manager, timer, 'task_execution', config).all_entries)
+
+
+def clear_caches():
+    """Empties the parse and template caches, later runs would otherwise only time cache lookups."""
+    from flexget.utils.template import _template_cache
+    from flexget.utils.titles.series import SeriesParser
+    SeriesParser._parse_cache.clear()
+    qualities._parse_cache.clear()
+    qualities._requirements_cache.clear()
+    _template_cache.clear()
+
+
+def run_benchmark(manager, name, workload, repeat):
+    """
+    Runs benchmark `name` `repeat` times, and returns the results of the fastest run as a dict. Each run starts with
+    empty caches.
+    """
+    func, database = BENCHMARKS[name]
+    runs = []
+    for _ in xrange(repeat):
+        clear_caches()
+        timer = Timer()
+        if database:
+            with temporary_database(workload.workdir):
+                operations = func(manager, workload, timer)
+        else:
+            operations = func(manager, workload, timer)
+        runs.append((timer, operations))
+    timer, operations = min(runs, key=lambda run: run[0].wall_time)
+    result = {'operations': operations,
+              'wall_time': round(timer.wall_time, 4),
+              'cpu_time': round(timer.cpu_time, 4),
+              'per_second': round(operations / timer.wall_time, 1) if timer.wall_time else None,
+              'runs': [round(run[0].wall_time, 4) for run in runs]}
+    if database:
+        result['queries'] = timer.queries
+    if timer.plugins:
+        result['plugins'] = timer.plugins
+    return result
+
+
+def cli_benchmark(manager, options):
+    names = options.benchmarks or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        console('Unknown benchmark %s, available: %s' % (', '.join(unknown), ', '.join(BENCHMARKS)))
+        return
+    workdir = tempfile.mkdtemp(prefix='flexget-benchmark-')
+    results = OrderedDict()
+    try:
+        workload = Workload(workdir, seed=options.seed, scale=options.scale)
+        for name in names:
+            console('Running %s ...' % name)
+            results[name] = run_benchmark(manager, name, workload, options.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'flexget_version': flexget.__version__,
+              'python_version': platform.python_version(),
+              'platform': platform.platform(),
+              'started': datetime.now().replace(microsecond=0).isoformat(),
+              'seed': options.seed,
+              'scale': options.scale,
+              'repeat': options.repeat,
+              'benchmarks': results}
+
+    console('-' * 79)
+    console('%-20s %10s %10s %10s %12s %8s' % ('Benchmark', 'Ops', 'Wall (s)', 'CPU (s)', 'Ops/s', 'Queries'))
+    for name, result in results.iteritems():
+        console('%-20s %10s %10.3f %10.3f %12s %8s' % (name, result['operations'], result['wall_time'],
+                                                        result['cpu_time'], result['per_second'],
+                                                        result.get('queries', '')))
+    if options.output:
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options.output == '-':
+            console(output)
+        else:
+            with open(options.output, 'w') as f:
+                f.write(output + '\n')
+            console('Results written to %s' % options.output)
+
+
+@event('options.register')
+def register_parser_arguments():
+    parser = options.register_command('benchmark', cli_benchmark,
+                                      help='time the hot paths of FlexGet with synthetic workloads')
+    parser.add_argument('benchmarks', nargs='*', metavar='<benchmark>',
+                        help='benchmarks to run, all by default: %s' % ', '.join(BENCHMARKS))
+    parser.add_argument('--scale', type=float, default=1, metavar='NUM',
+                        help='multiply the size of the workloads by %(metavar)s (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, metavar='NUM',
+                        help='run each benchmark %(metavar)s times and report the fastest (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed used to generate the workloads')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the results to %(metavar)s as json, use - for the console')
+    # The results are what matter, warnings about the synthetic tasks are only noise
+    parser.set_defaults(loglevel='error')
@@ -1,73 +1,195 @@
 from __future__ import unicode_literals, division, absolute_import
+import json
 import logging
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
 
 from argparse import SUPPRESS
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import Engine
 
 from flexget import options
 from flexget.event import event
 
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
 log = logging.getLogger('performance')
 
-performance = {}
+# Number of records kept in memory for the daemon and webui
+MAX_RECORDS = 5000
+
+# Most recent performance records, see :func:`get_records`
+records = deque(maxlen=MAX_RECORDS)
+records_lock = threading.Lock()
 
-_start = {}
+# Statistics for the plugin currently running in each thread
+_local = threading.local()
 
 query_count = 0
 
+# Usage of the calling thread only, Linux specific. Python 2 does not define the constant, the value is from
+# sys/resource.h
+RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD', 1 if sys.platform.startswith('linux') else None)
+
+
+def thread_cpu_time():
+    """Returns cpu time used by the current thread in seconds."""
+    usage = resource.getrusage(RUSAGE_THREAD)
+    return usage.ru_utime + usage.ru_stime
+
+
+def cpu_clock(manager):
+    """
+    Returns a function giving cpu time used by the plugins running in the current thread, or None if it can not be
+    measured. Without per thread cpu time, the process wide time is used when tasks do not run concurrently.
+    """
+    if resource and RUSAGE_THREAD is not None:
+        return thread_cpu_time
+    if manager.config.get('task_workers', 1) <= 1:
+        return time.clock
+
+
+class PluginStats(object):
+    """Resources used by a single plugin during one phase of a task."""
+
+    def __init__(self, task, phase, plugin):
+        self.task = task.name
+        self.phase = phase
+        self.plugin = plugin
+        self.started = datetime.now()
+        self.wall_time = time.time()
+        self.cpu_clock = cpu_clock(task.manager)
+        self.cpu_time = self.cpu_clock and self.cpu_clock()
+        self.queries = 0
+        self.query_time = 0.0
+        self.requests = 0
+        self.request_bytes = 0
+        self.request_time = 0.0
+        self.entries_in = len(task.entries)
+        self.entries_out = None
+
+    def finish(self, task):
+        self.wall_time = time.time() - self.wall_time
+        if self.cpu_clock:
+            self.cpu_time = self.cpu_clock() - self.cpu_time
+        self.entries_out = len(task.entries)
+
+    def as_dict(self):
+        record = {
+            'task': self.task,
+            'phase': self.phase,
+            'plugin': self.plugin,
+            'started': self.started.isoformat(),
+            'wall_time': round(self.wall_time, 4),
+            'queries': self.queries,
+            'query_time': round(self.query_time, 4),
+            'requests': self.requests,
+            'request_bytes': self.request_bytes,
+            'request_time': round(self.request_time, 4),
+            'entries_in': self.entries_in,
+            'entries_out': self.entries_out}
+        if self.cpu_clock:
+            record['cpu_time'] = round(self.cpu_time, 4)
+        return record
+
+
+def get_records(task=None):
+    """
+    Returns performance records of recently ran plugins, oldest first.
+
+    :param task: Only return records of the task with this name
+    :return: List of dicts with keys task, phase, plugin, started, wall_time, cpu_time, queries, query_time,
+      requests, request_bytes, request_time, entries_in and entries_out. Times are in seconds. cpu_time is left out
+      when it can not be measured per thread, and tasks run concurrently.
+    """
+    with records_lock:
+        return [r for r in records if task is None or r['task'] == task]
+
 
 def log_query_count(name_point):
     """Debugging purposes, allows logging number of executed queries at :name_point:"""
     log.info('At point named `%s` total of %s queries were ran' % (name_point, query_count))
 
 
-@event('manager.execute.started')
-def startup(manager):
-    if manager.options.execute.debug_perf:
-        log.info('Enabling plugin and SQLAlchemy performance debugging')
-        import time
-
-        # Monkeypatch query counter for SQLAlchemy
-        from sqlalchemy.engine import Connection
-        if hasattr(Connection, 'execute'):
-            orig_f = Connection.execute
-
-            def monkeypatched(*args, **kwargs):
-                global query_count
-                query_count += 1
-                return orig_f(*args, **kwargs)
-
-            Connection.execute = monkeypatched
-        else:
-            log.critical('Unable to monkeypatch sqlalchemy')
-
-        @event('task.execute.before_plugin')
-        def before(task, keyword):
-            fd = _start.setdefault(task.name, {})
-            fd.setdefault('time', {})[keyword] = time.time()
-            fd.setdefault('queries', {})[keyword] = query_count
-
-        @event('task.execute.after_plugin')
-        def after(task, keyword):
-            took = time.time() - _start[task.name]['time'][keyword]
-            queries = query_count - _start[task.name]['queries'][keyword]
-            # Store results, increases previous values
-            pd = performance.setdefault(task.name, {})
-            data = pd.setdefault(keyword, {})
-            data['took'] = data.get('took', 0) + took
-            data['queries'] = data.get('queries', 0) + queries
-
-        @event('manager.execute.completed')
-        def results(manager):
-            for name, data in performance.iteritems():
-                log.info('Performance results for task %s:' % name)
-                for keyword, results in data.iteritems():
-                    took = results['took']
-                    queries = results['queries']
-                    if took > 0.1 or queries > 10:
-                        log.info('%-15s took %0.2f sec (%s queries)' % (keyword, took, queries))
+@sqlalchemy_event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_start'] = time.time()
+
+
+@sqlalchemy_event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    global query_count
+    query_count += 1
+    took = time.time() - conn.info.get('query_start', time.time())
+    stats = getattr(_local, 'stats', None)
+    if stats:
+        stats.queries += 1
+        stats.query_time += took
+
+
+@event('requests.response')
+def record_response(response):
+    stats = getattr(_local, 'stats', None)
+    if stats:
+        stats.requests += 1
+        stats.request_time += response.elapsed.total_seconds()
+        try:
+            stats.request_bytes += int(response.headers.get('content-length', 0))
+        except ValueError:
+            pass
+
+
+@event('task.execute.before_plugin')
+def before_plugin(task, keyword):
+    _local.stats = PluginStats(task, task.current_phase, keyword)
+
+
+@event('task.execute.after_plugin')
+def after_plugin(task, keyword):
+    stats = getattr(_local, 'stats', None)
+    if not stats:
+        return
+    _local.stats = None
+    stats.finish(task)
+    record = stats.as_dict()
+    with records_lock:
+        records.append(record)
+    task.performance.append(record)
+
+
+@event('task.execute.started')
+def task_started(task):
+    task.performance = []
+
+
+@event('task.execute.completed')
+def task_completed(task):
+    perf_log = getattr(task.options, 'perf_log', None)
+    if perf_log:
+        with records_lock:
+            with open(perf_log, 'a') as f:
+                for record in task.performance:
+                    f.write(json.dumps(record) + '\n')
+    if getattr(task.options, 'debug_perf', False):
+        log.info('Performance results for task %s:' % task.name)
+        for record in task.performance:
+            if record['wall_time'] > 0.1 or record['queries'] > 10:
+                cpu_time = '%0.2f' % record['cpu_time'] if 'cpu_time' in record else 'unknown'
+                log.info('%-8s %-15s took %0.2f sec (%s cpu, %s queries, %s requests)' %
+                         (record['phase'], record['plugin'], record['wall_time'], cpu_time,
+                          record['queries'], record['requests']))
 
 
 @event('options.register')
 def register_parser_arguments():
-    options.get_parser('execute').add_argument('--debug-perf', action='store_true', dest='debug_perf', default=False,
-                                               help=SUPPRESS)
+    parser = options.get_parser('execute')
+    parser.add_argument('--debug-perf', action='store_true', dest='debug_perf', default=False, help=SUPPRESS)
+    parser.add_argument('--perf-log', metavar='FILE', dest='perf_log',
+                        help='append time, cpu, database and http usage of each plugin to FILE as json lines')
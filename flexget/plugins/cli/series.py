@@ -5,7 +5,7 @@ from sqlalchemy import func
 
 from flexget import options, plugin
 from flexget.event import event
-from flexget.manager import Session
+from flexget.manager import Session, ReadSession
 from flexget.utils.tools import console
 
 try:
@@ -37,7 +37,7 @@ def display_summary(options):
     console(formatting % ('Name', 'Latest', 'Age', 'Downloaded'))
     console('-' * 79)
 
-    session = Session()
+    session = ReadSession()
     try:
         query = (session.query(Series).outerjoin(Series.episodes).outerjoin(Episode.releases).
                  outerjoin(Series.in_tasks).group_by(Series.id))
@@ -157,8 +157,7 @@ def get_latest_status(episode):
 def display_details(name):
     """Display detailed series information, ie. series show NAME"""
 
-    from flexget.manager import Session
-    session = Session()
+    session = ReadSession()
 
     name = normalize_series_name(name)
     # Sort by length of name, so that partial matches always show shortest matching title
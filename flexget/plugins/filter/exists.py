@@ -5,6 +5,7 @@ import logging
 from flexget import plugin
 from flexget.event import event
 from flexget.config_schema import one_or_more
+from flexget.utils.path_index import path_index
 
 log = logging.getLogger('exists')
 
@@ -35,20 +36,18 @@ class FilterExists(object):
         log.verbose('Scanning path(s) for existing files.')
         config = self.prepare_config(config)
         for path in config:
-            # unicode path causes crashes on some paths
-            path = str(os.path.expanduser(path))
-            if not os.path.exists(path):
+            try:
+                items = path_index.items(path, session=task.session)
+            except OSError:
                 raise plugin.PluginWarning('Path %s does not exist' % path, log)
-            # scan through
-            for root, dirs, files in os.walk(path, followlinks=True):
-                # convert filelists into utf-8 to avoid unicode problems
-                dirs = [x.decode('utf-8', 'ignore') for x in dirs]
-                files = [x.decode('utf-8', 'ignore') for x in files]
-                for entry in task.accepted:
-                    name = entry['title']
-                    if name in dirs or name in files:
-                        log.debug('Found %s in %s' % (name, root))
-                        entry.reject(os.path.join(root, name))
+            found = {}
+            for item in items:
+                found.setdefault(item.name, item.path)
+            for entry in task.accepted:
+                name = entry['title']
+                if name in found:
+                    log.debug('Found %s in %s' % (name, found[name]))
+                    entry.reject(os.path.join(found[name], name))
 
 @event('plugin.register')
 def register_plugin():
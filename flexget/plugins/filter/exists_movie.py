@@ -1,11 +1,10 @@
 from __future__ import unicode_literals, division, absolute_import
-import os
 import logging
 
 from flexget import plugin
 from flexget.event import event
 from flexget.config_schema import one_or_more
-from flexget.utils.titles.movie import MovieParser
+from flexget.utils.path_index import path_index
 from flexget.utils.tools import TimedDict
 
 log = logging.getLogger('exists_movie')
@@ -26,7 +25,9 @@ class FilterExistsMovie(object):
     skip = ['cd1', 'cd2', 'subs', 'sample']
 
     def __init__(self):
-        self.cache = TimedDict(cache_time='1 hour')
+        # imdb ids of directory names which have been looked up, looked up again after a while in case the lookup
+        # failed or imdb has changed since
+        self.imdb_ids = TimedDict(cache_time='1 hour')
 
     def build_config(self, config):
         # if only a single path is passed turn it into a 1 element list
@@ -48,62 +49,41 @@ class FilterExistsMovie(object):
         count_entries = 0
         count_dirs = 0
 
-        # list of imdb ids gathered from paths / cache
-        imdb_ids = []
+        # imdb ids gathered from paths
+        imdb_ids = set()
 
         for path in config:
-            # see if this path has already been scanned
-            if path in self.cache:
-                log.verbose('Using cached scan for %s ...' % path)
-                imdb_ids.extend(self.cache[path])
-                continue
-
-            path_ids = []
-
-            # with unicode it crashes on some paths ..
-            path = str(os.path.expanduser(path))
-            if not os.path.exists(path):
+            try:
+                items = path_index.items(path, session=task.session)
+            except OSError:
                 log.critical('Path %s does not exist' % path)
                 continue
 
             log.verbose('Scanning path %s ...' % path)
 
-            # Help debugging by removing a lot of noise
-            #logging.getLogger('movieparser').setLevel(logging.WARNING)
-            #logging.getLogger('imdb_lookup').setLevel(logging.WARNING)
-
-            # scan through
-            for root, dirs, files in os.walk(path, followlinks=True):
-                # convert filelists into utf-8 to avoid unicode problems
-                dirs = [x.decode('utf-8', 'ignore') for x in dirs]
-                # files = [x.decode('utf-8', 'ignore') for x in files]
-
-                # TODO: add also video files?
-                for item in dirs:
-                    if item.lower() in self.skip:
-                        continue
-                    count_dirs += 1
-
-                    movie = MovieParser()
-                    movie.parse(item)
+            # TODO: add also video files?
+            for item in items:
+                if not item.is_dir or item.name.lower() in self.skip:
+                    continue
+                count_dirs += 1
 
+                if item.name in self.imdb_ids:
+                    imdb_id = self.imdb_ids[item.name]
+                else:
                     try:
-                        imdb_id = imdb_lookup.imdb_id_lookup(movie_title=movie.name,
-                                                             raw_title=item,
+                        imdb_id = imdb_lookup.imdb_id_lookup(movie_title=item.movie_name,
+                                                             raw_title=item.name,
                                                              session=task.session)
-                        if imdb_id in path_ids:
-                            log.trace('duplicate %s' % item)
-                            continue
-                        if imdb_id is not None:
-                            log.trace('adding: %s' % imdb_id)
-                            path_ids.append(imdb_id)
                     except plugin.PluginError as e:
-                        log.trace('%s lookup failed (%s)' % (item, e.value))
-                        incompatible_dirs += 1
-
-            # store to cache and extend to found list
-            self.cache[path] = path_ids
-            imdb_ids.extend(path_ids)
+                        log.trace('%s lookup failed (%s)' % (item.name, e.value))
+                        imdb_id = None
+                    # Failed lookups are remembered too, so they are not searched again on every run
+                    self.imdb_ids[item.name] = imdb_id
+                if imdb_id is None:
+                    incompatible_dirs += 1
+                else:
+                    log.trace('adding: %s' % imdb_id)
+                    imdb_ids.add(imdb_id)
 
         log.debug('-- Start filtering entries ----------------------------------')
 
@@ -1,14 +1,14 @@
 from __future__ import unicode_literals, division, absolute_import
 import copy
-import os
 import logging
 
 from flexget import plugin
 from flexget.event import event
 from flexget.config_schema import one_or_more
 from flexget.utils.log import log_once
+from flexget.utils.path_index import path_index
 from flexget.utils.template import RenderError
-from flexget.utils.titles import ParseWarning
+from flexget.utils.titles import ParseWarning, SeriesNameIndex
 
 log = logging.getLogger('exists_series')
 
@@ -69,55 +69,53 @@ class FilterExistsSeries(object):
             log.warning('No accepted entries have series information. exists_series cannot filter them')
             return
 
+        # Copy the parser of each series, and only parse the names which could be of that series
+        disk_parsers = dict((copy.copy(entries[0]['series_parser']), series)
+                            for series, entries in accepted_series.iteritems())
+        name_index = SeriesNameIndex(disk_parsers)
+
         for path in paths:
             log.verbose('Scanning %s', path)
-            # crashes on some paths with unicode
-            path = str(os.path.expanduser(path))
-            if not os.path.exists(path):
+            try:
+                items = path_index.items(path, session=task.session)
+            except OSError:
                 raise plugin.PluginWarning('Path %s does not exist' % path, log)
-            # scan through
-            for root, dirs, files in os.walk(path, followlinks=True):
-                # convert filelists into utf-8 to avoid unicode problems
-                dirs = [x.decode('utf-8', 'ignore') for x in dirs]
-                files = [x.decode('utf-8', 'ignore') for x in files]
-                # For speed, only test accepted entries since our priority should be after everything is accepted.
-                for series in accepted_series:
-                    # make new parser from parser in entry
-                    disk_parser = copy.copy(accepted_series[series][0]['series_parser'])
-                    for name in files + dirs:
-                        # run parser on filename data
-                        disk_parser.data = name
-                        try:
-                            disk_parser.parse(data=name)
-                        except ParseWarning as pw:
-                            log_once(pw.value, logger=log)
-                        if disk_parser.valid:
-                            log.debug('name %s is same series as %s', name, series)
-                            log.debug('disk_parser.identifier = %s', disk_parser.identifier)
-                            log.debug('disk_parser.quality = %s', disk_parser.quality)
-                            log.debug('disk_parser.proper_count = %s', disk_parser.proper_count)
+            for item in items:
+                name = item.name
+                for disk_parser in name_index.candidates(name):
+                    series = disk_parsers[disk_parser]
+                    try:
+                        disk_parser.parse(data=name)
+                    except ParseWarning as pw:
+                        log_once(pw.value, logger=log)
+                    if disk_parser.valid:
+                        log.debug('name %s is same series as %s', name, series)
+                        log.debug('disk_parser.identifier = %s', disk_parser.identifier)
+                        log.debug('disk_parser.quality = %s', disk_parser.quality)
+                        log.debug('disk_parser.proper_count = %s', disk_parser.proper_count)
 
-                            for entry in accepted_series[series]:
-                                log.debug('series_parser.identifier = %s', entry['series_parser'].identifier)
-                                if disk_parser.identifier != entry['series_parser'].identifier:
-                                    log.trace('wrong identifier')
+                        for entry in accepted_series[series]:
+                            log.debug('series_parser.identifier = %s', entry['series_parser'].identifier)
+                            if disk_parser.identifier != entry['series_parser'].identifier:
+                                log.trace('wrong identifier')
+                                continue
+                            log.debug('series_parser.quality = %s', entry['series_parser'].quality)
+                            if config.get('allow_different_qualities') == 'better':
+                                if entry['series_parser'].quality > disk_parser.quality:
+                                    log.trace('better quality')
                                     continue
-                                log.debug('series_parser.quality = %s', entry['series_parser'].quality)
-                                if config.get('allow_different_qualities') == 'better':
-                                    if entry['series_parser'].quality > disk_parser.quality:
-                                        log.trace('better quality')
-                                        continue
-                                elif config.get('allow_different_qualities'):
-                                    if disk_parser.quality != entry['series_parser'].quality:
-                                        log.trace('wrong quality')
-                                        continue
-                                log.debug('entry parser.proper_count = %s', entry['series_parser'].proper_count)
-                                if disk_parser.proper_count >= entry['series_parser'].proper_count:
-                                    entry.reject('proper already exists')
-                                    continue
-                                else:
-                                    log.trace('new one is better proper, allowing')
+                            elif config.get('allow_different_qualities'):
+                                if disk_parser.quality != entry['series_parser'].quality:
+                                    log.trace('wrong quality')
                                     continue
+                            log.debug('entry parser.proper_count = %s', entry['series_parser'].proper_count)
+                            if disk_parser.proper_count >= entry['series_parser'].proper_count:
+                                entry.reject('proper already exists')
+                                continue
+                            else:
+                                log.trace('new one is better proper, allowing')
+                                continue
+
 
 @event('plugin.register')
 def register_plugin():
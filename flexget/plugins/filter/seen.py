@@ -19,6 +19,7 @@ from sqlalchemy.schema import ForeignKey
 from flexget import db_schema, options, plugin
 from flexget.event import event
 from flexget.manager import Session
+from flexget.utils.database import query_in_chunks
 from flexget.utils.imdb import is_imdb_url, extract_id
 from flexget.utils.sqlalchemy_utils import table_schema, table_add_column
 from flexget.utils.tools import console
@@ -161,8 +162,9 @@ class FilterSeen(object):
         fields = self.fields
         local = config == 'local'
 
+        # construct list of values looked for each entry
+        entry_values = []
         for entry in task.entries:
-            # construct list of values looked
             values = []
             for field in fields:
                 if field not in entry:
@@ -170,20 +172,32 @@ class FilterSeen(object):
                 if entry[field] not in values and entry[field]:
                     values.append(unicode(entry[field]))
             if values:
-                log.trace('querying for: %s' % ', '.join(values))
-                # check if SeenField.value is any of the values
-                found = task.session.query(SeenField).join(SeenEntry).filter(SeenField.value.in_(values))
-                if local:
-                    found = found.filter(SeenEntry.task == task.name)
-                else:
-                    found = found.filter(SeenEntry.local == False)
-                found = found.first()
-                if found:
-                    log.debug("Rejecting '%s' '%s' because of seen '%s'" % (entry['url'], entry['title'], found.value))
-                    se = task.session.query(SeenEntry).filter(SeenEntry.id == found.seen_entry_id).one()
-                    entry.reject('Entry with %s `%s` is already marked seen in the task %s at %s' %
-                                 (found.field, found.value, se.task, se.added.strftime('%Y-%m-%d %H:%M')),
-                                remember=remember_rejected)
+                entry_values.append((entry, values))
+        if not entry_values:
+            return
+
+        # check which of the values are in SeenField.value, all entries at once
+        all_values = set(value for entry, values in entry_values for value in values)
+        log.trace('querying for %s values' % len(all_values))
+        query = task.session.query(SeenField, SeenEntry).join(SeenEntry)
+        if local:
+            query = query.filter(SeenEntry.task == task.name)
+        else:
+            query = query.filter(SeenEntry.local == False)
+        seen = {}
+        for sf, se in query_in_chunks(query, SeenField.value, all_values):
+            seen.setdefault(sf.value, (sf, se))
+
+        for entry, values in entry_values:
+            for value in values:
+                if value not in seen:
+                    continue
+                found, se = seen[value]
+                log.debug("Rejecting '%s' '%s' because of seen '%s'" % (entry['url'], entry['title'], found.value))
+                entry.reject('Entry with %s `%s` is already marked seen in the task %s at %s' %
+                             (found.field, found.value, se.task, se.added.strftime('%Y-%m-%d %H:%M')),
+                             remember=remember_rejected)
+                break
 
     def on_task_learn(self, task, config):
         """Remember succeeded entries"""
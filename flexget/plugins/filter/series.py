@@ -2,12 +2,13 @@ from __future__ import unicode_literals, division, absolute_import
 import logging
 import re
 import time
+from collections import OrderedDict
 from copy import copy
 from datetime import datetime, timedelta
 
 from sqlalchemy import (Column, Integer, String, Unicode, DateTime, Boolean,
                         desc, select, update, delete, ForeignKey, Index, func, and_, not_)
-from sqlalchemy.orm import relation, backref
+from sqlalchemy.orm import relation, backref, joinedload, subqueryload
 from sqlalchemy.ext.hybrid import Comparator, hybrid_property
 from sqlalchemy.exc import OperationalError
 
@@ -17,11 +18,11 @@ from flexget.event import event
 from flexget.manager import Session
 from flexget.utils import qualities
 from flexget.utils.log import log_once
-from flexget.utils.titles import SeriesParser, ParseWarning, ID_TYPES
+from flexget.utils.titles import SeriesParser, SeriesNameIndex, ParseWarning, ID_TYPES
 from flexget.utils.sqlalchemy_utils import (table_columns, table_exists, drop_tables, table_schema, table_add_column,
                                             create_index)
 from flexget.utils.tools import merge_dict_from_to, parse_timedelta
-from flexget.utils.database import quality_property
+from flexget.utils.database import quality_property, query_in_chunks, IN_CHUNK_SIZE
 
 SCHEMA_VER = 11
 
@@ -554,6 +555,141 @@ def store_parser(session, parser, series=None):
     return releases
 
 
+class SeriesStore(object):
+    """
+    Bookkeeping of the series, episodes and releases seen by a task, done in bulk.
+
+    Parsers are queued with :meth:`add_parser`. :meth:`flush` then loads the existing episodes and releases of all of
+    them in a few queries, and inserts the missing ones with one statement per table. Afterwards :meth:`releases`
+    answers from memory.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        # Series by normalized name
+        self.series = {}
+        # Loaded episodes by (series, identifier), identifiers are unicode as they are when loaded
+        self.episodes = {}
+        # Parsers waiting for the next flush, with their series
+        self.pending = []
+        self.latest_downloads = {}
+
+    def load_series(self, names):
+        """Loads the series with any of `names` from the database, along with their begin episodes."""
+        names = set(normalize_series_name(name) for name in names).difference(self.series)
+        query = self.session.query(Series).options(joinedload(Series.begin))
+        for series in query_in_chunks(query, Series._name_normalized, names):
+            self.series[series._name_normalized] = series
+
+    def get_series(self, name):
+        """Returns series `name` if it was loaded or added, None otherwise."""
+        return self.series.get(normalize_series_name(name))
+
+    def add_series(self, name, identified_by=None):
+        log.debug('adding series %s into db', name)
+        series = Series()
+        series.name = name
+        series.identified_by = identified_by
+        self.session.add(series)
+        self.series[series._name_normalized] = series
+        log.debug('-> added %s' % series)
+        return series
+
+    def load_episodes(self, keys, refresh=False):
+        """
+        Loads existing episodes along with their releases.
+
+        :param keys: (series, identifier) tuples of the episodes
+        :param bool refresh: Reload episodes which are already loaded
+        """
+        wanted = {}
+        for series, identifier in keys:
+            if series.id is not None and (refresh or (series, identifier) not in self.episodes):
+                wanted.setdefault(series.id, set()).add(identifier)
+        series_ids = sorted(wanted)
+        # Both the series ids and identifiers are bound parameters, each gets half of the limit
+        size = IN_CHUNK_SIZE // 2
+        for start in xrange(0, len(series_ids), size):
+            chunk = series_ids[start:start + size]
+            identifiers = set().union(*(wanted[series_id] for series_id in chunk))
+            query = self.session.query(Episode).options(subqueryload(Episode.releases)).\
+                filter(Episode.series_id.in_(chunk))
+            if refresh:
+                query = query.populate_existing()
+            for episode in query_in_chunks(query, Episode.identifier, identifiers, chunk_size=size):
+                if episode.identifier in wanted[episode.series_id]:
+                    self.episodes[(episode.series, episode.identifier)] = episode
+
+    def add_parser(self, parser, series):
+        """Queues the episodes and releases of `parser` to be stored into `series` on the next :meth:`flush`."""
+        self.pending.append((parser, series))
+
+    def find_release(self, episode, parser):
+        for release in episode.releases:
+            if (release.title == parser.data and release._quality == parser.quality.name and
+                    release.proper_count == parser.proper_count):
+                return release
+
+    def flush(self):
+        """Stores the episodes and releases of all queued parsers in the database."""
+        # New series need their ids
+        self.session.flush()
+        self.load_episodes((series, unicode(identifier)) for parser, series in self.pending
+                           for identifier in parser.identifiers)
+        new_episodes = OrderedDict()
+        new_releases = OrderedDict()
+        for parser, series in self.pending:
+            for ix, identifier in enumerate(parser.identifiers):
+                key = (series, unicode(identifier))
+                episode = self.episodes.get(key)
+                if not episode and key not in new_episodes:
+                    log.debug('adding episode %s into series %s', identifier, parser.name)
+                    values = {'identifier': key[1], 'identified_by': parser.id_type, 'season': None,
+                              'number': None, 'series_id': series.id}
+                    # if episodic format
+                    if parser.id_type == 'ep':
+                        values.update(season=parser.season, number=parser.episode + ix)
+                    elif parser.id_type == 'sequence':
+                        values.update(season=0, number=parser.id + ix)
+                    new_episodes[key] = values
+                if episode and self.find_release(episode, parser):
+                    continue
+                release_key = key + (parser.data, parser.quality.name, parser.proper_count)
+                if release_key not in new_releases:
+                    log.debug('adding release %s into episode', parser)
+                    new_releases[release_key] = None
+        self.pending = []
+
+        if new_episodes:
+            log.debug('inserting %s new episodes' % len(new_episodes))
+            self.session.execute(Episode.__table__.insert(), new_episodes.values())
+            self.load_episodes(new_episodes)
+        if new_releases:
+            log.debug('inserting %s new releases' % len(new_releases))
+            now = datetime.now()
+            self.session.execute(Release.__table__.insert(), [
+                {'episode_id': self.episodes[(series, identifier)].id, 'title': title, 'quality': quality,
+                 'proper_count': proper_count, 'downloaded': False, 'first_seen': now}
+                for series, identifier, title, quality, proper_count in new_releases])
+            # Reload the episodes, so that their releases include the new ones
+            self.load_episodes(set(key[:2] for key in new_releases), refresh=True)
+
+    def releases(self, parser, series):
+        """
+        Returns the releases of `parser` in `series`, it must have been stored with :meth:`flush`.
+
+        :return: List of Releases
+        """
+        return [self.find_release(self.episodes[(series, unicode(identifier))], parser)
+                for identifier in parser.identifiers]
+
+    def latest_download(self, series):
+        """Memoized :func:`get_latest_download`, downloads are only learned after the task has been filtered."""
+        if series not in self.latest_downloads:
+            self.latest_downloads[series] = get_latest_download(series)
+        return self.latest_downloads[series]
+
+
 def set_series_begin(series, ep_id):
     """
     Set beginning for series
@@ -896,11 +1032,28 @@ class FilterSeries(FilterSeriesBase):
     def on_task_metainfo(self, task, config):
         config = self.prepare_config(config)
         self.auto_exact(config)
+        store = SeriesStore(task.session)
+        store.load_series(unicode(series_item.keys()[0]) for series_item in config)
+        parsers = []
         for series_item in config:
+            series_name, series_config = series_item.items()[0]
+            parsers.append(self.series_parser(task.session, series_name, series_config, store=store))
+        # Find which series each entry could possibly match, so that only those parsers need to be run on it
+        index = SeriesNameIndex(parsers)
+        candidates = dict((parser, []) for parser in parsers)
+        for entry in task.entries:
+            matches = set()
+            for field in ('title', 'description'):
+                data = entry.get(field)
+                if isinstance(data, basestring) and data:
+                    matches.update(index.candidates(data))
+            for parser in matches:
+                candidates[parser].append(entry)
+        for series_item, parser in zip(config, parsers):
             series_name, series_config = series_item.items()[0]
             log.trace('series_name: %s series_config: %s', series_name, series_config)
             start_time = time.clock()
-            self.parse_series(task.session, task.entries, series_name, series_config)
+            self.parse_series(task.session, candidates[parser], series_name, series_config, parser=parser)
             took = time.clock() - start_time
             log.trace('parsing %s took %s', series_name, took)
 
@@ -916,42 +1069,31 @@ class FilterSeries(FilterSeriesBase):
             if entry.get('series_name') and entry.get('series_id') is not None and entry.get('series_parser'):
                 found_series.setdefault(entry['series_name'], []).append(entry)
 
+        series_items = []
         for series_item in config:
             series_name, series_config = series_item.items()[0]
             if series_config.get('parse_only'):
                 log.debug('Skipping filtering of series %s because of parse_only', series_name)
                 continue
             # Make sure number shows (e.g. 24) are turned into strings
-            series_name = unicode(series_name)
-            db_series = task.session.query(Series).filter(Series.name == series_name).first()
+            series_items.append((unicode(series_name), series_config))
+
+        # Store found episodes of all series into database at once
+        store = SeriesStore(task.session)
+        store.load_series(series_name for series_name, series_config in series_items)
+        for series_name, series_config in series_items:
+            db_series = store.get_series(series_name)
             if not db_series:
-                log.debug('adding series %s into db', series_name)
-                db_series = Series()
-                db_series.name = series_name
-                db_series.identified_by = series_config.get('identified_by', 'auto')
-                task.session.add(db_series)
-                log.debug('-> added %s' % db_series)
+                db_series = store.add_series(series_name, series_config.get('identified_by', 'auto'))
+            for entry in found_series.get(series_name, []):
+                store.add_parser(entry['series_parser'], db_series)
+        store.flush()
+
+        for series_name, series_config in series_items:
             if not series_name in found_series:
                 continue
-            series_entries = {}
-            for entry in found_series[series_name]:
-                # store found episodes into database and save reference for later use
-                releases = store_parser(task.session, entry['series_parser'], series=db_series)
-                entry['series_releases'] = releases
-                series_entries.setdefault(releases[0].episode, []).append(entry)
-
-                # TODO: Unfortunately we are setting these again, even though they were set in metanifo. This is for the
-                # benefit of all_series and series_premiere. Figure a better way.
-                # set custom download path
-                if 'path' in series_config:
-                    log.debug('setting %s custom path to %s', entry['title'], series_config.get('path'))
-                    # Just add this to the 'set' dictionary, so that string replacement is done cleanly
-                    series_config.setdefault('set', {}).update(path=series_config['path'])
-
-                # accept info from set: and place into the entry
-                if 'set' in series_config:
-                    set = plugin.get_plugin_by_name('set')
-                    set.instance.modify(entry, series_config.get('set'))
+            db_series = store.get_series(series_name)
+            series_entries = self.series_entries(store, db_series, found_series[series_name], series_config)
 
             # If we didn't find any episodes for this series, continue
             if not series_entries:
@@ -968,22 +1110,48 @@ class FilterSeries(FilterSeriesBase):
 
             log.trace('series_name: %s series_config: %s', series_name, series_config)
 
-            import time
             start_time = time.clock()
 
-            self.process_series(task, series_entries, series_config)
+            self.process_series(task, series_entries, series_config, store=store)
 
             took = time.clock() - start_time
             log.trace('processing %s took %s', series_name, took)
 
-    def parse_series(self, session, entries, series_name, config):
+    def series_entries(self, store, db_series, entries, config):
         """
-        Search for `series_name` and populate all `series_*` fields in entries when successfully parsed
+        Looks up the releases of `entries` stored by `store`, and applies `config` options which set fields.
+
+        :return: Dict mapping Episodes to entries for that episode
+        """
+        series_entries = {}
+        for entry in entries:
+            # save reference to stored releases for later use
+            releases = store.releases(entry['series_parser'], db_series)
+            entry['series_releases'] = releases
+            series_entries.setdefault(releases[0].episode, []).append(entry)
+
+            # TODO: Unfortunately we are setting these again, even though they were set in metanifo. This is for the
+            # benefit of all_series and series_premiere. Figure a better way.
+            # set custom download path
+            if 'path' in config:
+                log.debug('setting %s custom path to %s', entry['title'], config.get('path'))
+                # Just add this to the 'set' dictionary, so that string replacement is done cleanly
+                config.setdefault('set', {}).update(path=config['path'])
+
+            # accept info from set: and place into the entry
+            if 'set' in config:
+                set = plugin.get_plugin_by_name('set')
+                set.instance.modify(entry, config.get('set'))
+        return series_entries
+
+    def series_parser(self, session, series_name, config, store=None):
+        """
+        Create a :class:`SeriesParser` for `series_name`, with parser flags set based on config / database
 
         :param session: SQLAlchemy session
-        :param entries: List of entries to process
         :param series_name: Series name which is being processed
         :param config: Series config being processed
+        :param store: :class:`SeriesStore` the series has been loaded into, queried from `session` if not given
         """
 
         def get_as_array(config, key):
@@ -993,10 +1161,12 @@ class FilterSeries(FilterSeriesBase):
                 return [v]
             return v
 
-        # set parser flags flags based on config / database
         identified_by = config.get('identified_by', 'auto')
         if identified_by == 'auto':
-            series = session.query(Series).filter(Series.name == series_name).first()
+            if store:
+                series = store.get_series(series_name)
+            else:
+                series = session.query(Series).filter(Series.name == series_name).first()
             if series:
                 # set flag from database
                 identified_by = series.identified_by or 'auto'
@@ -1015,7 +1185,21 @@ class FilterSeries(FilterSeriesBase):
         for id_type in ID_TYPES:
             params[id_type + '_regexps'] = get_as_array(config, id_type + '_regexp')
 
-        parser = SeriesParser(**params)
+        return SeriesParser(**params)
+
+    def parse_series(self, session, entries, series_name, config, parser=None):
+        """
+        Search for `series_name` and populate all `series_*` fields in entries when successfully parsed
+
+        :param session: SQLAlchemy session
+        :param entries: List of entries to process
+        :param series_name: Series name which is being processed
+        :param config: Series config being processed
+        :param parser: :class:`SeriesParser` to use, created with :meth:`series_parser` if not given
+        """
+
+        if parser is None:
+            parser = self.series_parser(session, series_name, config)
 
         for entry in entries:
             # skip processed entries
@@ -1057,14 +1241,17 @@ class FilterSeries(FilterSeriesBase):
                 set = plugin.get_plugin_by_name('set')
                 set.instance.modify(entry, config.get('set'))
 
-    def process_series(self, task, series_entries, config):
+    def process_series(self, task, series_entries, config, store=None):
         """
         Accept or Reject episode from available releases, or postpone choosing.
 
         :param task: Current Task
         :param series_entries: dict mapping Episodes to entries for that episode
         :param config: Series configuration
+        :param store: :class:`SeriesStore` the episodes were stored with
         """
+        if store is None:
+            store = SeriesStore(task.session)
 
         for ep, entries in series_entries.iteritems():
             if not entries:
@@ -1157,7 +1344,8 @@ class FilterSeries(FilterSeriesBase):
                 else:
                     log.debug('-' * 20 + ' episode advancement -->')
                     # Grace is number of distinct eps in the task for this series + 2
-                    if self.process_episode_advancement(ep, entries, grace=len(series_entries)+2):
+                    latest = store.latest_download(ep.series)
+                    if self.process_episode_advancement(ep, entries, latest, grace=len(series_entries)+2):
                         continue
 
             # quality
@@ -1272,10 +1460,12 @@ class FilterSeries(FilterSeriesBase):
             log.debug('no quality meets requirements')
         return result
 
-    def process_episode_advancement(self, episode, entries, grace):
-        """Rejects all episodes that are too old or new (advancement), return True when this happens."""
+    def process_episode_advancement(self, episode, entries, latest, grace):
+        """
+        Rejects all episodes that are too old or new (advancement), return True when this happens.
 
-        latest = get_latest_download(episode.series)
+        :param latest: Latest downloaded Episode of the series, see :func:`get_latest_download`
+        """
         if episode.series.begin and episode.series.begin > latest:
             latest = episode.series.begin
         log.debug('latest download: %s' % latest)
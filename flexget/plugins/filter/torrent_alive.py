@@ -4,6 +4,7 @@ import threading
 import socket
 from urlparse import urlparse, SplitResult, urlsplit, urlunsplit
 import struct
+from Queue import Queue, Empty
 from random import randrange
 from httplib import BadStatusLine
 from urllib import quote
@@ -11,42 +12,30 @@ from urllib2 import URLError
 
 from flexget import plugin
 from flexget.event import event
-from flexget.utils.tools import urlopener
+from flexget.utils.tools import urlopener, TimedLRUDict
 from flexget.utils.bittorrent import bdecode
 
 log = logging.getLogger('torrent_alive')
 
 
-class TorrentAliveThread(threading.Thread):
+# Seeds found from each tracker for each info hash, as {(tracker, info_hash): seeds}
+scrape_cache = TimedLRUDict(cache_time='15 minutes', max_items=10000)
+# Number of trackers scraped at the same time
+MAX_SCRAPE_THREADS = 10
+# Number of info hashes asked in a single scrape, UDP trackers can answer at most 74 in one packet
+HTTP_SCRAPE_HASHES = 50
+UDP_SCRAPE_HASHES = 74
 
-    def __init__(self, tracker, info_hash):
-        threading.Thread.__init__(self)
-        self.tracker = tracker
-        self.info_hash = info_hash
-        self.tracker_seeds = 0
 
-    def run(self):
-        self.tracker_seeds = get_tracker_seeds(self.tracker, self.info_hash)
-        log.debug('%s seeds found from %s' % (self.tracker_seeds, get_scrape_url(self.tracker, self.info_hash)))
+def chunks(items, size):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
 
 
-def max_seeds_from_threads(threads):
-    """
-    Joins the threads and returns the maximum seeds found from any of them.
-
-    :param threads: A list of started `TorrentAliveThread`
-    :return: Maximum seeds found from any of the threads
-    """
-    seeds = 0
-    for background in threads:
-        log.debug('Coming up next: %s' % background.tracker)
-        background.join()
-        seeds = max(seeds, background.tracker_seeds)
-        log.debug('Current hightest number of seeds found: %s' % seeds)
-    return seeds
-
-
-def get_scrape_url(tracker_url, info_hash):
+def get_scrape_url(tracker_url, info_hashes):
+    """Returns the scrape url of `tracker_url` asking for one or more info hashes."""
+    if isinstance(info_hashes, basestring):
+        info_hashes = [info_hashes]
     if 'announce' in tracker_url:
         v = urlsplit(tracker_url)
         sr = SplitResult(v.scheme, v.netloc, v.path.replace('announce', 'scrape'),
@@ -57,18 +46,23 @@ def get_scrape_url(tracker_url, info_hash):
         result = tracker_url + '/scrape'
 
     result += '&' if '?' in result else '?'
-    result += 'info_hash=%s' % quote(info_hash.decode('hex'))
+    result += '&'.join('info_hash=%s' % quote(info_hash.decode('hex')) for info_hash in info_hashes)
     return result
 
 
-def get_udp_seeds(url, info_hash):
+def scrape_udp(url, info_hashes):
+    """
+    Scrapes seeds of many torrents from an UDP tracker in one request.
+
+    :return: Dict of seeds by info hash, empty if the scrape failed
+    """
     parsed_url = urlparse(url)
     port = None
     try:
         port = parsed_url.port
     except ValueError as ve:
         log.error('UDP Port Error, url was %s' % url)
-        return 0
+        return {}
 
     log.debug('Checking for seeds from %s' % url)
 
@@ -77,15 +71,15 @@ def get_udp_seeds(url, info_hash):
 
     if port is None:
         log.error('UDP Port Error, port was None')
-        return 0
+        return {}
 
     if port < 0 or port > 65535:
         log.error('UDP Port Error, port was %s' % port)
-        return 0
+        return {}
 
     # Create the socket
+    clisocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
-        clisocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         clisocket.settimeout(5.0)
         clisocket.connect((parsed_url.hostname, port))
 
@@ -98,68 +92,180 @@ def get_udp_seeds(url, info_hash):
         # check recieved packet for response
         action, transaction_id, connection_id = struct.unpack(b">LLQ", res)
 
-        #build packet hash out of decoded info_hash
-        packet_hash = info_hash.decode('hex')
-
-        # construct packet for scrape with decoded info_hash setting action byte to 2 for scape
-        packet = struct.pack(b">QLL", connection_id, 2, transaction_id) + packet_hash
+        # construct packet for scrape with decoded info_hashes setting action byte to 2 for scape
+        packet = struct.pack(b">QLL", connection_id, 2, transaction_id)
+        packet += b''.join(info_hash.decode('hex') for info_hash in info_hashes)
 
         clisocket.send(packet)
-        # set recieve size of 8 + 12 bytes
-        res = clisocket.recv(20)
+        # 8 byte header followed by 12 bytes for each torrent
+        res = clisocket.recv(8 + 12 * len(info_hashes))
 
     except IOError as e:
         log.warning('Socket Error: %s', e)
-        return 0
+        return {}
+    finally:
+        clisocket.close()
     # Check for UDP error packet
     (action,) = struct.unpack(b">L", res[:4])
     if action == 3:
         log.error('There was a UDP Packet Error 3')
-        return 0
+        return {}
+
+    # first 8 bytes are followed by seeders, completed and leechers for each requested torrent
+    result = {}
+    for index, info_hash in enumerate(info_hashes):
+        offset = 8 + 12 * index
+        if len(res) < offset + 12:
+            break
+        seeders, completed, leechers = struct.unpack(b">LLL", res[offset:offset + 12])
+        result[info_hash] = seeders
+    log.debug('scrape_udp is returning: %s', result)
+    return result
 
-    # first 8 bytes are followed by seeders, completed and leechers for requested torrent
-    seeders, completed, leechers = struct.unpack(b">LLL", res[8:20])
-    log.debug('get_udp_seeds is returning: %s', seeders)
-    clisocket.close()
-    return seeders
 
+def scrape_http(url, info_hashes):
+    """
+    Scrapes seeds of many torrents from a HTTP tracker in one request.
 
-def get_http_seeds(url, info_hash):
-    url = get_scrape_url(url, info_hash)
-    if not url:
-        log.debug('if not url is true returning 0')
-        return 0
+    :return: Dict of seeds by info hash, empty if the scrape failed
+    """
+    url = get_scrape_url(url, info_hashes)
     log.debug('Checking for seeds from %s' % url)
     data = None
     try:
         data = bdecode(urlopener(url, log, retries=1, timeout=10).read()).get('files')
     except URLError as e:
         log.debug('Error scraping: %s' % e)
-        return 0
-    except SyntaxError as e:
+        return {}
+    except (SyntaxError, ValueError) as e:
         log.warning('Error decoding tracker response: %s' % e)
-        return 0
+        return {}
     except BadStatusLine as e:
         log.warning('Error BadStatusLine: %s' % e)
-        return 0
+        return {}
     except IOError as e:
         log.warning('Server error: %s' % e)
-        return 0
+        return {}
     if not data:
         log.debug('No data received from tracker scrape.')
-        return 0
-    log.debug('get_http_seeds is returning: %s' % data.values()[0]['complete'])
-    return data.values()[0]['complete']
+        return {}
+    by_raw_hash = dict((info_hash.decode('hex'), info_hash) for info_hash in info_hashes)
+    result = {}
+    for raw_hash, stats in data.iteritems():
+        # Hashes which happen to be valid utf-8 are decoded by bdecode
+        if isinstance(raw_hash, unicode):
+            raw_hash = raw_hash.encode('utf-8')
+        if raw_hash in by_raw_hash and isinstance(stats, dict):
+            result[by_raw_hash[raw_hash]] = stats.get('complete', 0)
+    if len(info_hashes) == 1 and not result and len(data) == 1:
+        # Some trackers return stats for a single torrent with a key of their own
+        result[info_hashes[0]] = data.values()[0].get('complete', 0)
+    log.debug('scrape_http is returning: %s' % result)
+    return result
 
 
-def get_tracker_seeds(url, info_hash):
+def scrape(url, info_hashes):
+    """Scrapes seeds of `info_hashes` from tracker `url`, in as few requests as the tracker allows."""
     if url.startswith('udp'):
-        return get_udp_seeds(url, info_hash)
+        scraper, size = scrape_udp, UDP_SCRAPE_HASHES
     elif url.startswith('http'):
-        return get_http_seeds(url, info_hash)
+        scraper, size = scrape_http, HTTP_SCRAPE_HASHES
     else:
         log.warning('There has beena problem with the get_tracker_seeds')
-        return 0
+        return {}
+    result = {}
+    for chunk in chunks(info_hashes, size):
+        result.update(scraper(url, chunk))
+    return result
+
+
+def get_udp_seeds(url, info_hash):
+    return scrape_udp(url, [info_hash]).get(info_hash, 0)
+
+
+def get_http_seeds(url, info_hash):
+    return scrape_http(url, [info_hash]).get(info_hash, 0)
+
+
+def get_tracker_seeds(url, info_hash):
+    return scrape(url, [info_hash]).get(info_hash, 0)
+
+
+def scrape_trackers(hashes_by_tracker):
+    """
+    Scrapes several trackers at once, with at most :data:`MAX_SCRAPE_THREADS` running at the same time.
+    Results are stored in :data:`scrape_cache`, torrents already there are not scraped again.
+
+    :param dict hashes_by_tracker: Info hashes to scrape from each tracker url
+    :return: Dict of seeds found by (tracker, info_hash), torrents the tracker did not answer for are left out
+    """
+    results = {}
+    jobs = Queue()
+    for tracker, info_hashes in hashes_by_tracker.iteritems():
+        needed = []
+        for info_hash in set(info_hashes):
+            if (tracker, info_hash) in scrape_cache:
+                results[(tracker, info_hash)] = scrape_cache[(tracker, info_hash)]
+            else:
+                needed.append(info_hash)
+        if needed:
+            jobs.put((tracker, needed))
+
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            try:
+                tracker, info_hashes = jobs.get_nowait()
+            except Empty:
+                return
+            try:
+                seeds = scrape(tracker, info_hashes)
+            except Exception as e:
+                log.debug('Error scraping %s: %s' % (tracker, e))
+                seeds = {}
+            with lock:
+                # Failed scrapes are not cached, so a tracker timeout does not hide torrents for the cache time
+                for info_hash, count in seeds.iteritems():
+                    scrape_cache[(tracker, info_hash)] = results[(tracker, info_hash)] = count
+
+    threads = [threading.Thread(target=worker, name='torrent_alive-%d' % i)
+               for i in range(min(MAX_SCRAPE_THREADS, jobs.qsize()))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def get_trackers(torrent):
+    """Returns the trackers of a torrent which are scraped for seeds."""
+    announce_list = torrent.content.get('announce-list')
+    if announce_list:
+        # Multitracker torrent
+        return [tracker for tier in announce_list for tracker in tier]
+    return [torrent.content['announce']]
+
+
+def check_seeds(entries):
+    """
+    Scrapes all trackers of the torrents of `entries` with one batch of requests per tracker.
+
+    :return: Dict of the highest number of seeds found from any tracker of an entry, by entry id
+    """
+    hashes_by_tracker = {}
+    trackers_by_entry = {}
+    for entry in entries:
+        info_hash = entry['torrent'].info_hash
+        trackers = get_trackers(entry['torrent'])
+        trackers_by_entry[id(entry)] = (info_hash, trackers)
+        for tracker in trackers:
+            hashes_by_tracker.setdefault(tracker, []).append(info_hash)
+    results = scrape_trackers(hashes_by_tracker)
+    seeds = {}
+    for entry_id, (info_hash, trackers) in trackers_by_entry.iteritems():
+        seeds[entry_id] = max([results.get((tracker, info_hash), 0) for tracker in trackers] or [0])
+    return seeds
 
 
 class TorrentAlive(object):
@@ -183,15 +289,41 @@ class TorrentAlive(object):
         config.setdefault('reject_for', '1 hour')
         return config
 
+    def reject_dead(self, task, entries, config, rerun=False):
+        """Scrapes trackers of the torrents of `entries`, and rejects those with too few seeds."""
+        min_seeds = config['min_seeds']
+        entries = [entry for entry in entries if entry.get('torrent')]
+        if not entries:
+            return
+        log.debug('Checking for seeds for %s torrents' % len(entries))
+        found = check_seeds(entries)
+        for entry in entries:
+            seeds = found[id(entry)]
+            # Reject if needed
+            if seeds < min_seeds:
+                entry.reject(reason='Tracker(s) had < %s required seeds. (%s)' % (min_seeds, seeds),
+                             remember_time=config['reject_for'])
+                if rerun:
+                    # Maybe there is better match that has enough seeds
+                    task.rerun()
+            else:
+                log.debug('Found %i seeds from trackers for %s' % (seeds, entry['title']))
+
     @plugin.priority(150)
     def on_task_filter(self, task, config):
         if not config:
             return
         config = self.prepare_config(config)
+        unknown = []
         for entry in task.entries:
-            if 'torrent_seeds' in entry and entry['torrent_seeds'] < config['min_seeds']:
-                entry.reject(reason='Had < %d required seeds. (%s)' %
-                            (config['min_seeds'], entry['torrent_seeds']))
+            if 'torrent_seeds' in entry:
+                if entry['torrent_seeds'] < config['min_seeds']:
+                    entry.reject(reason='Had < %d required seeds. (%s)' %
+                                (config['min_seeds'], entry['torrent_seeds']))
+            else:
+                unknown.append(entry)
+        # Torrents which are already present can be checked before anything gets accepted
+        self.reject_dead(task, unknown, config)
 
     # Run on output phase so that we let torrent plugin output modified torrent file first
     @plugin.priority(250)
@@ -199,54 +331,15 @@ class TorrentAlive(object):
         if not config:
             return
         config = self.prepare_config(config)
-        min_seeds = config['min_seeds']
 
+        entries = []
         for entry in task.accepted:
             # If torrent_seeds is filled, we will have already filtered in filter phase
             if entry.get('torrent_seeds'):
                 log.debug('Not checking trackers for seeds, as torrent_seeds is already filled.')
                 continue
-            log.debug('Checking for seeds for %s:' % entry['title'])
-            torrent = entry.get('torrent')
-            if torrent:
-                seeds = 0
-                info_hash = torrent.info_hash
-                announce_list = torrent.content.get('announce-list')
-                if announce_list:
-                    # Multitracker torrent
-                    threadlist = []
-                    for tier in announce_list:
-                        for tracker in tier:
-                            background = TorrentAliveThread(tracker, info_hash)
-                            try:
-                                background.start()
-                                threadlist.append(background)
-                            except threading.ThreadError:
-                                # If we can't start a new thread, wait for current ones to complete and continue
-                                log.debug('Reached max threads, finishing current threads.')
-                                seeds = max(seeds, max_seeds_from_threads(threadlist))
-                                background.start()
-                                threadlist = [background]
-                            log.debug('Started thread to scrape %s with info hash %s' % (tracker, info_hash))
-
-                    seeds = max(seeds, max_seeds_from_threads(threadlist))
-                    log.debug('Highest number of seeds found: %s' % seeds)
-                else:
-                    # Single tracker
-                    tracker = torrent.content['announce']
-                    try:
-                        seeds = get_tracker_seeds(tracker, info_hash)
-                    except URLError as e:
-                        log.debug('Error scraping %s: %s' % (tracker, e))
-
-                # Reject if needed
-                if seeds < min_seeds:
-                    entry.reject(reason='Tracker(s) had < %s required seeds. (%s)' % (min_seeds, seeds),
-                                 remember_time=config['reject_for'])
-                    # Maybe there is better match that has enough seeds
-                    task.rerun()
-                else:
-                    log.debug('Found %i seeds from trackers' % seeds)
+            entries.append(entry)
+        self.reject_dead(task, entries, config, rerun=True)
 
 
 @event('plugin.register')
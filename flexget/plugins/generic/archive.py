@@ -1,25 +1,47 @@
 from __future__ import unicode_literals, division, absolute_import
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import logging
 import re
+import struct
 from datetime import datetime
 
-from sqlalchemy.orm import relationship
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import relationship, subqueryload
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.schema import Table, ForeignKey
+from sqlalchemy.sql import select, func, literal_column, text as sql_text
 from sqlalchemy import Column, Integer, DateTime, Unicode, Index
 
 from flexget import db_schema, options, plugin
 from flexget.event import event
 from flexget.entry import Entry
 from flexget.options import ParseExtrasAction, get_parser
+from flexget.utils.database import query_in_chunks
 from flexget.utils.sqlalchemy_utils import table_schema, get_index_by_name
 from flexget.utils.tools import console, strip_html
-from flexget.manager import Session
+from flexget.manager import Session, ReadSession
 
 log = logging.getLogger('archive')
 
-SCHEMA_VER = 0
+SCHEMA_VER = 1
+
+# Full text index of archive titles and descriptions, only available on SQLite
+FTS_TABLE = 'archive_entry_fts'
+# Keep the index up to date when archive entries change, an external content table must be updated before the
+# indexed row changes
+FTS_TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS archive_entry_fts_bu BEFORE UPDATE ON archive_entry BEGIN '
+    'DELETE FROM archive_entry_fts WHERE docid=old.id; END',
+    'CREATE TRIGGER IF NOT EXISTS archive_entry_fts_bd BEFORE DELETE ON archive_entry BEGIN '
+    'DELETE FROM archive_entry_fts WHERE docid=old.id; END',
+    'CREATE TRIGGER IF NOT EXISTS archive_entry_fts_au AFTER UPDATE ON archive_entry BEGIN '
+    'INSERT INTO archive_entry_fts(docid, title, description) VALUES(new.id, new.title, new.description); END',
+    'CREATE TRIGGER IF NOT EXISTS archive_entry_fts_ai AFTER INSERT ON archive_entry BEGIN '
+    'INSERT INTO archive_entry_fts(docid, title, description) VALUES(new.id, new.title, new.description); END',
+]
+# Relative weight of a match in title and description when ranking search results
+FTS_WEIGHTS = (1.0, 0.5)
 
 Base = db_schema.versioned_base('archive', SCHEMA_VER)
 
@@ -108,6 +130,58 @@ def get_tag(name, session):
         return source
 
 
+def create_fts(connection):
+    """
+    Creates the full text index of archive entries, if the database supports it.
+
+    :return: True if the index is available
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    try:
+        connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts4(content="archive_entry", '
+                           'title, description)' % FTS_TABLE)
+    except OperationalError as e:
+        log.warning('Full text search is not supported by SQLite, archive searches will be slow: %s' % e)
+        return False
+    for trigger in FTS_TRIGGERS:
+        connection.execute(trigger)
+    connection.execute('INSERT INTO %s(%s) VALUES(\'rebuild\')' % (FTS_TABLE, FTS_TABLE))
+    return True
+
+
+@sqlalchemy_event.listens_for(ArchiveEntry.__table__, 'after_create')
+def archive_entry_created(target, connection, **kw):
+    create_fts(connection)
+
+
+def has_fts(session):
+    """Returns True if the full text index of the archive exists."""
+    if session.bind.dialect.name != 'sqlite':
+        return False
+    return session.execute('SELECT 1 FROM sqlite_master WHERE type=\'table\' AND name=:name',
+                           {'name': FTS_TABLE}).first() is not None
+
+
+def fts_rank(matchinfo):
+    """
+    Ranks a full text search hit. Each matched word scores by how rare it is among all the hits, matches in the
+    title count more than in the description.
+
+    :param matchinfo: Result of the sqlite matchinfo function with 'pcx' format
+    """
+    info = struct.unpack(str('@%dI' % (len(matchinfo) // 4)), matchinfo)
+    phrases, columns = info[:2]
+    score = 0.0
+    for phrase in range(phrases):
+        for column in range(columns):
+            offset = 2 + 3 * (phrase * columns + column)
+            hits, all_hits = info[offset], info[offset + 1]
+            if hits:
+                score += FTS_WEIGHTS[column] * hits / all_hits
+    return score
+
+
 @db_schema.upgrade('archive')
 def upgrade(ver, session):
     if ver is None:
@@ -134,6 +208,10 @@ def upgrade(ver, session):
             log.critical('one time when you have time, it may take hours')
             log.critical('----------------------------------------------')
         ver = 0
+    if ver == 0:
+        log.info('Creating full text index of the archive (may take a while) ...')
+        create_fts(session.connection())
+        ver = 1
     return ver
 
 
@@ -164,30 +242,25 @@ class Archive(object):
         tags = []
         for tag_name in set(tag_names):
             tags.append(get_tag(tag_name, task.session))
+        source = get_source(task.name, task.session)
 
-        count = 0
-        processed = []
-        for entry in task.entries + task.rejected + task.failed:
-            # I think entry can be in multiple of those lists .. not sure though!
-            if entry in processed:
-                continue
-            else:
-                processed.append(entry)
+        entries = OrderedDict()
+        for entry in task.all_entries:
+            entries.setdefault((entry['title'], entry['url']), entry)
+        existing = self.find_existing(task.session, entries)
 
-            ae = task.session.query(ArchiveEntry).\
-                filter(ArchiveEntry.title == entry['title']).\
-                filter(ArchiveEntry.url == entry['url']).first()
+        count = 0
+        for key, entry in entries.iteritems():
+            ae = existing.get(key)
             if ae:
                 # add (missing) sources
-                source = get_source(task.name, task.session)
                 if not source in ae.sources:
                     log.debug('Adding `%s` into `%s` sources' % (task.name, ae))
                     ae.sources.append(source)
                 # add (missing) tags
-                for tag_name in tag_names:
-                    atag = get_tag(tag_name, task.session)
+                for atag in tags:
                     if not atag in ae.tags:
-                        log.debug('Adding tag %s into %s' % (tag_name, ae))
+                        log.debug('Adding tag %s into %s' % (atag.name, ae))
                         ae.tags.append(atag)
             else:
                 # create new archive entry
@@ -197,7 +270,7 @@ class Archive(object):
                 if 'description' in entry:
                     ae.description = entry['description']
                 ae.task = task.name
-                ae.sources.append(get_source(task.name, task.session))
+                ae.sources.append(source)
                 if tags:
                     # note, we're extending empty list
                     ae.tags.extend(tags)
@@ -207,6 +280,21 @@ class Archive(object):
         if count:
             log.verbose('Added %i new entries to archive' % count)
 
+    def find_existing(self, session, entries):
+        """
+        Looks up archived entries for many entries at once.
+
+        :param dict entries: Entries keyed by (title, url)
+        :return: Dict of ArchiveEntries keyed by (title, url)
+        """
+        existing = {}
+        query = session.query(ArchiveEntry).options(subqueryload(ArchiveEntry.sources), subqueryload(ArchiveEntry.tags))
+        for ae in query_in_chunks(query, ArchiveEntry.title, set(title for title, url in entries)):
+            key = (ae.title, ae.url)
+            if key in entries:
+                existing.setdefault(key, ae)
+        return existing
+
     def on_task_abort(self, task, config):
         """
         Archive even on task abort, except if the abort has happened before session
@@ -351,6 +439,9 @@ def search(session, text, tags=None, sources=None, desc=False):
     """
     Search from the archive.
 
+    When the full text index is available, returns entries containing all words of `text` in their title or
+    description, best matches first. Otherwise titles are searched for the words in the given order.
+
     :param string text: Search text, spaces and dots are tried to be ignored.
     :param Session session: SQLAlchemy session, should not be closed while iterating results.
     :param list tags: Optional list of acceptable tags
@@ -358,11 +449,23 @@ def search(session, text, tags=None, sources=None, desc=False):
     :param bool desc: Sort results descending
     :return: ArchiveEntries responding to query
     """
-    keyword = unicode(text).replace(' ', '%').replace('.', '%')
-    # clean the text from any unwanted regexp, convert spaces and keep dots as dots
-    normalized_re = re.escape(text.replace('.', ' ')).replace('\\ ', ' ').replace(' ', '.')
-    find_re = re.compile(normalized_re, re.IGNORECASE)
-    query = session.query(ArchiveEntry).filter(ArchiveEntry.title.like('%' + keyword + '%'))
+    words = re.findall(r'\w+', unicode(text), re.UNICODE)
+    if words and has_fts(session):
+        # Quote the words so they are never taken as operators, match any word starting with them
+        terms = ' '.join('"%s*"' % word for word in words)
+        session.connection().connection.create_function('archive_rank', 1, fts_rank)
+        hits = select([literal_column('docid').label('id'),
+                       func.archive_rank(func.matchinfo(literal_column(FTS_TABLE), 'pcx')).label('rank')]).\
+            select_from(sql_text(FTS_TABLE)).where(sql_text('%s MATCH :terms' % FTS_TABLE).bindparams(terms=terms)).\
+            alias('hits')
+        query = session.query(ArchiveEntry).join(hits, ArchiveEntry.id == hits.c.id).order_by(hits.c.rank.desc())
+        find_re = None
+    else:
+        keyword = unicode(text).replace(' ', '%').replace('.', '%')
+        # clean the text from any unwanted regexp, convert spaces and keep dots as dots
+        normalized_re = re.escape(text.replace('.', ' ')).replace('\\ ', ' ').replace(' ', '.')
+        find_re = re.compile(normalized_re, re.IGNORECASE)
+        query = session.query(ArchiveEntry).filter(ArchiveEntry.title.like('%' + keyword + '%'))
     if tags:
         query = query.filter(ArchiveEntry.tags.any(ArchiveTag.name.in_(tags)))
     if sources:
@@ -372,10 +475,10 @@ def search(session, text, tags=None, sources=None, desc=False):
     else:
         query = query.order_by(ArchiveEntry.added.asc())
     for a in query.yield_per(5):
-        if find_re.match(a.title):
-            yield a
-        else:
+        if find_re and not find_re.match(a.title):
             log.trace('title %s is too wide match' % a.title)
+            continue
+        yield a
 
 
 def cli_search(options):
@@ -395,7 +498,7 @@ def cli_search(options):
             console('Description: %s' % strip_html(ae.description))
         console('---')
 
-    session = Session()
+    session = ReadSession()
     try:
         console('Searching: %s' % search_term)
         if tags:
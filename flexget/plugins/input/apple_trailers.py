@@ -62,10 +62,12 @@ class AppleTrailers(InputRSS):
             url_extension = 'includes/extralarge.html'
         else:
             url_extension = 'includes/large.html'
-        for url, titles in trailers.iteritems():
-            inc_url = url + url_extension
+        # Fetch all the playlist pages at once, rather than one after another
+        pages = [(url, titles, task.requests.submit('get', url + url_extension))
+                 for url, titles in trailers.iteritems()]
+        for url, titles, future in pages:
             try:
-                page = task.requests.get(inc_url)
+                page = future.result()
             except RequestException as err:
                 log.warning("RequestsException when opening playlist page: %s" % err)
                 continue
@@ -70,6 +70,7 @@ class InputBacklog(object):
         return validator.factory('interval')
 
     @plugin.priority(-255)
+    @plugin.requery_on_rerun
     def on_task_input(self, task, config):
         # Get a list of entries to inject
         injections = self.get_injections(task)
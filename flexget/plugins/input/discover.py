@@ -240,6 +240,7 @@ class Discover(object):
                         (config['interval'], interval_count))
         return result
 
+    @plugin.requery_on_rerun
     def on_task_input(self, task, config):
         task.no_entries_ok = True
         entries = self.execute_inputs(config, task)
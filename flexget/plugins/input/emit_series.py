@@ -61,6 +61,7 @@ class EmitSeries(object):
             entry.on_complete(self.on_search_complete, task=task, identified_by=series.identified_by)
         return entry
 
+    @plugin.requery_on_rerun
     def on_task_input(self, task, config):
         if not config:
             return
@@ -302,21 +302,31 @@ class InputRSS(object):
 
         log.debug('encoding %s', rss.encoding)
 
-        last_entry_id = ''
+        # ids of the items processed on the last run
+        processed_ids = set()
+        last_entry_id = None
         if not all_entries:
             # Test to make sure entries are in descending order
             if rss.entries and rss.entries[0].get('published_parsed') and rss.entries[-1].get('published_parsed'):
                 if rss.entries[0]['published_parsed'] < rss.entries[-1]['published_parsed']:
                     # Sort them if they are not
                     rss.entries.sort(key=lambda x: x['published_parsed'], reverse=True)
+            processed_ids.update(task.simple_persistence.get('%s_entry_ids' % url_hash, []))
+            # Only the newest item used to be remembered, and everything after it in the feed was skipped
             last_entry_id = task.simple_persistence.get('%s_last_entry' % url_hash)
+            if processed_ids:
+                last_entry_id = None
+        reached_last_entry = False
 
         # new entries to be created
         entries = []
+        # ids of all items currently in the feed
+        entry_ids = []
 
         # field name for url can be configured by setting link.
         # default value is auto but for example guid is used in some feeds
         ignored = 0
+        skipped = 0
         for entry in rss.entries:
 
             # Check if title field is overridden in config
@@ -331,11 +341,13 @@ class InputRSS(object):
             entry.title = entry[title_field]
 
             # Check we haven't already processed this entry in a previous run
-            if last_entry_id == entry.title + entry.get('guid', ''):
-                log.verbose('Not processing entries from last run.')
-                # Let details plugin know that it is ok if this task doesn't produce any entries
-                task.no_entries_ok = True
-                break
+            entry_id = entry.title + entry.get('guid', '')
+            entry_ids.append(entry_id)
+            if last_entry_id and entry_id == last_entry_id:
+                reached_last_entry = True
+            if reached_last_entry or entry_id in processed_ids:
+                skipped += 1
+                continue
 
             # remove annoying zero width spaces
             entry.title = entry.title.replace(u'\u200B', u'')
@@ -436,10 +448,17 @@ class InputRSS(object):
 
             add_entry(e)
 
-        # Save last spot in rss
-        if rss.entries:
+        if skipped:
+            log.verbose('Not processing %s entries from last run.', skipped)
+            # Let details plugin know that it is ok if this task doesn't produce any entries
+            task.no_entries_ok = True
+
+        # Save the items of this run, so they can be skipped if still in the feed next time
+        if entry_ids:
             log.debug('Saving location in rss feed.')
-            task.simple_persistence['%s_last_entry' % url_hash] = rss.entries[0].title + rss.entries[0].get('guid', '')
+            task.simple_persistence['%s_entry_ids' % url_hash] = entry_ids
+            if '%s_last_entry' % url_hash in task.simple_persistence:
+                del task.simple_persistence['%s_last_entry' % url_hash]
 
         if ignored:
             if not config.get('silent'):
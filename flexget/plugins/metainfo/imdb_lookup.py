@@ -13,7 +13,7 @@ from flexget.manager import Session
 from flexget.utils.log import log_once
 from flexget.utils.imdb import ImdbSearch, ImdbParser, extract_id, make_url
 from flexget.utils.sqlalchemy_utils import table_add_column
-from flexget.utils.database import with_session
+from flexget.utils.database import with_session, query_in_chunks
 from flexget.utils.sqlalchemy_utils import table_columns, get_index_by_name, table_schema
 
 SCHEMA_VER = 4
@@ -262,7 +262,44 @@ class ImdbLookup(object):
             self.register_lazy_fields(entry)
 
     def register_lazy_fields(self, entry):
-        entry.register_lazy_fields(self.field_map, self.lazy_loader)
+        entry.register_lazy_fields(self.field_map, self.lazy_loader, prefetch=self.prefetch)
+
+    def prefetch(self, entries):
+        """
+        Populates all given entries which have movie details cached in the database, using a few bulk queries
+        instead of one lookup per entry. Remaining entries are looked up one by one when they are evaluated.
+        """
+        urls = {}
+        titles = {}
+        for entry in entries:
+            url = entry.get('imdb_url', eval_lazy=False)
+            if not url and entry.get('imdb_id', eval_lazy=False):
+                url = make_url(entry['imdb_id'])
+            if url:
+                urls.setdefault(url, []).append(entry)
+            elif entry.get('title', eval_lazy=False):
+                titles.setdefault(entry['title'], []).append(entry)
+
+        session = Session()
+        try:
+            # Resolve urls for titles that have been searched before
+            for result in query_in_chunks(session.query(SearchResult), SearchResult.title, titles.keys()):
+                if result.url and not result.fails and result.title in titles:
+                    urls.setdefault(result.url, []).extend(titles.pop(result.title))
+
+            query = session.query(Movie).options(joinedload(Movie.genres), joinedload(Movie.actors),
+                                                 joinedload(Movie.directors),
+                                                 joinedload(Movie.languages).joinedload(MovieLanguage.language))
+            found = 0
+            for movie in query_in_chunks(query, Movie.url, urls.keys()):
+                if movie.expired:
+                    continue
+                for entry in urls.get(movie.url, []):
+                    entry.update_using_map(self.field_map, movie)
+                    found += 1
+            log.debug('prefetched imdb details for %s of %s entries' % (found, len(entries)))
+        finally:
+            session.close()
 
     def lazy_loader(self, entry, field):
         """Does the lookup for this entry and populates the entry fields."""
@@ -15,6 +15,7 @@ class MaxReRuns(object):
     def on_task_start(self, task, config):
         task.max_reruns = int(config)
 
+    @plugin.requery_on_rerun
     def on_task_input(self, task, config):
         task.rerun()
 
@@ -6,7 +6,7 @@ from sqlalchemy import Column, String, Integer, DateTime, Unicode, desc
 
 from flexget import options, plugin
 from flexget.event import event
-from flexget.manager import Base, Session
+from flexget.manager import Base, ReadSession
 from flexget.utils.tools import console
 
 log = logging.getLogger('history')
@@ -55,7 +55,7 @@ class PluginHistory(object):
 
 
 def do_cli(manager, options):
-    session = Session()
+    session = ReadSession()
     try:
         console('-- History: ' + '-' * 67)
         query = session.query(History)
@@ -173,6 +173,11 @@ class OutputRSS(object):
             for item in task.session.query(RSSEntry).filter(RSSEntry.file == config['file']).all():
                 task.session.delete(item)
 
+        try:
+            template = get_template(config['template'], 'rss')
+        except ValueError as e:
+            raise plugin.PluginError('Invalid template specified: %s' % e)
+
         # save entries into db for RSS generation
         for entry in task.accepted:
             rss = RSSEntry()
@@ -182,10 +187,6 @@ class OutputRSS(object):
                     rss.link = entry[field]
                     break
 
-            try:
-                template = get_template(config['template'], 'rss')
-            except ValueError as e:
-                raise plugin.PluginError('Invalid template specified: %s' % e)
             try:
                 rss.description = render_from_entry(template, entry)
             except RenderError as e:
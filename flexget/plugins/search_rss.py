@@ -17,7 +17,7 @@ class SearchRSS(object):
     schema = {'$ref': '/schema/plugin/rss'}
 
     def search(self, entry, config=None):
-        from flexget.utils.template import environment
+        from flexget.utils.template import get_template_from_string
         from flexget.manager import manager
         search_strings = [urllib.quote(normalize_unicode(s).encode('utf-8'))
                           for s in entry.get('search_strings', [entry['title']])]
@@ -28,7 +28,7 @@ class SearchRSS(object):
             task = Task(manager, 'search_rss_task', config={})
             # Use a copy of the config, so we don't overwrite jinja url when filling in search term
             config = rss_plugin.instance.build_config(config).copy()
-            template = environment.from_string(config['url'])
+            template = get_template_from_string(config['url'])
             config['url'] = template.render({'search_term': search_string})
             config['all_entries'] = True
             # TODO: capture some other_fields to try to find seed/peer/content_size numbers?
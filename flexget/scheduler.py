@@ -1,4 +1,6 @@
 from __future__ import unicode_literals, division, absolute_import
+from collections import defaultdict
+from contextlib import contextmanager
 import copy
 from datetime import datetime, timedelta, time as dt_time
 import fnmatch
@@ -55,6 +57,8 @@ yaml_schedule = {
 }
 
 
+workers_schema = {'type': 'integer', 'minimum': 1}
+
 main_schema = {
     'type': 'array',
     'items': {
@@ -95,9 +99,20 @@ class Scheduler(threading.Thread):
         self.manager = manager
         self.triggers = []
         self.run_schedules = True
+        self.workers = []
+        # Names of tasks currently being executed, and jobs waiting for those tasks to finish.
+        # You must hold the jobs_lock while using these.
+        self.jobs_lock = threading.Lock()
+        self.running_tasks = set()
+        self.waiting_jobs = defaultdict(list)
         self._shutdown_now = False
         self._shutdown_when_finished = False
 
+    @property
+    def num_workers(self):
+        """Number of tasks which are allowed to execute at the same time."""
+        return self.manager.config.get('task_workers', 1)
+
     def load_schedules(self):
         """Clears current schedules and loads them from the config."""
         with self.triggers_lock:
@@ -158,8 +173,9 @@ class Scheduler(threading.Thread):
         with self.triggers_lock:
             for trigger in self.triggers:
                 if trigger.should_run:
-                    with self.run_queue.mutex:
-                        if any(j.trigger_id == trigger.uid for j in self.run_queue.queue):
+                    with self.run_queue.mutex, self.jobs_lock:
+                        waiting = itertools.chain(*self.waiting_jobs.values())
+                        if any(j.trigger_id == trigger.uid for j in itertools.chain(self.run_queue.queue, waiting)):
                             log.error('Not firing schedule %r. Tasks from last run have still not finished.' % trigger)
                             log.error('You may need to increase the interval for this schedule.')
                             continue
@@ -177,40 +193,64 @@ class Scheduler(threading.Thread):
         super(Scheduler, self).start()
 
     def run(self):
-        from flexget.task import Task, TaskAbort
         while not self._shutdown_now:
+            self.start_workers()
             if self.run_schedules:
                 self.queue_pending_jobs()
-            # Grab the first job from the run queue and do it
-            try:
-                job = self.run_queue.get(timeout=0.5)
-            except Queue.Empty:
-                if self._shutdown_when_finished:
-                    self._shutdown_now = True
-                continue
-            if job.output:
-                # Hook up our log and stdout to give back to the requester
-                old_stdout, old_stderr = sys.stdout, sys.stderr
-                sys.stdout, sys.stderr = Tee(job.output, sys.stdout), Tee(job.output, sys.stderr)
-                # TODO: Use a filter to capture only the logging for this execution?
-                streamhandler = logging.StreamHandler(job.output)
-                streamhandler.setFormatter(FlexGetFormatter())
-                logging.getLogger().addHandler(streamhandler)
-            try:
-                Task(self.manager, job.task, options=job.options).execute()
-            except TaskAbort as e:
-                log.debug('task %s aborted: %r' % (job.task, e))
-            finally:
-                self.run_queue.task_done()
-                job.finished_event.set()
-                if job.output:
-                    sys.stdout, sys.stderr = old_stdout, old_stderr
-                    logging.getLogger().removeHandler(streamhandler)
-        remaining_jobs = self.run_queue.qsize()
+            # Jobs which are waiting for another job of the same task to finish are still counted as unfinished
+            if self._shutdown_when_finished and not self.run_queue.unfinished_tasks:
+                self._shutdown_now = True
+                break
+            time.sleep(0.5)
+        # Let the workers finish any jobs they are currently running
+        for worker in self.workers:
+            worker.join()
+        remaining_jobs = self.run_queue.qsize() + sum(len(jobs) for jobs in self.waiting_jobs.itervalues())
         if remaining_jobs:
             log.warning('Scheduler shut down with %s jobs remaining in the queue to run.' % remaining_jobs)
         log.debug('scheduler shut down')
 
+    def start_workers(self):
+        """Makes sure there is a running worker for each of the configured worker slots."""
+        self.workers = [w for w in self.workers if w.is_alive()]
+        used_slots = set(w.slot for w in self.workers)
+        for slot in range(self.num_workers):
+            if slot not in used_slots:
+                worker = Worker(self, slot)
+                self.workers.append(worker)
+                worker.start()
+
+    def get_job(self, timeout=0.5):
+        """
+        Takes the next job which can be run from the run queue, and marks its task as running.
+        Jobs for a task which is already running are set aside until that task finishes.
+
+        :returns: A :class:`Job` instance, or None if no job could be started within `timeout` seconds.
+        """
+        try:
+            job = self.run_queue.get(timeout=timeout)
+        except Queue.Empty:
+            return None
+        with self.jobs_lock:
+            if job.task in self.running_tasks:
+                log.debug('task %s is already running, its next run will wait for it to finish' % job.task)
+                self.waiting_jobs[job.task].append(job)
+                return None
+            self.running_tasks.add(job.task)
+        return job
+
+    def job_done(self, job):
+        """Marks the task of `job` as no longer running, and requeues any jobs that were waiting for it."""
+        with self.jobs_lock:
+            self.running_tasks.discard(job.task)
+            waiting = self.waiting_jobs.pop(job.task, [])
+        for waiting_job in waiting:
+            self.run_queue.put(waiting_job)
+            # The job was already counted as unfinished when it was first queued
+            self.run_queue.task_done()
+        self.run_queue.task_done()
+        job.finished_event.set()
+
     def wait(self):
         """
         Waits for the thread to exit.
@@ -221,7 +261,7 @@ class Scheduler(threading.Thread):
 
     def shutdown(self, finish_queue=True):
         """
-        Ends the thread. If a job is running, waits for it to finish first.
+        Ends the thread. If jobs are running, waits for them to finish first.
 
         :param bool finish_queue: If this is True, shutdown will wait until all queued tasks have finished.
         """
@@ -231,6 +271,31 @@ class Scheduler(threading.Thread):
             self._shutdown_now = True
 
 
+class Worker(threading.Thread):
+    """Executes jobs from the scheduler run queue. The scheduler runs one of these for each allowed concurrent task."""
+
+    def __init__(self, scheduler, slot):
+        super(Worker, self).__init__(name='worker-%s' % slot)
+        self.daemon = True
+        self.scheduler = scheduler
+        self.slot = slot
+
+    def run(self):
+        from flexget.task import Task, TaskAbort
+        # Exit when our slot is no longer needed after the number of workers has been lowered in the config
+        while not self.scheduler._shutdown_now and self.slot < self.scheduler.num_workers:
+            job = self.scheduler.get_job()
+            if job is None:
+                continue
+            try:
+                with capture_output(job.output):
+                    Task(self.scheduler.manager, job.task, options=job.options).execute()
+            except TaskAbort as e:
+                log.debug('task %s aborted: %r' % (job.task, e))
+            finally:
+                self.scheduler.job_done(job)
+
+
 class Job(object):
     """A job for the scheduler to execute."""
     #: Used to determine which job to run first when multiple jobs are waiting.
@@ -401,6 +466,70 @@ class Tee(object):
         return method_runner
 
 
+class ThreadTee(object):
+    """
+    Stands in for `sys.stdout` or `sys.stderr`. Everything is written to the original stream, and also to the
+    output registered for the writing thread with :func:`capture_output`, if any.
+    """
+    local = threading.local()
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __getattr__(self, meth):
+        output = getattr(ThreadTee.local, 'output', None)
+        if output is None:
+            return getattr(self.stream, meth)
+        return getattr(Tee(output, self.stream), meth)
+
+
+class ThreadFilter(logging.Filter):
+    """Only passes log records emitted from the given thread."""
+
+    def __init__(self, thread_ident):
+        logging.Filter.__init__(self)
+        self.thread_ident = thread_ident
+
+    def filter(self, record):
+        return record.thread == self.thread_ident
+
+
+_capture_lock = threading.Lock()
+_capture_count = 0
+
+
+@contextmanager
+def capture_output(output):
+    """
+    Context manager which hooks up log messages and stdout/stderr output from the current thread to also be written
+    to `output`. Output of other threads is not captured, so concurrently running jobs don't interleave.
+
+    :param output: A file-like object. If None, nothing is captured.
+    """
+    global _capture_count
+    if output is None:
+        yield
+        return
+    with _capture_lock:
+        if not _capture_count:
+            sys.stdout, sys.stderr = ThreadTee(sys.stdout), ThreadTee(sys.stderr)
+        _capture_count += 1
+    ThreadTee.local.output = output
+    streamhandler = logging.StreamHandler(output)
+    streamhandler.setFormatter(FlexGetFormatter())
+    streamhandler.addFilter(ThreadFilter(threading.current_thread().ident))
+    logging.getLogger().addHandler(streamhandler)
+    try:
+        yield
+    finally:
+        logging.getLogger().removeHandler(streamhandler)
+        ThreadTee.local.output = None
+        with _capture_lock:
+            _capture_count -= 1
+            if not _capture_count:
+                sys.stdout, sys.stderr = sys.stdout.stream, sys.stderr.stream
+
+
 class BufferQueue(Queue.Queue):
     """Used in place of a file-like object to capture text and access it safely from another thread."""
     # Allow access to the Empty error from here
@@ -413,3 +542,4 @@ class BufferQueue(Queue.Queue):
 @event('config.register')
 def register_config():
     register_config_key('schedules', main_schema)
+    register_config_key('task_workers', workers_schema)
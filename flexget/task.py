@@ -9,7 +9,7 @@ from sqlalchemy import Column, Unicode, String, Integer
 
 from flexget import config_schema
 from flexget import db_schema
-from flexget.entry import EntryUnicodeError
+from flexget.entry import EntryUnicodeError, _missing
 from flexget.event import fire_event, event
 from flexget.manager import Session
 from flexget.plugin import (get_plugins, task_phases, phase_methods, PluginWarning, PluginError,
@@ -70,16 +70,21 @@ class EntryIterator(object):
         self.all_entries = entries
         if isinstance(states, basestring):
             states = [states]
-        self.filter = lambda e: e._state in states
+        self.states = tuple(states)
+        self.filter = lambda e: e._state in self.states
 
     def __iter__(self):
+        if not self:
+            return iter([])
         return itertools.ifilter(self.filter, self.all_entries)
 
     def __bool__(self):
-        return any(e for e in self)
+        return len(self) > 0
+
+    __nonzero__ = __bool__
 
     def __len__(self):
-        return sum(1 for e in self)
+        return self.all_entries.count_states(self.states)
 
     def __add__(self, other):
         return itertools.chain(self, other)
@@ -90,6 +95,8 @@ class EntryIterator(object):
     def __getitem__(self, item):
         if not isinstance(item, int):
             raise ValueError('Index must be integer.')
+        if item >= len(self):
+            raise IndexError('%d is out of bounds' % item)
         for index, entry in enumerate(self):
             if index == item:
                 return entry
@@ -105,12 +112,53 @@ class EntryIterator(object):
     def sort(self, *args, **kwargs):
         self.all_entries.sort(*args, **kwargs)
 
+    def find(self, **values):
+        """
+        Find the first entry with given field values.
+
+        Uses the indexes of the container when one of the fields is indexed, otherwise scans the entries.
+        """
+        candidates = None
+        for field, value in values.iteritems():
+            found = self.all_entries.lookup(field, value)
+            if found is not None and (candidates is None or len(found) < len(candidates)):
+                candidates = found
+        if candidates is None:
+            search = self
+        elif len(candidates) > 1:
+            # Keep the order of the container when there are several candidates
+            ids = set(id(entry) for entry in candidates)
+            search = (entry for entry in self if id(entry) in ids)
+        else:
+            search = (entry for entry in candidates if self.filter(entry))
+        for entry in search:
+            for k, v in values.iteritems():
+                if not (k in entry and entry[k] == v):
+                    break
+            else:
+                return entry
+        return None
+
 
 class EntryContainer(list):
-    """Container for a list of entries, also contains accepted, rejected failed iterators over them."""
+    """
+    Container for a list of entries, also contains accepted, rejected failed iterators over them.
+
+    Entries tell the container when their state or one of the :attr:`INDEXED_FIELDS` changes, so counting the
+    entries in each state and looking them up by those fields does not need to go through the whole list.
+    """
+
+    INDEXED_FIELDS = ('title', 'url', 'original_url')
 
     def __init__(self, iterable=None):
-        list.__init__(self, iterable or [])
+        list.__init__(self)
+        # Number of times each entry is in the container, by id
+        self._refs = {}
+        self._counts = dict((state, 0) for state in ('undecided', 'accepted', 'rejected', 'failed'))
+        # field -> value -> {id: entry}
+        self._indexes = dict((field, {}) for field in self.INDEXED_FIELDS)
+        # Number of entries with a value which can not be indexed (eg. lazy fields) for each field
+        self._unindexed = dict((field, 0) for field in self.INDEXED_FIELDS)
 
         self._entries = EntryIterator(self, ['undecided', 'accepted'])
         self._accepted = EntryIterator(self, 'accepted')  # accepted entries, can still be rejected
@@ -118,6 +166,9 @@ class EntryContainer(list):
         self._failed = EntryIterator(self, 'failed')  # failed entries
         self._undecided = EntryIterator(self, 'undecided')  # undecided entries (default)
 
+        if iterable:
+            self.extend(iterable)
+
     # Make these read-only properties
     entries = property(lambda self: self._entries)
     accepted = property(lambda self: self._accepted)
@@ -125,6 +176,135 @@ class EntryContainer(list):
     failed = property(lambda self: self._failed)
     undecided = property(lambda self: self._undecided)
 
+    def count_states(self, states):
+        """Returns the number of entries in any of the given states."""
+        return sum(self._counts.get(state, 0) for state in states)
+
+    def lookup(self, field, value):
+        """
+        Returns the entries which had `value` in `field` when it was last set, or None if the index can not tell.
+
+        The result may contain entries which have since had the field deleted, callers should check the values.
+        """
+        index = self._indexes.get(field)
+        if index is None or self._unindexed[field] or not isinstance(value, basestring):
+            return None
+        return index.get(value, {}).values()
+
+    def _index(self, entry, field, value):
+        if value is _missing:
+            return
+        if isinstance(value, basestring):
+            self._indexes[field].setdefault(value, {})[id(entry)] = entry
+        else:
+            self._unindexed[field] += 1
+
+    def _unindex(self, entry, field, value):
+        if value is _missing:
+            return
+        if isinstance(value, basestring):
+            index = self._indexes[field]
+            if value in index:
+                index[value].pop(id(entry), None)
+                if not index[value]:
+                    del index[value]
+        else:
+            self._unindexed[field] -= 1
+
+    def _add(self, entry):
+        refs = self._refs.get(id(entry), 0)
+        self._refs[id(entry)] = refs + 1
+        self._counts[entry._state] += 1
+        if not refs:
+            entry._add_container(self)
+            for field in self.INDEXED_FIELDS:
+                self._index(entry, field, dict.get(entry, field, _missing))
+
+    def _discard(self, entry):
+        refs = self._refs.pop(id(entry)) - 1
+        self._counts[entry._state] -= 1
+        if refs:
+            self._refs[id(entry)] = refs
+        else:
+            entry._remove_container(self)
+            for field in self.INDEXED_FIELDS:
+                self._unindex(entry, field, dict.get(entry, field, _missing))
+
+    def entry_state_changed(self, entry, old_state):
+        """Called by entries in this container when their state changes."""
+        refs = self._refs.get(id(entry), 0)
+        self._counts[old_state] -= refs
+        self._counts[entry._state] += refs
+
+    def entry_field_changed(self, entry, field, old_value):
+        """Called by entries in this container when one of their fields is set."""
+        if field in self._indexes and id(entry) in self._refs:
+            self._unindex(entry, field, old_value)
+            self._index(entry, field, dict.get(entry, field, _missing))
+
+    # Keep track of entries going in and out of the list
+
+    def append(self, entry):
+        list.append(self, entry)
+        self._add(entry)
+
+    def extend(self, entries):
+        entries = list(entries)
+        list.extend(self, entries)
+        for entry in entries:
+            self._add(entry)
+
+    def __iadd__(self, entries):
+        self.extend(entries)
+        return self
+
+    def __imul__(self, n):
+        if n <= 0:
+            del self[:]
+        else:
+            self.extend(list(self) * (n - 1))
+        return self
+
+    def insert(self, index, entry):
+        list.insert(self, index, entry)
+        self._add(entry)
+
+    def pop(self, index=-1):
+        entry = list.pop(self, index)
+        self._discard(entry)
+        return entry
+
+    def remove(self, entry):
+        del self[self.index(entry)]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            removed = list.__getitem__(self, index)
+            added = value = list(value)
+        else:
+            removed = [list.__getitem__(self, index)]
+            added = [value]
+        list.__setitem__(self, index, value)
+        for entry in added:
+            self._add(entry)
+        for entry in removed:
+            self._discard(entry)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            removed = list.__getitem__(self, index)
+        else:
+            removed = [list.__getitem__(self, index)]
+        list.__delitem__(self, index)
+        for entry in removed:
+            self._discard(entry)
+
+    def __setslice__(self, i, j, value):
+        self.__setitem__(slice(max(0, i), max(0, j)), value)
+
+    def __delslice__(self, i, j):
+        self.__delitem__(slice(max(0, i), max(0, j)))
+
     def __repr__(self):
         return '<EntryContainer(%s)>' % list.__repr__(self)
 
@@ -194,6 +374,8 @@ class Task(object):
 
         # not to be reset
         self._rerun_count = 0
+        # Entries produced by each input plugin on the first run, reused by reruns
+        self._input_cache = None
 
         self.config_modified = None
 
@@ -267,6 +449,8 @@ class Task(object):
         self.silent_abort = False
 
         self._rerun = False
+        # Input plugin names and the entries they returned during this run, None for injected entries
+        self._input_sources = []
 
         # current state
         self.current_phase = None
@@ -315,13 +499,7 @@ class Task(object):
         cat = getattr(self, category)
         if not isinstance(cat, EntryIterator):
             raise TypeError('category must be a EntryIterator')
-        for entry in cat:
-            for k, v in values.iteritems():
-                if not (k in entry and entry[k] == v):
-                    break
-            else:
-                return entry
-        return None
+        return cat.find(**values)
 
     def plugins(self, phase=None):
         """Get currently enabled plugins.
@@ -367,6 +545,11 @@ class Task(object):
             self.current_phase = phase
             self.current_plugin = plugin.name
 
+            if phase == 'input' and self.is_rerun and plugin.name in self._input_cache:
+                entries = self._restore_input(plugin.name)
+                log.debug('Reusing %s entries from %s input of the first run' % (len(entries), plugin.name))
+                continue
+
             if plugin.api_ver == 1:
                 # backwards compatibility
                 # pass method only task (old behaviour)
@@ -378,11 +561,16 @@ class Task(object):
             try:
                 fire_event('task.execute.before_plugin', self, plugin.name)
                 response = self.__run_plugin(plugin, phase, args)
-                if phase == 'input' and response:
-                    # add entries returned by input to self.all_entries
-                    for e in response:
-                        e.task = self
-                    self.all_entries.extend(response)
+                if phase == 'input':
+                    # Handlers returning nothing, e.g. ones only adding hooks to entries, are ran again on reruns
+                    if response is not None and \
+                            not getattr(plugin.phase_handlers[phase].func, 'requery_on_rerun', False):
+                        self._input_sources.append((plugin.name, response))
+                    if response:
+                        # add entries returned by input to self.all_entries
+                        for e in response:
+                            e.task = self
+                        self.all_entries.extend(response)
             finally:
                 fire_event('task.execute.after_plugin', self, plugin.name)
 
@@ -440,9 +628,26 @@ class Task(object):
             log.exception(msg)
             self.abort(msg)
 
+    def _snapshot_input(self):
+        """Keeps fresh copies of the entries produced by the input phase, so reruns can skip running the inputs."""
+        self._input_cache = {}
+        for name, entries in self._input_sources:
+            self._input_cache.setdefault(name, []).extend(entry.fresh_copy() for entry in entries)
+
+    def _restore_input(self, name):
+        """Adds copies of the entries cached for input `name` to the task, and returns them."""
+        entries = [entry.fresh_copy() for entry in self._input_cache[name]]
+        for entry in entries:
+            entry.task = self
+        self.all_entries.extend(entries)
+        return entries
+
     def rerun(self):
         """Immediately re-run the task after execute has completed,
-        task can be re-run up to :attr:`.max_reruns` times."""
+        task can be re-run up to :attr:`.max_reruns` times.
+
+        Reruns restart from the metainfo phase with the entries the inputs produced on the first run, only inputs
+        decorated with :func:`~flexget.plugin.requery_on_rerun` are ran again."""
         msg = 'Plugin %s has requested task to be ran again after execution has completed.' % self.current_plugin
         # Only print the first request for a rerun to the info log
         log.debug(msg) if self._rerun else log.info(msg)
@@ -493,12 +698,17 @@ class Task(object):
         if self.options.inject:
             # If entries are passed for this execution (eg. rerun), disable the input phase
             self.disable_phase('input')
-            self.all_entries.extend(self.options.inject)
+            if self.is_rerun:
+                self._restore_input(None)
+            else:
+                self.all_entries.extend(self.options.inject)
+                self._input_sources.append((None, self.options.inject))
 
         log.debug('starting session')
         self.session = Session()
+        fire_event('task.execute.started', self)
 
-        # Save current config hash and set config_modidied flag
+        # Set config_modified flag, the current config hash is saved when the task completes
         config_hash = hashlib.md5(str(sorted(self.config.items()))).hexdigest()
         last_hash = self.session.query(TaskConfigHash).filter(TaskConfigHash.task == self.name).first()
         if self.is_rerun:
@@ -508,19 +718,14 @@ class Task(object):
             else:
                 log.error('BUG: No prepared_config on rerun, please report.')
             self.config_modified = False
-        elif not last_hash:
-            self.config_modified = True
-            last_hash = TaskConfigHash(task=self.name, hash=config_hash)
-            self.session.add(last_hash)
-        elif last_hash.hash != config_hash:
-            self.config_modified = True
-            last_hash.hash = config_hash
         else:
-            self.config_modified = False
+            self.config_modified = not last_hash or last_hash.hash != config_hash
 
         # run phases
         try:
             for phase in task_phases:
+                if phase == 'metainfo' and not self.is_rerun:
+                    self._snapshot_input()
                 if phase in self.disabled_phases:
                     # log keywords not executed
                     for plugin in self.plugins(phase):
@@ -551,6 +756,11 @@ class Task(object):
         else:
             for entry in self.all_entries:
                 entry.complete()
+            if self.config_modified:
+                if last_hash:
+                    last_hash.hash = config_hash
+                else:
+                    self.session.add(TaskConfigHash(task=self.name, hash=config_hash))
             log.debug('committing session')
             self.session.commit()
             fire_event('task.execute.completed', self)
@@ -562,8 +772,6 @@ class Task(object):
         if self._rerun:
             log.info('Rerunning the task in case better resolution can be achieved.')
             self._rerun_count += 1
-            # TODO: Potential optimization is to take snapshots (maybe make the ones backlog uses built in instead of
-            # taking another one) after input and just inject the same entries for the rerun
             self.execute()
 
     def __eq__(self, other):
@@ -1,56 +1,167 @@
 from __future__ import unicode_literals, division, absolute_import
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+from Queue import Queue, Empty, Full
 from flask import render_template, Blueprint, jsonify, request
 from sqlalchemy import Column, DateTime, Integer, Unicode, String, asc, desc, or_, and_
-from flexget.ui.webui import register_plugin, db_session
-from flexget.manager import Base, Session
+from sqlalchemy.orm import scoped_session
+from flexget.ui.webui import register_plugin
+from flexget.manager import Base, Session, ReadSession
 from flexget.event import event
+from flexget.utils.sqlalchemy_utils import create_index
+
+log = logging.getLogger('log_viewer')
 
 log_viewer = Blueprint('log_viewier', __name__, url_prefix='/log')
+# Browsing the log does not need to wait for running tasks
+read_session = scoped_session(ReadSession)
+
+# Maximum number of log records waiting to be written, more are dropped
+LOG_QUEUE_SIZE = 10000
+# Maximum number of log records written in one transaction
+LOG_BATCH_SIZE = 500
+# Seconds the writer waits for more records before writing a batch
+LOG_FLUSH_INTERVAL = 1
+# Log records older than this are removed on database cleanup
+LOG_RETENTION = timedelta(days=30)
+# Columns the log grid filters and sorts by
+INDEXED_COLUMNS = ['created', 'logger', 'feed', 'execution']
 
 
 class LogEntry(Base):
     __tablename__ = 'log'
 
     id = Column(Integer, primary_key=True)
-    created = Column(DateTime)
-    logger = Column(String)
+    created = Column(DateTime, index=True)
+    logger = Column(String, index=True)
     levelno = Column(Integer)
     message = Column(Unicode)
-    task = Column('feed', Unicode)
-    execution = Column(String)
+    task = Column('feed', Unicode, index=True)
+    execution = Column(String, index=True)
 
     def __init__(self, record):
-        self.created = datetime.fromtimestamp(record.created)
-        self.logger = record.name
-        self.levelno = record.levelno
-        self.message = unicode(record.getMessage())
-        self.task = getattr(record, 'task', u'')
-        self.execution = getattr(record, 'execution', '')
+        values = self.values(record)
+        self.created = values['created']
+        self.logger = values['logger']
+        self.levelno = values['levelno']
+        self.message = values['message']
+        self.task = values['feed']
+        self.execution = values['execution']
+
+    @staticmethod
+    def values(record):
+        """Returns the column values for `record`, as used by :meth:`__init__`."""
+        return {'created': datetime.fromtimestamp(record.created),
+                'logger': record.name,
+                'levelno': record.levelno,
+                'message': unicode(record.getMessage()),
+                'feed': getattr(record, 'task', u''),
+                'execution': getattr(record, 'execution', '')}
 
 
 class DBLogHandler(logging.Handler):
+    """
+    Stores log records into the database. Records are queued and written in batches by a background thread, so
+    logging never waits for the database. When the queue is full new records are dropped, and the number of dropped
+    records is logged once there is room again.
+    """
+
+    def __init__(self, queue_size=LOG_QUEUE_SIZE):
+        logging.Handler.__init__(self)
+        self.queue = Queue(queue_size)
+        self.dropped = 0
+        self.writer = None
+        self.writer_lock = threading.Lock()
+        self.stopping = threading.Event()
 
     def emit(self, record):
+        if threading.current_thread() is self.writer:
+            # Do not store messages about storing messages
+            return
+        try:
+            self.queue.put_nowait(LogEntry.values(record))
+        except Full:
+            self.dropped += 1
+            return
+        except Exception:
+            self.handleError(record)
+            return
+        if self.writer is None:
+            self.start()
+
+    def start(self):
+        with self.writer_lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.run, name='log_viewer')
+                self.writer.daemon = True
+                self.writer.start()
+
+    def next_batch(self, timeout=None):
+        """Waits up to `timeout` for a record, then returns it along with any others already waiting."""
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except Empty:
+            return []
+        while len(batch) < LOG_BATCH_SIZE:
+            try:
+                batch.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def write(self, batch):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            batch.append({'created': datetime.now(), 'logger': 'log_viewer', 'levelno': logging.WARNING,
+                          'message': '%d log messages were dropped, logging was too busy' % dropped,
+                          'feed': '', 'execution': ''})
         session = Session()
         try:
-            session.add(LogEntry(record))
+            session.execute(LogEntry.__table__.insert(), batch)
             session.commit()
+        except Exception as e:
+            log.error('Unable to store %d log messages: %s' % (len(batch), e))
+            session.rollback()
         finally:
             session.close()
 
+    def run(self):
+        while not self.stopping.is_set():
+            batch = self.next_batch(timeout=LOG_FLUSH_INTERVAL)
+            if batch:
+                self.write(batch)
+
+    def flush(self):
+        """Writes all queued records right away."""
+        batch = self.next_batch(timeout=0)
+        while batch:
+            self.write(batch)
+            batch = self.next_batch(timeout=0)
+
+    def close(self):
+        self.stopping.set()
+        if self.writer is not None:
+            self.writer.join(LOG_FLUSH_INTERVAL * 2)
+        self.flush()
+        logging.Handler.close(self)
+
+
+@log_viewer.teardown_request
+def remove_read_session(exception=None):
+    read_session.remove()
+
 
 @log_viewer.context_processor
 def update_menus():
     import time
 
     strftime = lambda secs: time.strftime('%Y-%m-%d %H:%M', time.localtime(float(secs)))
-    menu_tasks = [i[0] for i in db_session.query(LogEntry.task).filter(LogEntry.task != u'')
-                                          .distinct().order_by(asc(LogEntry.task))[:]]
-    menu_execs = [(i[0], strftime(i[0])) for i in db_session.query(LogEntry.execution)
-                                                            .filter(LogEntry.execution != '')
-                                                            .distinct().order_by(desc('execution'))[:10]]
+    menu_tasks = [i[0] for i in read_session.query(LogEntry.task).filter(LogEntry.task != u'')
+                                            .distinct().order_by(asc(LogEntry.task))[:]]
+    menu_execs = [(i[0], strftime(i[0])) for i in read_session.query(LogEntry.execution)
+                                                              .filter(LogEntry.execution != '')
+                                                              .distinct().order_by(desc('execution'))[:10]]
     return {'menu_tasks': menu_tasks, 'menu_execs': menu_execs}
 
 
@@ -70,7 +181,7 @@ def get_logdata():
     sord = request.args.get('sord')
     sord = desc if sord == 'desc' else asc
     # Generate the filtered query
-    query = db_session.query(LogEntry)
+    query = read_session.query(LogEntry)
     if log_type == 'webui':
         query = query.filter(or_(LogEntry.logger.in_(['webui', 'werkzeug', 'event']), LogEntry.logger.like('%ui.%')))
     elif log_type == 'core':
@@ -102,9 +213,24 @@ def get_logdata():
 
 @event('webui.start')
 def initialize():
+    # Databases created before the indexes were added need them created
+    session = Session()
+    try:
+        for column in INDEXED_COLUMNS:
+            create_index('log', session, column)
+    finally:
+        session.close()
     # Register db handler with base logger
     logger = logging.getLogger()
     handler = DBLogHandler()
     logger.addHandler(handler)
 
+
+@event('manager.db_cleanup')
+def purge(session):
+    """Removes old log messages from the database."""
+    result = session.query(LogEntry).filter(LogEntry.created < datetime.now() - LOG_RETENTION).delete()
+    if result:
+        log.verbose('Purged %s messages from the log viewer.' % result)
+
 register_plugin(log_viewer, menu='Log', order=256)
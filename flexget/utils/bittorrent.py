@@ -1,6 +1,4 @@
 """Torrenting utils, mostly for handling bencoding and torrent files."""
-# Torrent decoding is a short fragment from effbot.org. Site copyright says:
-# Test scripts and other short code fragments can be considered as being in the public domain.
 from __future__ import unicode_literals, division, absolute_import
 import re
 import logging
@@ -86,101 +84,126 @@ def is_torrent_file(metafilepath):
     return bool(magic_marker)
 
 
-def tokenize(text, match=re.compile("([idel])|(\d+):|(-?\d+)").match):
-    i = 0
-    while i < len(text):
-        m = match(text, i)
-        s = m.group(m.lastindex)
-        i = m.end()
-        if m.lastindex == 2:
-            yield b"s"
-            yield text[i:i + int(s)]
-            i += int(s)
-        else:
-            yield s
-
-
-def decode_item(next, token):
-    if token == b"i":
-        # integer: "i" value "e"
-        data = int(next())
-        if next() != b"e":
-            raise ValueError
-    elif token == b"s":
-        # string: "s" value (virtual tokens)
-        data = next()
-        # Strings in torrent file are defined as utf-8 encoded
+# Values of these keys are binary data, and are never decoded to unicode
+BINARY_KEYS = frozenset(['pieces', 'peers', 'peers6'])
+
+
+class BDecoder(object):
+    """
+    Decodes bencoded data by walking through it with an offset, without copying anything but the decoded values.
+
+    Byte spans of the values in the top level dictionary are recorded in :attr:`spans`, so that the original encoding
+    of a value (eg. torrent info) can be used without encoding it again.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.spans = {}
+
+    def decode(self):
         try:
-            data = data.decode('utf-8')
-        except UnicodeDecodeError as e:
-            # The pieces field is a byte string, and should be left as such.
-            pass
-    elif token == b"l" or token == b"d":
-        # container: "l" (or "d") values "e"
-        data = []
-        tok = next()
-        while tok != b"e":
-            data.append(decode_item(next, tok))
-            tok = next()
-        if token == b"d":
-            data = dict(zip(data[0::2], data[1::2]))
-    else:
-        raise ValueError
-    return data
+            result, end = self.decode_item(0, top_level=True)
+        except (IndexError, ValueError, TypeError) as e:
+            raise SyntaxError('syntax error: %s' % e)
+        if end != len(self.data):
+            raise SyntaxError('trailing junk')
+        return result
+
+    def decode_item(self, i, key=None, top_level=False):
+        """Decodes the item starting at offset `i`, returns it along with the offset following it."""
+        data = self.data
+        token = data[i]
+        if token == b'i':
+            # integer: "i" value "e"
+            end = data.index(b'e', i)
+            return int(data[i + 1:end]), end + 1
+        elif token == b'l':
+            # list: "l" values "e"
+            result = []
+            i += 1
+            while data[i] != b'e':
+                item, i = self.decode_item(i)
+                result.append(item)
+            return result, i + 1
+        elif token == b'd':
+            # dictionary: "d" (key value) pairs "e"
+            result = {}
+            i += 1
+            while data[i] != b'e':
+                name, i = self.decode_item(i)
+                start = i
+                result[name], i = self.decode_item(i, key=name)
+                if top_level:
+                    self.spans[name] = (start, i)
+            return result, i + 1
+        elif token.isdigit():
+            # string: length ":" value
+            colon = data.index(b':', i)
+            start = colon + 1
+            end = start + int(data[i:colon])
+            if end > len(data):
+                raise ValueError('string length exceeds data')
+            value = data[start:end]
+            if key not in BINARY_KEYS:
+                # Strings in torrent file are defined as utf-8 encoded
+                try:
+                    value = value.decode('utf-8')
+                except UnicodeDecodeError:
+                    # Some fields are binary, and should be left as such.
+                    pass
+            return value, end
+        raise ValueError('unexpected token %r at %d' % (token, i))
 
 
 def bdecode(text):
-    try:
-        src = tokenize(text)
-        data = decode_item(src.next, src.next()) # pylint:disable=E1101
-        for token in src: # look for more tokens
-            raise SyntaxError("trailing junk")
-    except (AttributeError, ValueError, StopIteration) as e:
-        raise SyntaxError("syntax error: %s" % e)
-    return data
+    return BDecoder(text).decode()
 
 
-# encoding implementation by d0b
-def encode_string(data):
-    return b"%d:%s" % (len(data), data)
+# encoding implementation by d0b, builds the result as a list of parts to avoid repeated string concatenation
+def encode_string(data, parts):
+    parts.extend((b'%d:' % len(data), data))
 
 
-def encode_unicode(data):
-    return encode_string(data.encode('utf8'))
+def encode_unicode(data, parts):
+    encode_string(data.encode('utf8'), parts)
 
 
-def encode_integer(data):
-    return b"i%de" % data
+def encode_integer(data, parts):
+    parts.append(b'i%de' % data)
 
 
-def encode_list(data):
-    encoded = b"l"
+def encode_list(data, parts):
+    parts.append(b'l')
     for item in data:
-        encoded += bencode(item)
-    encoded += b"e"
-    return encoded
+        encode_item(item, parts)
+    parts.append(b'e')
+
+
+def encode_dictionary(data, parts):
+    parts.append(b'd')
+    for key, value in sorted(data.items()):
+        encode_item(key, parts)
+        encode_item(value, parts)
+    parts.append(b'e')
 
 
-def encode_dictionary(data):
-    encoded = b"d"
-    items = data.items()
-    items.sort()
-    for (key, value) in items:
-        encoded += bencode(key)
-        encoded += bencode(value)
-    encoded += b"e"
-    return encoded
+encode_func = {
+    str: encode_string,
+    unicode: encode_unicode,
+    int: encode_integer,
+    long: encode_integer,
+    list: encode_list,
+    dict: encode_dictionary}
+
+
+def encode_item(data, parts):
+    encode_func[type(data)](data, parts)
 
 
 def bencode(data):
-    encode_func = {
-        str: encode_string,
-        unicode: encode_unicode,
-        int: encode_integer,
-        long: encode_integer,
-        list: encode_list,
-        dict: encode_dictionary}
-    return encode_func[type(data)](data)
+    parts = []
+    encode_item(data, parts)
+    return b''.join(parts)
 
 
 class Torrent(object):
@@ -200,8 +223,13 @@ class Torrent(object):
         # Make sure there is no trailing whitespace. see #1592
         content = content.strip()
         # decoded torrent structure
-        self.content = bdecode(content)
+        decoder = BDecoder(content)
+        self.content = decoder.decode()
         self.modified = False
+        # Original encoding of info, used to calculate info hash as long as the torrent is not modified
+        self._info = self.content.get('info')
+        start, end = decoder.spans.get('info', (0, 0))
+        self._info_data = content[start:end]
 
     def __repr__(self):
         return "%s(%s, %s)" % (self.__class__.__name__,
@@ -281,7 +309,10 @@ class Torrent(object):
         """Return Torrent info hash"""
         import hashlib
         hash = hashlib.sha1()
-        info_data = encode_dictionary(self.content['info'])
+        if not self.modified and self.content['info'] is self._info:
+            info_data = self._info_data
+        else:
+            info_data = bencode(self.content['info'])
         hash.update(info_data)
         return hash.hexdigest().upper()
 
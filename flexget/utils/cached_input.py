@@ -1,19 +1,30 @@
 from __future__ import unicode_literals, division, absolute_import
-import copy
 import logging
 import hashlib
+import threading
 from datetime import datetime, timedelta
-from sqlalchemy import Column, Integer, String, DateTime, PickleType, Unicode, ForeignKey
-from sqlalchemy.orm import relation
+from sqlalchemy import Column, Integer, String, DateTime, PickleType, Unicode
 from flexget import db_schema
 from flexget.utils.database import safe_pickle_synonym
-from flexget.utils.tools import parse_timedelta, TimedDict
+from flexget.utils.requests import NotModified
+from flexget.utils.sqlalchemy_utils import drop_tables
+from flexget.utils.tools import parse_timedelta, TimedLRUDict
 from flexget.entry import Entry
 from flexget.event import event
 from flexget.plugin import PluginError
 
 log = logging.getLogger('input_cache')
-Base = db_schema.versioned_base('input_cache', 0)
+Base = db_schema.versioned_base('input_cache', 1)
+
+@db_schema.upgrade('input_cache')
+def upgrade(ver, session):
+    if ver == 0:
+        # Entries used to be stored in a row each, the cache is safe to throw away
+        log.info('Dropping old version of input cache tables from db')
+        drop_tables(['input_cache_entry', 'input_cache'], session)
+        Base.metadata.create_all(bind=session.bind)
+        ver = 1
+    return ver
 
 
 class InputCache(Base):
@@ -24,19 +35,25 @@ class InputCache(Base):
     name = Column(Unicode)
     hash = Column(String)
     added = Column(DateTime, default=datetime.now)
-
-    entries = relation('InputCacheEntry', backref='cache', cascade='all, delete, delete-orphan')
+    # All entries produced by the input, stored as a single blob
+    _entries = Column('entries', PickleType)
+    entries = safe_pickle_synonym('_entries')
+    # HTTP validator headers of the resource entries were created from
+    validators = Column(PickleType)
 
 
-class InputCacheEntry(Base):
+class CachedInput(object):
+    """Input result stored in memory cache. Entries are kept as private copies, and copied again when restored."""
 
-    __tablename__ = 'input_cache_entry'
+    def __init__(self, entries, validators=None):
+        self.entries = [e.fresh_copy() for e in entries]
+        self.validators = validators
 
-    id = Column(Integer, primary_key=True)
-    _entry = Column('entry', PickleType)
-    entry = safe_pickle_synonym('_entry')
+    def restore(self):
+        return [e.fresh_copy() for e in self.entries]
 
-    cache_id = Column(Integer, ForeignKey('input_cache.id'), nullable=False)
+    def __len__(self):
+        return len(self.entries)
 
 
 @event('manager.db_cleanup')
@@ -69,10 +86,15 @@ class cached(object):
     * **key** in which the configuration has the cached resource identifier (ie. url).
       If the key is not given or present in the configuration :name: is expected to be a cache name (ie. url)
 
+    When the input fetched its entries with a single request to a server supporting ETag or Last-Modified headers,
+    an expired cache is revalidated with a conditional request, and reused if the resource has not changed.
+
     .. note:: Configuration assumptions may make this unusable in some (future) inputs
     """
 
-    cache = TimedDict(cache_time='5 minutes')
+    cache = TimedLRUDict(cache_time='5 minutes', max_items=200, max_size=100000)
+    # Tasks run concurrently, and share the cache
+    cache_lock = threading.Lock()
 
     def __init__(self, name, persist=None):
         # Cast name to unicode to prevent sqlalchemy warnings when filtering
@@ -103,74 +125,94 @@ class cached(object):
             log.trace('hash: %s' % hash)
 
             cache_name = self.name + '_' + hash
-            log.debug('cache name: %s (has: %s)' % (cache_name, ', '.join(self.cache.keys())))
-
-            if not task.options.nocache and cache_name in self.cache:
-                # return from the cache
-                log.trace('cache hit')
-                entries = []
-                for entry in self.cache[cache_name]:
-                    fresh = copy.deepcopy(entry)
-                    entries.append(fresh)
-                if entries:
-                    log.verbose('Restored %s entries from cache' % len(entries))
-                return entries
+            with self.cache_lock:
+                log.debug('cache name: %s (has: %s)' % (cache_name, ', '.join(self.cache.keys())))
+                cached_input = self.cache.get(cache_name)
+                stale = self.cache.get_stale(cache_name)
+
+            db_cache = None
+            if task.options.nocache:
+                stale = None
             else:
-                if self.persist and not task.options.nocache:
+                if cached_input is not None:
+                    # return from the cache
+                    log.trace('cache hit')
+                    entries = cached_input.restore()
+                    if entries:
+                        log.verbose('Restored %s entries from cache' % len(entries))
+                    return entries
+                if self.persist:
                     # Check database cache
                     db_cache = task.session.query(InputCache).filter(InputCache.name == self.name).\
-                        filter(InputCache.hash == hash).\
-                        filter(InputCache.added > datetime.now() - self.persist).\
-                        first()
-                    if db_cache:
-                        entries = [Entry(e.entry) for e in db_cache.entries]
+                        filter(InputCache.hash == hash).first()
+                    if db_cache and db_cache.added > datetime.now() - self.persist:
+                        entries = [Entry(e) for e in db_cache.entries]
                         log.verbose('Restored %s entries from db cache' % len(entries))
                         # Store to in memory cache
-                        self.cache[cache_name] = copy.deepcopy(entries)
+                        self.store(cache_name, CachedInput(entries, db_cache.validators))
                         return entries
-
-                # Nothing was restored from db or memory cache, run the function
-                log.trace('cache miss')
-                # call input event
-                try:
+                    if db_cache and db_cache.validators and not stale:
+                        stale = CachedInput([Entry(e) for e in db_cache.entries], db_cache.validators)
+
+            # Nothing was restored from db or memory cache, run the function
+            log.trace('cache miss')
+            # call input event
+            try:
+                with task.requests.conditional(stale and stale.validators) as received:
                     response = func(*args, **kwargs)
-                except PluginError as e:
-                    # If there was an error producing entries, but we have valid entries in the db cache, return those.
-                    if self.persist and not task.options.nocache:
-                        db_cache = task.session.query(InputCache).filter(InputCache.name == self.name).\
-                            filter(InputCache.hash == hash).first()
-                        if db_cache and db_cache.entries:
-                            log.error('There was an error during %s input (%s), using cache instead.' %
-                                    (self.name, e))
-                            entries = [Entry(e.entry) for e in db_cache.entries]
-                            log.verbose('Restored %s entries from db cache' % len(entries))
-                            # Store to in memory cache
-                            self.cache[cache_name] = copy.deepcopy(entries)
-                            return entries
-                    # If there was nothing in the db cache, re-raise the error.
-                    raise
-                if api_ver == 1:
-                    response = task.entries
-                if not isinstance(response, list):
-                    log.warning('Input %s did not return a list, cannot cache.' % self.name)
-                    return response
-                # store results to cache
-                log.debug('storing to cache %s %s entries' % (cache_name, len(response)))
-                try:
-                    self.cache[cache_name] = copy.deepcopy(response)
-                except TypeError:
-                    # might be caused because of backlog restoring some idiotic stuff, so not neccessarily a bug
-                    log.critical('Unable to save task content into cache, if problem persists longer than a day please report this as a bug')
-                if self.persist:
-                    # Store to database
-                    log.debug('Storing cache %s to database.' % cache_name)
+            except NotModified:
+                entries = stale.restore()
+                log.verbose('Input has not changed, restored %s entries from cache' % len(entries))
+                self.store(cache_name, stale)
+                if db_cache:
+                    db_cache.added = datetime.now()
+                return entries
+            except PluginError as e:
+                # If there was an error producing entries, but we have valid entries in the db cache, return those.
+                if self.persist and not task.options.nocache:
                     db_cache = task.session.query(InputCache).filter(InputCache.name == self.name).\
                         filter(InputCache.hash == hash).first()
-                    if not db_cache:
-                        db_cache = InputCache(name=self.name, hash=hash)
-                    db_cache.entries = [InputCacheEntry(entry=e) for e in response]
-                    db_cache.added = datetime.now()
-                    task.session.merge(db_cache)
+                    if db_cache and db_cache.entries:
+                        log.error('There was an error during %s input (%s), using cache instead.' %
+                                (self.name, e))
+                        entries = [Entry(e) for e in db_cache.entries]
+                        log.verbose('Restored %s entries from db cache' % len(entries))
+                        # Store to in memory cache
+                        self.store(cache_name, CachedInput(entries))
+                        return entries
+                # If there was nothing in the db cache, re-raise the error.
+                raise
+            if api_ver == 1:
+                response = task.entries
+            if not isinstance(response, list):
+                log.warning('Input %s did not return a list, cannot cache.' % self.name)
                 return response
+            # Entries can only be revalidated if they all came from a single resource
+            validators = None
+            if len(received) == 1 and received.values()[0]:
+                validators = received
+            # store results to cache
+            log.debug('storing to cache %s %s entries' % (cache_name, len(response)))
+            try:
+                self.store(cache_name, CachedInput(response, validators))
+            except TypeError:
+                # might be caused because of backlog restoring some idiotic stuff, so not neccessarily a bug
+                log.critical('Unable to save task content into cache, if problem persists longer than a day please report this as a bug')
+            if self.persist:
+                # Store to database
+                log.debug('Storing cache %s to database.' % cache_name)
+                db_cache = task.session.query(InputCache).filter(InputCache.name == self.name).\
+                    filter(InputCache.hash == hash).first()
+                if not db_cache:
+                    db_cache = InputCache(name=self.name, hash=hash)
+                    task.session.add(db_cache)
+                db_cache.entries = response
+                db_cache.validators = validators
+                db_cache.added = datetime.now()
+            return response
 
         return wrapped_func
+
+    def store(self, cache_name, cached_input):
+        with self.cache_lock:
+            self.cache[cache_name] = cached_input
@@ -8,6 +8,9 @@ from sqlalchemy.ext.hybrid import Comparator, hybrid_property
 from flexget.manager import Session
 from flexget.utils import qualities
 
+# SQLite allows at most 999 bound parameters in one statement
+IN_CHUNK_SIZE = 500
+
 
 def with_session(func):
     """"
@@ -32,6 +35,19 @@ def with_session(func):
     return wrapper
 
 
+def query_in_chunks(query, column, values, chunk_size=IN_CHUNK_SIZE):
+    """
+    Runs `query` filtered by `column` being in `values`. Large lists of values are split into several queries, so
+    that the database limit for bound parameters is not exceeded.
+
+    :returns: An iterator over the results of all the queries.
+    """
+    values = list(values)
+    for start in xrange(0, len(values), chunk_size):
+        for result in query.filter(column.in_(values[start:start + chunk_size])):
+            yield result
+
+
 def pipe_list_synonym(name):
     """Converts pipe separated text into a list"""
 
@@ -0,0 +1,196 @@
+from __future__ import unicode_literals, division, absolute_import
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import Column, Integer, Float, Unicode, PickleType
+
+from flexget import db_schema
+from flexget.utils.database import safe_pickle_synonym, with_session
+from flexget.utils.titles.movie import MovieParser
+
+log = logging.getLogger('path_index')
+Base = db_schema.versioned_base('path_index', 0)
+
+# Directories modified this many seconds before a scan are scanned again the next time, changes made within the
+# resolution of the mtime could otherwise be missed
+MTIME_GRACE = 2
+
+# A file or directory named `name` in directory `path`, directories also have their movie name and year parsed
+IndexedItem = namedtuple('IndexedItem', ['path', 'name', 'is_dir', 'movie_name', 'movie_year'])
+ITEM_FIELDS = IndexedItem._fields[1:]
+
+
+class IndexedDir(Base):
+    __tablename__ = 'path_index_dir'
+
+    id = Column(Integer, primary_key=True)
+    path = Column(Unicode, index=True, unique=True)
+    mtime = Column(Float)
+    # Contents of the directory, see :meth:`DirListing.as_dict`
+    _listing = Column('listing', PickleType)
+    listing = safe_pickle_synonym('_listing')
+
+
+def decode(name):
+    # Paths are handled as bytes, names are given to plugins as unicode
+    return name.decode('utf-8', 'ignore')
+
+
+class DirListing(object):
+    """Contents of a single directory, as they were when the directory had modification time `mtime`."""
+
+    def __init__(self, mtime, subdirs, items):
+        self.mtime = mtime
+        # Raw names of subdirectories, needed to walk into them
+        self.subdirs = subdirs
+        # Tuples of (name, is_dir, movie_name, movie_year)
+        self.items = items
+
+    @classmethod
+    def scan(cls, path, mtime, old=None):
+        """Lists directory `path`, items which were already in `old` listing are not parsed again."""
+        known = dict((item[0], item) for item in old.items) if old else {}
+        subdirs = []
+        items = []
+        for raw_name in os.listdir(path):
+            name = decode(raw_name)
+            is_dir = os.path.isdir(os.path.join(path, raw_name))
+            if is_dir:
+                subdirs.append(raw_name)
+            item = known.get(name)
+            if not item or item[1] != is_dir:
+                item = (name, is_dir, None, None)
+                if is_dir:
+                    movie = MovieParser()
+                    movie.parse(name)
+                    item = (name, is_dir, movie.name, movie.year)
+            items.append(item)
+        return cls(mtime, subdirs, items)
+
+    @classmethod
+    def from_dict(cls, mtime, listing):
+        items = [tuple(item.get(field) for field in ITEM_FIELDS) for item in listing['items']]
+        return cls(mtime, listing['subdirs'], items)
+
+    def as_dict(self):
+        # None values are left out, they can not be stored
+        items = [dict((field, value) for field, value in zip(ITEM_FIELDS, item) if value is not None)
+                 for item in self.items]
+        return {'subdirs': self.subdirs, 'items': items}
+
+
+class PathIndex(object):
+    """
+    Index of the files and directories under any number of paths. Contents are stored in the database, and
+    refreshed by only listing the directories whose modification time has changed since they were last listed.
+
+    Shared by all tasks, so plugins checking the same library do not need to walk it again.
+    """
+
+    def __init__(self):
+        self.listings = {}
+        self.loaded = set()
+        self.lock = threading.Lock()
+
+    def _covered(self, root):
+        return any(root == path or root.startswith(os.path.join(path, b'')) for path in self.loaded)
+
+    def _query(self, root, session):
+        """Returns listings under `root` stored in the database, unless they were already loaded."""
+        if self._covered(root):
+            return {}
+        prefix = decode(os.path.join(root, b''))
+        query = session.query(IndexedDir).filter((IndexedDir.path == decode(root)) |
+                                                 IndexedDir.path.startswith(prefix))
+        return dict((row.path.encode('utf-8'), DirListing.from_dict(row.mtime, row.listing)) for row in query)
+
+    def _save(self, path, listing, session):
+        row = session.query(IndexedDir).filter(IndexedDir.path == decode(path)).first()
+        if listing is None:
+            if row:
+                session.delete(row)
+            return
+        if not row:
+            row = IndexedDir()
+            row.path = decode(path)
+            session.add(row)
+        row.mtime = listing.mtime
+        row.listing = listing.as_dict()
+
+    def refresh(self, root, stored=None):
+        """
+        Brings the index of `root` up to date in memory, the database is not used.
+
+        :param dict stored: Listings under `root` loaded from the database, used unless already in memory
+        :return: List of (path, :class:`DirListing`) for all directories under `root`, and list of (path,
+          :class:`DirListing`) which have changed and need to be saved, listing is None for removed directories
+        """
+        if stored and not self._covered(root):
+            for path, listing in stored.iteritems():
+                self.listings.setdefault(path, listing)
+        self.loaded.add(root)
+        result = []
+        changed = []
+        visited = set()
+        stack = [root]
+        now = time.time()
+        while stack:
+            path = stack.pop()
+            try:
+                real = os.path.realpath(path)
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            # Symlinks are followed, but the same directory is only listed once
+            if real in visited:
+                continue
+            visited.add(real)
+            listing = self.listings.get(path)
+            if listing is None or listing.mtime != mtime:
+                log.debug('Listing %s' % decode(path))
+                try:
+                    listing = DirListing.scan(path, mtime if now - mtime > MTIME_GRACE else None, listing)
+                except OSError as e:
+                    log.warning('Unable to list %s: %s' % (decode(path), e))
+                    continue
+                self.listings[path] = listing
+                changed.append((path, listing))
+            result.append((path, listing))
+            stack.extend(os.path.join(path, subdir) for subdir in reversed(listing.subdirs))
+        # Forget directories which no longer exist
+        listed = set(path for path, listing in result)
+        prefix = os.path.join(root, b'')
+        for path in [p for p in self.listings if p.startswith(prefix) and p not in listed]:
+            del self.listings[path]
+            changed.append((path, None))
+        return result, changed
+
+    @with_session
+    def items(self, path, session=None):
+        """
+        Returns all files and directories under `path`.
+
+        :param path: Directory path as bytes or unicode, user home is expanded.
+        :return: List of :class:`IndexedItem`
+        :raises: OSError if `path` does not exist.
+        """
+        if isinstance(path, unicode):
+            path = path.encode('utf-8')
+        path = os.path.normpath(os.path.expanduser(path))
+        if not os.path.isdir(path):
+            raise OSError('Path %s does not exist' % decode(path))
+        # The database is only used without holding the lock, writing may need to wait for another task which in
+        # turn is waiting for the lock
+        stored = self._query(path, session)
+        with self.lock:
+            listings, changed = self.refresh(path, stored)
+        for dirpath, listing in changed:
+            self._save(dirpath, listing, session)
+        return [IndexedItem(decode(dirpath), *item) for dirpath, listing in listings for item in listing.items]
+
+
+# Shared by all plugins
+path_index = PathIndex()
@@ -3,8 +3,16 @@ import re
 import copy
 import logging
 
+from flexget.utils.tools import LRUDict
+
 log = logging.getLogger('utils.qualities')
 
+# Number of parsed quality and requirement strings to remember, see `Quality.parse` and `Requirements`
+PARSE_CACHE_SIZE = 20000
+
+# Quality components must not be found embedded within a word
+COMPONENT_RE = '(?<![^\W_])(%s)(?![^\W_])'
+
 
 class QualityComponent(object):
     """"""
@@ -29,7 +37,8 @@ class QualityComponent(object):
         # compile regexp
         if regexp is None:
             regexp = re.escape(name)
-        self.regexp = re.compile('(?<![^\W_])(' + regexp + ')(?![^\W_])', re.IGNORECASE)
+        self.pattern = regexp
+        self.regexp = re.compile(COMPONENT_RE % regexp, re.IGNORECASE)
 
     def matches(self, text):
         """Test if quality matches to text.
@@ -185,6 +194,39 @@ for items in (_resolutions, _sources, _codecs, _audios):
     for item in items:
         _registry[item.name] = item
 
+# Components and clean text of parsed quality strings
+_parse_cache = LRUDict(PARSE_CACHE_SIZE)
+
+
+class ComponentMatcher(object):
+    """Finds all the quality components of one type in a text with a single regexp scan."""
+
+    def __init__(self, components):
+        self.components = components
+        # Only stop at positions where at least one of the components matches
+        guard = '(?=%s)' % COMPONENT_RE % '|'.join('(?:%s)' % c.pattern for c in components)
+        # Then try each component there, capturing the ones that match in their own group
+        tries = ''.join('(?:(?=(?P<c%d>%s)(?![^\W_]))|)' % (i, c.pattern) for i, c in enumerate(components))
+        self.regexp = re.compile(guard + tries, re.IGNORECASE)
+        self.groups = [self.regexp.groupindex['c%d' % i] for i in range(len(components))]
+
+    def find_all(self, text):
+        """
+        :returns: Dict mapping the index of each component found in `text` to the span of its first match, same as
+          searching with the regexp of each component on its own would find.
+        """
+        found = {}
+        for match in self.regexp.finditer(text):
+            for i, group in enumerate(self.groups):
+                if i not in found and match.start(group) != -1:
+                    found[i] = match.span(group)
+        return found
+
+
+_matchers = dict((items[0].type, ComponentMatcher(items)) for items in (_resolutions, _sources, _codecs, _audios))
+
+# Component requirements of parsed requirement strings
+_requirements_cache = LRUDict(PARSE_CACHE_SIZE)
 
 def all_components():
     return _registry.itervalues()
@@ -213,6 +255,10 @@ class Quality(object):
         :param text: The string to parse
         """
         self.text = text
+        cached = _parse_cache.get(text)
+        if cached:
+            self.resolution, self.source, self.codec, self.audio, self.clean_text = cached
+            return
         self.clean_text = text
         self.resolution = self._find_best(_resolutions, _UNKNOWNS['resolution'])
         self.source = self._find_best(_sources, _UNKNOWNS['source'])
@@ -224,18 +270,26 @@ class Quality(object):
                 default = _registry[default]
                 if not getattr(self, default.type):
                     setattr(self, default.type, default)
+        _parse_cache[text] = (self.resolution, self.source, self.codec, self.audio, self.clean_text)
 
     def _find_best(self, qlist, default=None):
         """Finds the highest matching quality component from `qlist`"""
+        matcher = _matchers[qlist[0].type]
         result = None
-        for item in qlist:
-            match = item.matches(self.clean_text)
-            if match[0]:
-                result = item
-                self.clean_text = match[1]
-                if item.modifier is not None:
-                    # If this item has a modifier, do not proceed to check higher qualities in the list
-                    break
+        index = 0
+        while True:
+            # Components are checked from lowest to highest, each match is removed from the text before checking
+            # the next ones. Text only changes on a match, so one scan finds the next matching component.
+            found = [(i, span) for i, span in matcher.find_all(self.clean_text).iteritems() if i >= index]
+            if not found:
+                break
+            index, (start, end) = min(found)
+            result = qlist[index]
+            self.clean_text = self.clean_text[:start] + self.clean_text[end:]
+            if result.modifier is not None:
+                # If this item has a modifier, do not proceed to check higher qualities in the list
+                break
+            index += 1
         return result or default
 
     @property
@@ -343,6 +397,14 @@ class RequirementComponent(object):
         self.acceptable = []
         self.none_of = []
 
+    def get_state(self):
+        return self.min, self.max, tuple(self.acceptable), tuple(self.none_of)
+
+    def set_state(self, state):
+        self.min, self.max, acceptable, none_of = state
+        self.acceptable = list(acceptable)
+        self.none_of = list(none_of)
+
     def allows(self, comp, loose=False):
         if comp.type != self.type:
             raise TypeError('Cannot compare %r against %s' % (comp, self.type))
@@ -395,7 +457,12 @@ class RequirementComponent(object):
 
 
 class Requirements(object):
-    """Represents requirements for allowable qualities. Can determine whether a given Quality passes requirements."""
+    """
+    Represents requirements for allowable qualities. Can determine whether a given Quality passes requirements.
+
+    Requirement strings are only parsed the first time they are seen, after that the parsed requirements are copied
+    from cache.
+    """
     def __init__(self, req=''):
         self.text = ''
         self.resolution = RequirementComponent('resolution')
@@ -403,7 +470,14 @@ class Requirements(object):
         self.codec = RequirementComponent('codec')
         self.audio = RequirementComponent('audio')
         if req:
+            cached = _requirements_cache.get(req)
+            if cached:
+                self.text = cached[0]
+                for component, state in zip(self.components, cached[1]):
+                    component.set_state(state)
+                return
             self.parse_requirements(req)
+            _requirements_cache[req] = (self.text, [component.get_state() for component in self.components])
 
     @property
     def components(self):
@@ -2,11 +2,15 @@ from __future__ import unicode_literals, division, absolute_import
 import urllib2
 import time
 import logging
-from datetime import timedelta, datetime
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
 from urlparse import urlparse
 import requests
 # Allow some request objects to be imported from here instead of requests
 from requests import RequestException, HTTPError
+from flexget.event import fire_event
 from flexget.utils.tools import parse_timedelta, TimedDict
 
 log = logging.getLogger('requests')
@@ -18,6 +22,10 @@ logging.getLogger('requests.packages.urllib3').setLevel(logging.WARNING)
 WAIT_TIME = timedelta(seconds=60)
 # Remembers sites that have timed out
 unresponsive_hosts = TimedDict(WAIT_TIME)
+# Number of threads used to run submitted requests
+EXECUTOR_WORKERS = 8
+# Maximum number of requests running against a single host at once
+MAX_HOST_REQUESTS = 4
 
 
 def is_unresponsive(url):
@@ -45,6 +53,22 @@ def set_unresponsive(url):
     unresponsive_hosts[host] = True
 
 
+class NotModified(BaseException):
+    """
+    Raised by :meth:`Session.conditional` requests when the server reports the resource has not changed.
+
+    Not an :class:`Exception`, so that it passes through plugins catching all errors of their requests.
+    """
+
+    def __init__(self, url):
+        super(NotModified, self).__init__('%s has not been modified' % url)
+        self.url = url
+
+
+# Response headers used to make later requests conditional, and the request headers they are sent back in
+VALIDATOR_HEADERS = {'etag': 'If-None-Match', 'last-modified': 'If-Modified-Since'}
+
+
 def _wrap_urlopen(url, timeout=None):
     """
     Handles alternate schemes using urllib, wraps the response in a requests.Response
@@ -69,6 +93,166 @@ def _wrap_urlopen(url, timeout=None):
     return resp
 
 
+class TokenBucket(object):
+    """
+    Hands out request slots for a domain at most once every `interval` seconds.
+
+    Slots are reserved ahead of time, so callers can decide for themselves whether to wait for their slot or to do
+    something else in the meantime.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_slot = 0
+        self.lock = threading.Lock()
+
+    def time_until_ready(self):
+        """Returns the number of seconds until the next slot is available."""
+        with self.lock:
+            return max(0, self.next_slot - time.time())
+
+    def reserve(self):
+        """
+        Reserves the next available slot.
+
+        :return: Number of seconds the caller has to wait before its slot begins.
+        """
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+            return slot - now
+
+
+class RequestFuture(object):
+    """Result of a request submitted to a :class:`RequestExecutor`."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._exception = None
+
+    def set_result(self, result):
+        self._result = result
+        self._event.set()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._event.set()
+
+    def done(self):
+        return self._event.is_set()
+
+    def exception(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise requests.Timeout('Request did not complete within %s seconds' % timeout)
+        return self._exception
+
+    def result(self, timeout=None):
+        """
+        Waits for the request to complete.
+
+        :return: The :class:`requests.Response`
+        :raises: Any exception raised by the request.
+        """
+        exception = self.exception(timeout)
+        if exception is not None:
+            raise exception
+        return self._result
+
+
+class RequestExecutor(object):
+    """
+    Runs requests on a pool of worker threads, limiting how many requests run against each host at once.
+
+    Domain delays are honored by only handing out a request once its domain has a free slot, so waiting for one
+    site never holds up requests to another one.
+    """
+
+    def __init__(self, workers=EXECUTOR_WORKERS, max_host_requests=MAX_HOST_REQUESTS):
+        self.num_workers = workers
+        self.max_host_requests = max_host_requests
+        self.condition = threading.Condition()
+        self.pending = []
+        self.active_hosts = defaultdict(int)
+        self.workers = []
+
+    def submit(self, session, method, url, **kwargs):
+        """
+        Queues a request to be run by `session`.
+
+        :return: A :class:`RequestFuture` for the response.
+        """
+        future = RequestFuture()
+        with self.condition:
+            self.pending.append((session, method, url, kwargs, future))
+            self._start_workers()
+            self.condition.notify_all()
+        return future
+
+    @contextmanager
+    def host_slot(self, host):
+        """Holds one of the concurrent request slots of `host` while the block runs."""
+        with self.condition:
+            while self.active_hosts[host] >= self.max_host_requests:
+                self.condition.wait()
+            self.active_hosts[host] += 1
+        try:
+            yield
+        finally:
+            self._release_host(host)
+
+    def _release_host(self, host):
+        with self.condition:
+            self.active_hosts[host] -= 1
+            if not self.active_hosts[host]:
+                del self.active_hosts[host]
+            self.condition.notify_all()
+
+    def _start_workers(self):
+        while len(self.workers) < self.num_workers:
+            worker = threading.Thread(target=self._work, name='requests-%d' % len(self.workers))
+            worker.daemon = True
+            self.workers.append(worker)
+            worker.start()
+
+    def _next_job(self):
+        """Blocks until there is a pending request which may run right now, and removes it from the queue."""
+        with self.condition:
+            while True:
+                wait = None
+                for job in self.pending:
+                    session, method, url = job[:3]
+                    host = urlparse(url).hostname
+                    if self.active_hosts[host] >= self.max_host_requests:
+                        continue
+                    bucket = session.domain_bucket(url)
+                    if bucket:
+                        ready_in = bucket.time_until_ready()
+                        if ready_in > 0:
+                            wait = ready_in if wait is None else min(wait, ready_in)
+                            continue
+                        bucket.reserve()
+                    self.pending.remove(job)
+                    self.active_hosts[host] += 1
+                    return job
+                self.condition.wait(wait)
+
+    def _work(self):
+        while True:
+            session, method, url, kwargs, future = self._next_job()
+            try:
+                future.set_result(session._request(method, url, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._release_host(urlparse(url).hostname)
+
+
+# Shared by all sessions, so host limits apply across all running tasks
+executor = RequestExecutor()
+
+
 class Session(requests.Session):
     """
     Subclass of requests Session class which defines some of our own defaults, records unresponsive sites,
@@ -84,6 +268,9 @@ class Session(requests.Session):
         self.adapters['http://'].max_retries = max_retries
         # Stores min intervals between requests for certain sites
         self.domain_delay = {}
+        # Validators used and recorded during a `conditional` block
+        self.validators = None
+        self.received_validators = None
 
     def add_cookiejar(self, cookiejar):
         """
@@ -101,35 +288,80 @@ class Session(requests.Session):
         :param domain: The domain to set the interval on
         :param delay: The amount of time between requests, can be a timedelta or string like '3 seconds'
         """
-        self.domain_delay[domain] = {'delay': parse_timedelta(delay)}
+        self.domain_delay[domain] = TokenBucket(parse_timedelta(delay).total_seconds())
+
+    @contextmanager
+    def conditional(self, validators=None):
+        """
+        Makes GET requests done within the block conditional. Requests to urls in `validators` send the validator
+        headers, and raise :class:`NotModified` if the server responds that the resource has not changed.
+
+        :param dict validators: Maps urls to request headers, as recorded in an earlier block
+        :return: Context manager yielding a dict, which gets populated with validator headers of each url requested
+        """
+        self.validators = validators or {}
+        self.received_validators = {}
+        try:
+            yield self.received_validators
+        finally:
+            self.validators = self.received_validators = None
+
+    def domain_bucket(self, url):
+        """Returns the :class:`TokenBucket` limiting requests to `url`, or None if there is no delay for it."""
+        for domain, bucket in self.domain_delay.iteritems():
+            if domain in url:
+                return bucket
+
+    def submit(self, method, url, **kwargs):
+        """
+        Queues a request to be done in the background by the shared executor. Domain delays and per host limits are
+        honored without blocking the caller, so many pages can be fetched at once.
+
+        :return: A :class:`RequestFuture`, call `result()` on it to get the response.
+        """
+        if method.lower() in ['get', 'options']:
+            kwargs.setdefault('allow_redirects', True)
+        return executor.submit(self, method, url, **kwargs)
+
+    def map(self, method, urls, **kwargs):
+        """Submits a request for each of `urls`, returns a list of futures in the same order."""
+        return [self.submit(method, url, **kwargs) for url in urls]
 
     def request(self, method, url, *args, **kwargs):
         """
         Does a request, but raises Timeout immediately if site is known to timeout, and records sites that timeout.
         Also raises errors getting the content by default.
         """
-
+        # Check if we need to add a delay before request to this site
+        bucket = self.domain_bucket(url)
+        if bucket:
+            wait_time = bucket.reserve()
+            if wait_time:
+                log.debug('Waiting %.2f seconds until next request to %s' % (wait_time, urlparse(url).hostname))
+                # Sleep until it is time for the next request
+                time.sleep(wait_time)
+
+        with executor.host_slot(urlparse(url).hostname):
+            return self._request(method, url, *args, **kwargs)
+
+    def _request(self, method, url, *args, **kwargs):
+        """Does the actual request, once domain delays and host limits have been taken care of."""
         # Raise Timeout right away if site is known to timeout
         if is_unresponsive(url):
             raise requests.Timeout('Requests to this site have timed out recently. Waiting before trying again.')
 
-        # Check if we need to add a delay before request to this site
-        for domain, domain_dict in self.domain_delay.iteritems():
-            if domain in url:
-                next_req = domain_dict.get('next_req')
-                if next_req and datetime.now() < next_req:
-                    wait_time = next_req - datetime.now()
-                    seconds = wait_time.seconds + (wait_time.microseconds / 1000000.0)
-                    log.debug('Waiting %.2f seconds until next request to %s' % (seconds, domain))
-                    # Sleep until it is time for the next request
-                    time.sleep(seconds)
-                # Record the next allowable request time for this domain
-                domain_dict['next_req'] = datetime.now() + domain_dict['delay']
-                break
-
         kwargs.setdefault('timeout', self.timeout)
         raise_status = kwargs.pop('raise_status', True)
 
+        conditional = self.received_validators is not None and method.lower() == 'get'
+        validators = None
+        if conditional and url in self.validators:
+            headers = kwargs.get('headers') or {}
+            # Leave requests which are already conditional alone
+            if not any(h.lower() in ('if-none-match', 'if-modified-since') for h in headers):
+                validators = self.validators[url]
+                kwargs['headers'] = dict(headers, **validators)
+
         # If we do not have an adapter for this url, pass it off to urllib
         if not any(url.startswith(adapter) for adapter in self.adapters):
             return _wrap_urlopen(url, timeout=kwargs['timeout'])
@@ -141,6 +373,14 @@ class Session(requests.Session):
             set_unresponsive(url)
             raise
 
+        fire_event('requests.response', result)
+
+        if conditional:
+            if validators and result.status_code == 304:
+                raise NotModified(url)
+            self.received_validators[url] = dict((VALIDATOR_HEADERS[name], result.headers[name])
+                                                 for name in VALIDATOR_HEADERS if result.headers.get(name))
+
         if raise_status:
             result.raise_for_status()
 
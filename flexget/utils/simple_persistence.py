@@ -9,14 +9,16 @@ can replace underlying mechanism in single point (and provide transparent switch
 
 from __future__ import unicode_literals, division, absolute_import
 from collections import MutableMapping
-from contextlib import contextmanager
 from datetime import datetime
 import logging
 import pickle
+import threading
 
 from sqlalchemy import Column, Integer, String, DateTime, PickleType, select, Index
+from sqlalchemy import event as sqlalchemy_event
 
 from flexget import db_schema
+from flexget.event import event
 from flexget.manager import Session
 from flexget.utils.database import safe_pickle_synonym
 from flexget.utils.sqlalchemy_utils import table_schema, create_index
@@ -72,73 +74,216 @@ class SimpleKeyValue(Base):
 Index('ix_simple_persistence_feed_plugin_key', SimpleKeyValue.task, SimpleKeyValue.plugin, SimpleKeyValue.key)
 
 
+# Values of SimplePersistence instances without their own session, shared by all of them. Maps (task, plugin) to
+# a dict of the keys and values in that namespace.
+_store = {}
+# Keys changed in _store since last flush, for each namespace
+_dirty = {}
+_store_lock = threading.RLock()
+
+# Marks a key which has been deleted but not yet flushed to the database
+DELETED = object()
+
+
+def load_namespace(session, taskname, plugin):
+    """Loads all keys of a (task, plugin) namespace in one query."""
+    query = session.query(SimpleKeyValue).filter(SimpleKeyValue.task == taskname).\
+        filter(SimpleKeyValue.plugin == plugin)
+    return dict((skv.key, skv.value) for skv in query)
+
+
+def write_namespace(session, taskname, plugin, values):
+    """
+    Writes changed keys of a namespace to the database using `session`.
+
+    :param dict values: Keys and their new values, :data:`DELETED` as value removes the key
+    """
+    if not values:
+        return
+    existing = session.query(SimpleKeyValue).filter(SimpleKeyValue.task == taskname).\
+        filter(SimpleKeyValue.plugin == plugin).filter(SimpleKeyValue.key.in_(values.keys()))
+    existing = dict((skv.key, skv) for skv in existing)
+    for key, value in values.iteritems():
+        skv = existing.get(key)
+        if value is DELETED:
+            if skv:
+                session.delete(skv)
+        elif skv:
+            log.debug('updating key %s value %s' % (key, repr(value)))
+            skv.value = value
+        else:
+            log.debug('adding key %s value %s' % (key, repr(value)))
+            session.add(SimpleKeyValue(taskname, plugin, key, value))
+
+
+@event('manager.execute.completed')
+@event('manager.shutdown')
+def flush(manager=None):
+    """
+    Writes all pending changes of SimplePersistence instances without their own session to the database.
+
+    The store lock is not held while writing, a thread holding the database write lock may need it meanwhile.
+    """
+    with _store_lock:
+        pending = dict((ns, dict((key, _store[ns][key]) for key in keys)) for ns, keys in _dirty.iteritems() if keys)
+    if not pending:
+        return
+    session = Session()
+    try:
+        for (taskname, plugin), values in pending.iteritems():
+            write_namespace(session, taskname, plugin, values)
+        session.commit()
+    finally:
+        session.close()
+    with _store_lock:
+        for ns, values in pending.iteritems():
+            namespace = _store.get(ns, {})
+            for key, value in values.iteritems():
+                # Keys changed again while writing are left for the next flush
+                if key in namespace and namespace[key] is value:
+                    _dirty.get(ns, set()).discard(key)
+                    if value is DELETED:
+                        del namespace[key]
+
+
+@event('task.execute.completed')
+def flush_task(task):
+    """Executions never complete in daemon and webui mode, changes are also flushed after each task."""
+    flush()
+
+
+@event('manager.shutdown', priority=0)
+def clear_store(manager):
+    """Runs after flush, the database may change before another manager is started (eg. unit tests)."""
+    with _store_lock:
+        _store.clear()
+        _dirty.clear()
+
+
+@sqlalchemy_event.listens_for(Session, 'before_commit')
+def write_session_changes(session):
+    for persistence in session.info.get('simple_persistence', []):
+        persistence._write(session)
+
+
+@sqlalchemy_event.listens_for(Session, 'after_rollback')
+def discard_session_changes(session):
+    for persistence in session.info.get('simple_persistence', []):
+        persistence._reset()
+
+
 class SimplePersistence(MutableMapping):
+    """
+    Dict-like persistent storage of values for a plugin, optionally scoped to a task.
 
-    def __init__(self, plugin, session=None):
-        self.taskname = None
-        self.plugin = plugin
-        self._session = session
-
-    @contextmanager
-    def session_manager(self):
-        """Context manager which creates commits and closes a Session if this instance does not have its own."""
-        session = self._session or Session()
-        try:
-            yield session
-            if not self._session:
-                session.commit()
-        except Exception:
-            raise
-        finally:
-            if not self._session:
+    All keys of a namespace are loaded in one query when first used, and changes are kept in memory. Without a
+    session, changes are shared by all instances and written in one batch when a task or execution completes, or the
+    manager shuts down. With a session, changes are written to it when it commits, and discarded if it rolls back.
+    """
+
+    # Namespace is (taskname, plugin), task scoped persistence overrides these
+    taskname = None
+
+    def __init__(self, plugin=None, session=None):
+        self._plugin = plugin
+        self._bound_session = session
+        # Values and changed keys, when bound to a session
+        self._reset()
+        self._cache_session = None
+
+    @property
+    def plugin(self):
+        return self._plugin
+
+    @property
+    def _session(self):
+        return self._bound_session
+
+    def _namespace(self):
+        """Returns dict with the values of current namespace, and the set of changed keys in it."""
+        ns = (self.taskname, self.plugin)
+        session = self._session
+        if session is None:
+            with _store_lock:
+                if ns in _store:
+                    return _store[ns], _dirty.setdefault(ns, set())
+            # Database is not accessed with the store lock held, see :func:`flush`
+            session = Session()
+            try:
+                values = load_namespace(session, *ns)
+            finally:
                 session.close()
+            with _store_lock:
+                return _store.setdefault(ns, values), _dirty.setdefault(ns, set())
+
+        if session is not self._cache_session:
+            # New session, start with a clean cache
+            self._reset()
+            self._cache_session = session
+            session.info.setdefault('simple_persistence', []).append(self)
+        if ns not in self._cache:
+            values = load_namespace(session, *ns)
+            # Include changes of instances without a session, which are not yet in the database
+            with _store_lock:
+                for key in _dirty.get(ns, []):
+                    values[key] = _store[ns][key]
+            self._cache[ns] = values
+        return self._cache[ns], self._changed.setdefault(ns, set())
+
+    def _write(self, session):
+        """Writes changed keys to the database in the session being committed."""
+        for (taskname, plugin), keys in self._changed.iteritems():
+            values = self._cache[(taskname, plugin)]
+            changes = dict((key, values.get(key, DELETED)) for key in keys)
+            write_namespace(session, taskname, plugin, changes)
+            with _store_lock:
+                # Keep values of instances without a session up to date
+                if (taskname, plugin) in _store:
+                    for key, value in changes.iteritems():
+                        _store[(taskname, plugin)][key] = value
+                        _dirty.get((taskname, plugin), set()).discard(key)
+        self._changed = {}
+
+    def _reset(self):
+        self._cache = {}
+        self._changed = {}
 
     def __setitem__(self, key, value):
-        with self.session_manager() as session:
-            skv = session.query(SimpleKeyValue).filter(SimpleKeyValue.task == self.taskname).\
-                filter(SimpleKeyValue.plugin == self.plugin).filter(SimpleKeyValue.key == key).first()
-            if skv:
-                # update existing
-                log.debug('updating key %s value %s' % (key, repr(value)))
-                skv.value = value
-            else:
-                # add new key
-                skv = SimpleKeyValue(self.taskname, self.plugin, key, value)
-                log.debug('adding key %s value %s' % (key, repr(value)))
-                session.add(skv)
+        values, changed = self._namespace()
+        with _store_lock:
+            values[key] = value
+            changed.add(key)
 
     def __getitem__(self, key):
-        with self.session_manager() as session:
-            skv = session.query(SimpleKeyValue).filter(SimpleKeyValue.task == self.taskname).\
-                filter(SimpleKeyValue.plugin == self.plugin).filter(SimpleKeyValue.key == key).first()
-            if not skv:
-                raise KeyError('%s is not contained in the simple_persistence table.' % key)
-            else:
-                return skv.value
+        values, changed = self._namespace()
+        with _store_lock:
+            value = values.get(key, DELETED)
+        if value is DELETED:
+            raise KeyError('%s is not contained in the simple_persistence table.' % key)
+        return value
 
     def __delitem__(self, key):
-        with self.session_manager() as session:
-            session.query(SimpleKeyValue).filter(SimpleKeyValue.task == self.taskname).\
-                filter(SimpleKeyValue.plugin == self.plugin).filter(SimpleKeyValue.key == key).delete()
+        values, changed = self._namespace()
+        with _store_lock:
+            if self._session is None:
+                values[key] = DELETED
+            else:
+                values.pop(key, None)
+            changed.add(key)
 
     def __iter__(self):
-        with self.session_manager() as session:
-            query = session.query(SimpleKeyValue.key).filter(SimpleKeyValue.task == self.taskname).\
-                filter(SimpleKeyValue.plugin == self.plugin).all()
-            if query:
-                return [item.key for item in query]
-            else:
-                return []
+        values, changed = self._namespace()
+        with _store_lock:
+            return iter([key for key, value in values.iteritems() if value is not DELETED])
 
     def __len__(self):
-        with self.session_manager() as session:
-            return session.query(SimpleKeyValue.key).filter(SimpleKeyValue.task == self.taskname).\
-                filter(SimpleKeyValue.plugin == self.plugin).count()
+        return len(list(self.__iter__()))
 
 
 class SimpleTaskPersistence(SimplePersistence):
 
     def __init__(self, task):
+        SimplePersistence.__init__(self)
         self.task = task
 
     @property
@@ -12,6 +12,7 @@ from time import mktime
 from jinja2 import (Environment, StrictUndefined, ChoiceLoader,
                     FileSystemLoader, PackageLoader, TemplateNotFound,
                     TemplateSyntaxError, Undefined)
+from jinja2.utils import LRUCache
 
 from flexget.event import event
 from flexget.utils.pathscrub import pathscrub
@@ -21,6 +22,12 @@ log = logging.getLogger('utils.template')
 # The environment will be created after the manager has started
 environment = None
 
+# Number of compiled template strings to keep
+TEMPLATE_CACHE_SIZE = 1000
+
+# Templates compiled from strings, reset along with the environment
+_template_cache = LRUCache(TEMPLATE_CACHE_SIZE)
+
 
 class RenderError(Exception):
     """Error raised when there is a problem with jinja rendering."""
@@ -138,6 +145,7 @@ def make_environment(manager):
             environment.filters[name.split('_', 1)[1]] = filt
         elif name == 'now':
             environment.globals['now'] = now
+    _template_cache.clear()
 
 
 # TODO: list_templates function
@@ -163,6 +171,23 @@ def get_template(templatename, pluginname=None):
         raise ValueError('Template not found: %s (%s)' % (templatename, pluginname))
 
 
+def get_template_from_string(template_string):
+    """Compiles a template string, or returns it from cache if it has been compiled before."""
+    template = _template_cache.get(template_string)
+    if template is None:
+        template = environment.from_string(template_string)
+        _template_cache[template_string] = template
+    return template
+
+
+def is_plain(template_string):
+    """
+    Tells whether rendering `template_string` with jinja would return it unchanged, in which case it only needs
+    string replacement.
+    """
+    return '{' not in template_string and '\r' not in template_string and not template_string.endswith('\n')
+
+
 def render(template, context):
     """
     Renders a Template with `context` as its context.
@@ -172,7 +197,7 @@ def render(template, context):
     :return: The rendered template text.
     """
     if isinstance(template, basestring):
-        template = environment.from_string(template)
+        template = get_template_from_string(template)
     try:
         result = template.render(context)
     except Exception as e:
@@ -186,8 +211,10 @@ def render_from_entry(template_string, entry):
 
     # If a plain string was passed, turn it into a Template
     if isinstance(template_string, basestring):
+        if is_plain(template_string):
+            return render_string_replacement(unicode(template_string), entry)
         try:
-            template = environment.from_string(template_string)
+            template = get_template_from_string(template_string)
         except TemplateSyntaxError as e:
             raise RenderError('Error in template syntax: ' + e.message)
     else:
@@ -213,18 +240,25 @@ def render_from_entry(template_string, entry):
 
     # Only try string replacement if jinja didn't do anything
     if result == template_string:
-        try:
-            result = template_string % entry
-        except KeyError as e:
-            raise RenderError('Does not contain the field `%s` for string replacement.' % e)
-        except ValueError as e:
-            raise RenderError('Invalid string replacement template: %s (%s)' % (template_string, e))
-        except TypeError as e:
-            raise RenderError('Error during string replacement: %s' % e.message)
+        result = render_string_replacement(template_string, entry)
 
     return result
 
 
+def render_string_replacement(template_string, entry):
+    """Renders an old style `%(field)s` template string with an Entry."""
+    if '%' not in template_string:
+        return template_string
+    try:
+        return template_string % entry
+    except KeyError as e:
+        raise RenderError('Does not contain the field `%s` for string replacement.' % e)
+    except ValueError as e:
+        raise RenderError('Invalid string replacement template: %s (%s)' % (template_string, e))
+    except TypeError as e:
+        raise RenderError('Error during string replacement: %s' % e.message)
+
+
 def render_from_task(template, task):
     """
     Renders a Template with a task as its context.
@@ -234,7 +268,7 @@ def render_from_task(template, task):
     :return: The rendered template text.
     """
     if isinstance(template, basestring):
-        template = environment.from_string(template)
+        template = get_template_from_string(template)
     try:
         result = template.render({'task': task})
     except Exception as e:
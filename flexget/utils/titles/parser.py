@@ -1,6 +1,8 @@
 from __future__ import unicode_literals, division, absolute_import
 import re
 
+from flexget.utils.tools import compile_regexp
+
 
 class ParseWarning(Warning):
 
@@ -61,5 +63,5 @@ class TitleParser(object):
         old = re.escape(old)
         if not_in_word:
             old = TitleParser.re_not_in_word(old)
-        pattern = re.compile(old, re.I)
-        return re.sub(pattern, new, data, count)
+        pattern = compile_regexp(old, re.I)
+        return pattern.sub(new, data, count)
@@ -1,13 +1,14 @@
 from __future__ import unicode_literals, division, absolute_import
+from collections import defaultdict
 import logging
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from dateutil.parser import parse as parsedate
 
 from flexget.utils.titles.parser import TitleParser, ParseWarning
 from flexget.utils import qualities
-from flexget.utils.tools import ReList
+from flexget.utils.tools import ReList, LRUDict, compile_regexp
 
 log = logging.getLogger('seriesparser')
 
@@ -17,6 +18,24 @@ log.setLevel(logging.INFO)
 
 ID_TYPES = ['ep', 'date', 'sequence', 'id']
 
+# Bump when parsing logic changes, so that cached parse results are not reused
+PARSER_VERSION = 1
+
+# Number of parse results to keep in memory, see `SeriesParser.parse`
+PARSE_CACHE_SIZE = 20000
+
+# Attributes produced by `SeriesParser.parse`
+PARSE_RESULTS = ['season', 'episode', 'episodes', 'id', 'id_type', 'id_groups', 'quality', 'proper_count',
+                 'special', 'group', 'valid']
+
+SQUASH_RE = re.compile(r'[\W_]+', re.UNICODE)
+DIRT_RE = re.compile(r'[_.,\[\]\(\): ]+')
+
+
+def squash_name(text):
+    """Lowercases `text` and removes all but word characters from it, `&` is spelled out as `and`."""
+    return SQUASH_RE.sub('', text.lower().replace('&', 'and'))
+
 
 class SeriesParser(TitleParser):
 
@@ -66,6 +85,15 @@ class SeriesParser(TitleParser):
         '(?:\[[^\[\]]*\])',  # ignores group names before the name, eg [foobar] name
         '(?:HD.720p?:)',
         '(?:HD.1080p?:)']
+    # Idiotic numbering scheme 101,102,103,201,202 used with identified_by ep
+    numbering_re = compile_regexp(TitleParser.re_not_in_word(r'(0?\d)(\d\d)'))
+
+    # Identifier regexps with custom ones prepended, shared by all parsers using the same custom regexps
+    _combined_regexps = {}
+    # Regexps generated from series names, see `name_to_re`
+    _name_regexps = {}
+    # Results of earlier parses, keyed by parser signature and data
+    _parse_cache = LRUDict(PARSE_CACHE_SIZE)
 
     def __init__(self, name='', alternate_names=None, identified_by='auto', name_regexps=None, ep_regexps=None,
                  date_regexps=None, sequence_regexps=None, id_regexps=None, strict_name=False, allow_groups=None,
@@ -111,7 +139,7 @@ class SeriesParser(TitleParser):
         for mode in ID_TYPES:
             listname = mode + '_regexps'
             if locals()[listname]:
-                setattr(self, listname, ReList(locals()[listname] + getattr(SeriesParser, listname)))
+                setattr(self, listname, self.combined_regexps(listname, locals()[listname]))
         self.specials = self.specials + [i.lower() for i in (special_ids or [])]
         self.prefer_specials = prefer_specials
         self.assume_special = assume_special
@@ -153,18 +181,43 @@ class SeriesParser(TitleParser):
                 raise Exception('%s cannot be %s' % (name, repr(value)))
         object.__setattr__(self, name, value)
 
+    @classmethod
+    def combined_regexps(cls, listname, custom):
+        """Returns a ReList of `custom` regexps followed by the built in ones in `listname`."""
+        key = (listname, tuple(custom))
+        regexps = cls._combined_regexps.get(key)
+        if regexps is None:
+            regexps = cls._combined_regexps[key] = ReList(list(custom) + getattr(SeriesParser, listname))
+        return regexps
+
     def remove_dirt(self, data):
         """Replaces some characters with spaces"""
-        return re.sub(r'[_.,\[\]\(\): ]+', ' ', data).strip().lower()
+        return DIRT_RE.sub(' ', data).strip().lower()
 
-    def name_to_re(self, name):
-        """Convert 'foo bar' to '^[^...]*foo[^...]*bar[^...]+"""
-        parenthetical = None
+    @staticmethod
+    def split_parenthetical(name):
+        """Splits 'Show (US)' to ('Show', 'US'). Parenthetical is None if the name does not end with one."""
         if name.endswith(')'):
             p_start = name.rfind('(')
             if p_start != -1:
-                parenthetical = name[p_start + 1:-1]
-                name = name[:p_start - 1]
+                return name[:p_start - 1], name[p_start + 1:-1]
+        return name, None
+
+    def name_to_re(self, name):
+        """Convert 'foo bar' to '^[^...]*foo[^...]*bar[^...]+"""
+        key = (name, tuple(self.ignore_prefixes))
+        if key not in self._name_regexps:
+            self._name_regexps[key] = self._name_to_re(name)
+        res, exact = self._name_regexps[key]
+        if exact:
+            # Turn on exact mode for series ending with a parenthetical,
+            # so that 'Show (US)' is not accepted as 'Show (UK)'
+            self.strict_name = True
+        return res
+
+    def _name_to_re(self, name):
+        """Returns the regexp for `name`, and whether it needs exact mode."""
+        name, parenthetical = self.split_parenthetical(name)
         # Blanks are any non word characters except & and _
         blank = r'(?:[^\w&]|_)'
         ignore = '(?:' + '|'.join(self.ignore_prefixes) + ')?'
@@ -175,23 +228,76 @@ class SeriesParser(TitleParser):
         res = re.sub(' +', blank + '*', res, re.UNICODE)
         if parenthetical:
             res += '(?:' + blank + '+' + parenthetical + ')?'
-            # Turn on exact mode for series ending with a parenthetical,
-            # so that 'Show (US)' is not accepted as 'Show (UK)'
-            self.strict_name = True
         res = '^' + ignore + blank + '*' + '(' + res + ')(?:\\b|_)' + blank + '*'
-        return res
+        return res, parenthetical is not None
+
+    def squashed_names(self):
+        """
+        Returns the series name and alternate names in the form used by :class:`SeriesNameIndex`,
+        or None if custom `name_regexps` are used.
+        """
+        if self.name_regexps and not self.re_from_name:
+            return None
+        return [squash_name(self.split_parenthetical(name)[0]) for name in [self.name] + self.alternate_names]
+
+    def signature(self):
+        """
+        Identifies everything besides the data that affects the result of :meth:`parse`. Dates are only accepted
+        up to a day in the future, so it also includes today's date.
+        """
+        def patterns(regexps):
+            return tuple(regexp.pattern for regexp in regexps)
+
+        return (PARSER_VERSION, date.today(), self.name, tuple(self.alternate_names), self.identified_by,
+                patterns(self.name_regexps), self.re_from_name, patterns(self.ep_regexps),
+                patterns(self.date_regexps), patterns(self.sequence_regexps), patterns(self.id_regexps),
+                self.strict_name, tuple(self.allow_groups), self.allow_seasonless, self.date_dayfirst,
+                self.date_yearfirst, tuple(self.specials), self.prefer_specials, self.assume_special)
 
     def parse(self, data=None, field=None, quality=None):
+        """
+        Parses `data`, or the data given earlier, for this series.
+
+        Results are cached by :meth:`signature` and data, so titles seen again by the same parser configuration are
+        not parsed again.
+
+        :param field: Name of the entry field `data` came from.
+        :param quality: Quality to use if none is found from `data`.
+        """
         # Clear the output variables before parsing
         self._reset()
         self.field = field
-        self.quality = quality or qualities.Quality()
         if data:
             self.data = data
         if not self.name or not self.data:
             raise Exception('SeriesParser initialization error, name: %s data: %s' %
                             (repr(self.name), repr(self.data)))
 
+        # regexp name matching
+        if not self.name_regexps:
+            # if we don't have name_regexps, generate one from the name
+            self.name_regexps = ReList(self.name_to_re(name) for name in [self.name] + self.alternate_names)
+            # With auto regex generation, the first regex group captures the name
+            self.re_from_name = True
+
+        key = (self.signature(), self.data)
+        result = self._parse_cache.get(key)
+        if result is None:
+            try:
+                self._parse()
+            except ParseWarning as pw:
+                result = pw
+            else:
+                result = dict((attr, getattr(self, attr)) for attr in PARSE_RESULTS)
+            self._parse_cache[key] = result
+        if isinstance(result, ParseWarning):
+            raise ParseWarning(result.value, **result.kwargs)
+        for attr, value in result.iteritems():
+            setattr(self, attr, value)
+        if quality and not self.quality:
+            self.quality = quality
+
+    def _parse(self):
         # check if data appears to be unwanted (abort)
         if self.parse_unwanted(self.remove_dirt(self.data)):
             raise ParseWarning('`{data}` appears to be an episode pack'.format(data=self.data))
@@ -204,12 +310,6 @@ class SeriesParser(TitleParser):
         name_start = 0
         name_end = 0
 
-        # regexp name matching
-        if not self.name_regexps:
-            # if we don't have name_regexps, generate one from the name
-            self.name_regexps = ReList(self.name_to_re(name) for name in [self.name] + self.alternate_names)
-            # With auto regex generation, the first regex group captures the name
-            self.re_from_name = True
         # try all specified regexps on this data
         for name_re in self.name_regexps:
             match = re.search(name_re, self.data)
@@ -325,7 +425,7 @@ class SeriesParser(TitleParser):
                 # ressu: Added matching for 0101, 0102... It will fail on
                 #        season 11 though
                 log.debug('expect_ep enabled')
-                match = re.search(self.re_not_in_word(r'(0?\d)(\d\d)'), data_stripped, re.IGNORECASE | re.UNICODE)
+                match = self.numbering_re.search(data_stripped)
                 if match:
                     # strict_name
                     if self.strict_name:
@@ -602,3 +702,43 @@ class SeriesParser(TitleParser):
 
     def __eq__(self, other):
         return self is other
+
+
+class SeriesNameIndex(object):
+    """
+    Finds which of many :class:`SeriesParser` instances could match a title, without running their name regexps.
+    Lets the full parse be run only for those, instead of for every series against every title.
+
+    Name regexps generated from the series name are anchored to the start of the data (after an optional ignored
+    prefix,) and allow any blanks between words, so only titles whose squashed form starts with the squashed
+    series name can match. Parsers with custom `name_regexps` are always returned as candidates.
+    """
+
+    ignore_re = re.compile('^(?:%s)' % '|'.join(SeriesParser.ignore_prefixes), re.IGNORECASE | re.UNICODE)
+
+    def __init__(self, parsers):
+        self.by_name = defaultdict(list)
+        self.unindexed = []
+        for parser in parsers:
+            names = parser.squashed_names()
+            if names is None:
+                self.unindexed.append(parser)
+                continue
+            for name in set(names):
+                self.by_name[name].append(parser)
+        self.lengths = sorted(set(len(name) for name in self.by_name))
+
+    def candidates(self, data):
+        """Returns a set of the parsers which could match `data`."""
+        result = set(self.unindexed)
+        texts = [data]
+        match = self.ignore_re.match(data)
+        if match:
+            texts.append(data[match.end():])
+        for text in texts:
+            text = squash_name(text)
+            for length in self.lengths:
+                if length > len(text):
+                    break
+                result.update(self.by_name.get(text[:length], []))
+        return result
@@ -9,7 +9,8 @@ import time
 import re
 import sys
 import locale
-from collections import MutableMapping
+import threading
+from collections import MutableMapping, OrderedDict
 from urlparse import urlparse
 from htmlentitydefs import name2codepoint
 from datetime import timedelta, datetime
@@ -253,13 +254,36 @@ def urlopener(url_or_request, log, **kwargs):
         socket.setdefaulttimeout(oldtimeout)
 
 
+# Maximum number of patterns kept by `compile_regexp`
+MAX_COMPILED_REGEXPS = 5000
+
+# Compiled regexps shared by the whole process, see `compile_regexp`
+_compiled_regexps = {}
+
+
+def compile_regexp(pattern, flags=re.IGNORECASE | re.UNICODE):
+    """
+    Compiles `pattern`, or returns it from a process wide registry if it has been compiled before.
+
+    Unlike the cache in the `re` module this can hold all the patterns used by parsers, so they are not
+    compiled over and over again.
+    """
+    key = (pattern, flags)
+    compiled = _compiled_regexps.get(key)
+    if compiled is None:
+        if len(_compiled_regexps) >= MAX_COMPILED_REGEXPS:
+            _compiled_regexps.clear()
+        compiled = _compiled_regexps[key] = re.compile(pattern, flags)
+    return compiled
+
+
 class ReList(list):
     """
     A list that stores regexps.
 
     You can add compiled or uncompiled regexps to the list.
     It will always return the compiled version.
-    It will compile the text regexps on demand when first accessed.
+    It will compile the text regexps on demand when first accessed, using :func:`compile_regexp`.
     """
 
     # Set the default flags
@@ -275,7 +299,7 @@ class ReList(list):
     def __getitem__(self, k):
         item = list.__getitem__(self, k)
         if isinstance(item, basestring):
-            item = re.compile(item, re.IGNORECASE | re.UNICODE)
+            item = compile_regexp(item, self.flags)
             self[k] = item
         return item
 
@@ -401,3 +425,87 @@ class TimedDict(MutableMapping):
 
     def __repr__(self):
         return '%s(%r)' % (self.__class__.__name__, dict(zip(self._store, (v[1] for v in self._store.values()))))
+
+
+class LRUDict(MutableMapping):
+    """
+    A dict bounded in size. When full, the least recently used keys are removed.
+
+    :param max_items: Maximum number of keys to keep
+    """
+    def __init__(self, max_items=100):
+        self.max_items = max_items
+        self._store = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            # Mark as most recently used
+            value = self._store[key] = self._store.pop(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._store.pop(key, None)
+            self._store[key] = value
+            while len(self._store) > self.max_items:
+                self._store.popitem(last=False)
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._store[key]
+
+    def __iter__(self):
+        return iter(self._store.keys())
+
+    def __len__(self):
+        return len(self._store)
+
+
+class TimedLRUDict(TimedDict):
+    """
+    A :class:`TimedDict` which is also bounded in size. When full, the least recently used keys are removed.
+
+    Expired values are kept until they are pushed out, and can still be retrieved with :meth:`get_stale`, eg. for
+    revalidating them.
+
+    :param max_items: Maximum number of keys to keep
+    :param max_size: Maximum total size of the values, size of a value is its `len()`
+    """
+    def __init__(self, cache_time='5 minutes', max_items=100, max_size=None):
+        super(TimedLRUDict, self).__init__(cache_time)
+        self.max_items = max_items
+        self.max_size = max_size
+        self._store = OrderedDict()
+
+    def __getitem__(self, key):
+        add_time, value = self._store[key]
+        if add_time < datetime.now() - self.cache_time:
+            raise KeyError(key, 'cache time expired')
+        # Mark as most recently used
+        self._store[key] = self._store.pop(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._store.pop(key, None)
+        self._store[key] = (datetime.now(), value)
+        self._prune()
+
+    def __iter__(self):
+        return (key for key in self._store.keys() if key in self)
+
+    def get_stale(self, key, default=None):
+        """Returns value for `key` even if it has expired."""
+        try:
+            return self._store[key][1]
+        except KeyError:
+            return default
+
+    def _prune(self):
+        size = None
+        if self.max_size is not None:
+            size = sum(len(value) for add_time, value in self._store.itervalues())
+        while self._store and (len(self._store) > self.max_items or (size is not None and size > self.max_size)):
+            key, (add_time, value) = self._store.popitem(last=False)
+            if size is not None:
+                size -= len(value)
@@ -0,0 +1,17 @@
+from __future__ import unicode_literals, division, absolute_import
+
+from flexget import plugin
+from flexget.entry import Entry
+from flexget.event import event
+
+
+class LazyPlugin(object):
+    schema = {'type': 'string'}
+
+    def on_task_input(self, task, config):
+        return [Entry(config, 'fake url')]
+
+
+@event('plugin.register')
+def register_plugin():
+    plugin.register(LazyPlugin, 'lazy_plugin', api_ver=2)
@@ -0,0 +1,56 @@
+from __future__ import unicode_literals, division, absolute_import
+
+from flexget.manager import Session
+from flexget.plugins.generic.archive import ArchiveEntry, search
+from tests import FlexGetBase
+
+
+class TestArchive(FlexGetBase):
+
+    __yaml__ = """
+        tasks:
+          test:
+            mock:
+              - {title: 'Some.Show.S01E01.720p', url: 'http://localhost/1'}
+              - {title: 'Other.Show.S01E01', url: 'http://localhost/2', description: 'some show spinoff'}
+              - {title: 'Unrelated', url: 'http://localhost/3'}
+            accept_all: yes
+            archive: [tv]
+    """
+
+    def search(self, text, **kwargs):
+        session = Session()
+        try:
+            return [ae.title for ae in search(session, text, **kwargs)]
+        finally:
+            session.close()
+
+    def test_learn(self):
+        self.execute_task('test')
+        self.execute_task('test')
+        session = Session()
+        try:
+            assert session.query(ArchiveEntry).count() == 3, 'Entries should only be archived once'
+            ae = session.query(ArchiveEntry).filter(ArchiveEntry.title == 'Unrelated').one()
+            assert [s.name for s in ae.sources] == ['test']
+            assert [t.name for t in ae.tags] == ['tv']
+        finally:
+            session.close()
+
+    def test_search(self):
+        self.execute_task('test')
+        assert self.search('some show') == ['Some.Show.S01E01.720p', 'Other.Show.S01E01'], \
+            'Title match should rank above description match'
+        assert self.search('show 720') == ['Some.Show.S01E01.720p']
+        assert self.search('unrelated', tags=['tv']) == ['Unrelated']
+        assert self.search('unrelated', sources=['other']) == []
+
+    def test_search_without_index(self):
+        self.execute_task('test')
+        session = Session()
+        try:
+            session.execute('DROP TABLE archive_entry_fts')
+            session.commit()
+        finally:
+            session.close()
+        assert self.search('some show') == ['Some.Show.S01E01.720p'], 'Should fall back to title search'
@@ -0,0 +1,48 @@
+from __future__ import unicode_literals, division, absolute_import
+import shutil
+import tempfile
+
+from tests import FlexGetBase
+from flexget.manager import Session
+from flexget.plugins.cli.benchmark import Workload, run_benchmark
+
+
+class TestBenchmark(FlexGetBase):
+    __yaml__ = """
+        tasks: {}
+    """
+
+    def setup(self):
+        FlexGetBase.setup(self)
+        self.workdir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        FlexGetBase.teardown(self)
+
+    def test_reproducible(self):
+        first = Workload(self.workdir, seed=1, scale=0.01)
+        second = Workload(self.workdir, seed=1, scale=0.01)
+        assert first.release_titles('test', 100) == second.release_titles('test', 100)
+        assert first.torrents(2) == second.torrents(2)
+        assert first.series_names() != Workload(self.workdir, seed=2, scale=0.01).series_names()
+
+    def test_parsing(self):
+        result = run_benchmark(self.manager, 'series_parsing', Workload(self.workdir, scale=0.01), 2)
+        assert result['operations'] == 60
+        assert len(result['runs']) == 2
+        assert 'queries' not in result
+
+    def test_cold_caches(self):
+        from flexget.utils import qualities
+        qualities._parse_cache['benchmark test'] = None
+        run_benchmark(self.manager, 'quality_parsing', Workload(self.workdir, scale=0.01), 1)
+        assert 'benchmark test' not in qualities._parse_cache, 'Caches should be emptied before each run'
+
+    def test_task(self):
+        bind = Session.kw.get('bind')
+        result = run_benchmark(self.manager, 'seen_filtering', Workload(self.workdir, scale=0.01), 1)
+        assert result['operations'] == 24
+        assert result['queries'] > 0, 'Queries to the temporary database should be counted'
+        assert 'filter.seen' in result['plugins']
+        assert Session.kw.get('bind') is bind, 'Real database should be used again after the benchmark'
@@ -1,6 +1,8 @@
 from __future__ import unicode_literals, division, absolute_import
 from datetime import timedelta
 import os
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 
 from tests import FlexGetBase, with_filecopy
 from flexget.utils.cached_input import cached
@@ -23,6 +25,64 @@ class InputPersist(object):
 plugin.register(InputPersist, 'test_input', api_ver=2)
 
 
+class ETagHandler(BaseHTTPRequestHandler):
+    """Serves a resource with an ETag, responds 304 when the client already has it."""
+
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', '4')
+        self.end_headers()
+        self.wfile.write(b'Test')
+
+    def log_message(self, *args):
+        pass
+
+
+class InputConditional(object):
+    """Fake input plugin creating an entry from the content of the configured url."""
+
+    parsed = 0
+
+    @cached('test_conditional')
+    def on_task_input(self, task, config):
+        try:
+            content = task.requests.get(config).content
+        except Exception as e:
+            raise plugin.PluginError('Unable to get %s: %s' % (config, e))
+        InputConditional.parsed += 1
+        return [Entry(title=content.decode('ascii'), url=config)]
+
+plugin.register(InputConditional, 'test_conditional', api_ver=2)
+
+
+class InputLazy(object):
+    """Fake input plugin creating an entry with a lazy field, which records the entries it is evaluated for."""
+
+    evaluated = []
+
+    @staticmethod
+    def lookup(entry, field):
+        InputLazy.evaluated.append(entry)
+        entry[field] = 'looked up'
+        return entry[field]
+
+    @cached('test_lazy')
+    def on_task_input(self, task, config):
+        entry = Entry(title='Test', url='http://test.com')
+        entry.register_lazy_fields(['lazy'], self.lookup)
+        return [entry]
+
+plugin.register(InputLazy, 'test_lazy', api_ver=2)
+
+
 class TestInputCache(FlexGetBase):
 
     __yaml__ = """
@@ -32,6 +92,10 @@ class TestInputCache(FlexGetBase):
               url: cached.xml
           test_db:
             test_input: True
+          test_lazy:
+            test_lazy: True
+            # Backlog can not snapshot lazy fields during input
+            disable_builtins: [backlog]
     """
 
     @with_filecopy('rss.xml', 'cached.xml')
@@ -58,3 +122,48 @@ class TestInputCache(FlexGetBase):
         assert self.task.entries, 'should have created entries at the start'
         self.execute_task('test_db')
         assert self.task.entries, 'should have created entries from the cache'
+
+    def test_lazy_fields(self):
+        """Test lazy fields of restored entries populate those entries"""
+        InputLazy.evaluated = []
+        for i in range(2):
+            self.execute_task('test_lazy')
+            entry = self.task.find_entry(title='Test')
+            assert entry['lazy'] == 'looked up'
+            assert InputLazy.evaluated[-1] is entry, 'lazy field should have been evaluated for the task entry'
+
+
+class TestConditionalCache(FlexGetBase):
+
+    __yaml__ = """
+        tasks:
+          test:
+            test_conditional: http://localhost:%d/feed
+    """
+
+    def setup(self):
+        self.server = HTTPServer(('localhost', 0), ETagHandler)
+        self.__yaml__ = self.__yaml__ % self.server.server_port
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        super(TestConditionalCache, self).setup()
+
+    def teardown(self):
+        super(TestConditionalCache, self).teardown()
+        self.server.shutdown()
+
+    def test_revalidate(self):
+        self.execute_task('test')
+        assert self.task.find_entry(title='Test'), 'should have created entry from the url'
+        assert InputConditional.parsed == 1
+        # Expire the cache, so that it has to be revalidated
+        cache_time = cached.cache.cache_time
+        cached.cache.cache_time = timedelta(minutes=0)
+        try:
+            self.execute_task('test')
+        finally:
+            cached.cache.cache_time = cache_time
+        assert ETagHandler.requests == [None, '"v1"'], 'second request should have been conditional'
+        assert self.task.find_entry(title='Test'), 'should have restored entry from the cache'
+        assert InputConditional.parsed == 1, 'input should not have parsed unchanged content again'
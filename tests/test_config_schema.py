@@ -1,4 +1,5 @@
 from __future__ import unicode_literals, division, absolute_import
+import copy
 
 import jsonschema
 
@@ -149,3 +150,24 @@ class TestSchemaValidator(FlexGetBase):
         config = {"p": "foo"}
         config_schema.process_config(config, schema)
         assert config["p"] == "foo"
+
+    def test_unchanged_tasks_are_not_validated_again(self):
+        config = {'tasks': {'a': {'regexp': {'accept': ['a']}}, 'b': {'regexp': {'accept': ['b']}}}}
+        assert not config_schema.process_config(copy.deepcopy(config))
+        validated = []
+        original_iter_errors = config_schema._iter_errors
+
+        def iter_errors(instance, *args):
+            validated.append(instance)
+            return original_iter_errors(instance, *args)
+
+        config_schema._iter_errors = iter_errors
+        try:
+            config['tasks']['b']['regexp'] = 'invalid'
+            errors = config_schema.process_config(config)
+        finally:
+            config_schema._iter_errors = original_iter_errors
+        assert config['tasks']['b'] in validated, 'Changed task should have been validated'
+        assert config['tasks']['a'] not in validated, 'Unchanged task should not have been validated again'
+        assert len(errors) == 1
+        assert errors[0].json_pointer == '/tasks/b/regexp'
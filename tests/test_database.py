@@ -0,0 +1,40 @@
+from __future__ import unicode_literals, division, absolute_import
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from flexget.manager import copy_database
+
+
+class TestCopyDatabase(object):
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmpdir, 'db-test.sqlite')
+        self.copy = os.path.join(self.tmpdir, 'test-test.sqlite')
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_includes_wal(self):
+        conn = sqlite3.connect(self.source)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA wal_autocheckpoint=0')
+            conn.execute('CREATE TABLE test (value TEXT)')
+            conn.execute('INSERT INTO test VALUES (?)', ('in wal',))
+            conn.commit()
+            assert os.path.getsize(self.source + '-wal'), 'Commit should still be in the write-ahead log'
+            # A log left over from an earlier test database must not be applied to the copy
+            with open(self.copy + '-wal', 'wb') as f:
+                f.write(b'stale')
+            copy_database(self.source, self.copy)
+        finally:
+            conn.close()
+        assert not os.path.exists(self.copy + '-wal')
+        copy = sqlite3.connect(self.copy)
+        try:
+            assert copy.execute('SELECT value FROM test').fetchall() == [('in wal',)]
+        finally:
+            copy.close()
@@ -39,3 +39,32 @@ class TestLazyFields(object):
         assert entry['a_fail'] == 'b', 'Lookup should have fallen back to b'
         assert 'a_field' not in entry, 'a_field should no longer be in entry after failed lookup'
         assert entry['ab_field'] == 'b', 'ab_field should be `b`'
+
+    def test_prefetch(self):
+        """Tests that a prefetch function is run once for all entries of a task"""
+
+        class FakeTask(object):
+            all_entries = []
+
+        prefetched = []
+
+        def lazy(entry, field):
+            entry[field] = 'single'
+            return entry[field]
+
+        def prefetch(entries):
+            prefetched.append(len(entries))
+            for entry in entries[:2]:
+                entry['field'] = 'bulk'
+
+        task = FakeTask()
+        for i in range(3):
+            entry = Entry()
+            entry.task = task
+            entry.register_lazy_fields(['field'], lazy, prefetch=prefetch)
+            task.all_entries.append(entry)
+
+        assert task.all_entries[1]['field'] == 'bulk', 'Field should have been populated by prefetch'
+        assert task.all_entries[0]['field'] == 'bulk', 'Field should have been populated by prefetch'
+        assert task.all_entries[2]['field'] == 'single', 'Field not prefetched should fall back to lookup'
+        assert prefetched == [3], 'Prefetch should have run once for all entries'
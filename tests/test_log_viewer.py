@@ -0,0 +1,78 @@
+from __future__ import unicode_literals, division, absolute_import
+import importlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from flexget.manager import Session
+from tests import FlexGetBase, setup_once
+
+
+def make_record(message):
+    return logging.LogRecord('test_log_viewer', logging.INFO, __file__, 1, message, (), None)
+
+
+class TestDBLogHandler(FlexGetBase):
+
+    __yaml__ = """
+        tasks: {}
+    """
+
+    def setup(self):
+        # The webui can only be imported once plugins are loaded, and its table must exist before the manager starts
+        setup_once()
+        self.log_viewer = importlib.import_module('flexget.ui.plugins.log_viewer.log_viewer')
+        # The writer thread has a connection of its own, which can not share an in-memory database
+        self.tmpdir = tempfile.mkdtemp()
+        self.database_uri = 'sqlite:///%s' % os.path.join(self.tmpdir, 'test.sqlite')
+        FlexGetBase.setup(self)
+
+    def teardown(self):
+        FlexGetBase.teardown(self)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def messages(self):
+        session = Session()
+        try:
+            LogEntry = self.log_viewer.LogEntry
+            return [entry.message for entry in session.query(LogEntry).order_by(LogEntry.id)]
+        finally:
+            session.close()
+
+    def test_close_writes_queued(self):
+        handler = self.log_viewer.DBLogHandler()
+        for i in range(3):
+            handler.emit(make_record('message %s' % i))
+        assert handler.writer is not None, 'Writer thread should have been started'
+        handler.close()
+        assert not handler.writer.is_alive()
+        assert self.messages() == ['message 0', 'message 1', 'message 2']
+
+    def test_full_queue(self):
+        handler = self.log_viewer.DBLogHandler(queue_size=2)
+        # Stand-in for the writer thread, so the queue is not emptied meanwhile
+        handler.writer = threading.Thread()
+        for i in range(5):
+            handler.emit(make_record('message %s' % i))
+        assert handler.dropped == 3
+        handler.flush()
+        assert self.messages() == ['message 0', 'message 1',
+                                   '3 log messages were dropped, logging was too busy']
+        assert handler.dropped == 0
+
+    def test_purge(self):
+        session = Session()
+        try:
+            for age in (self.log_viewer.LOG_RETENTION + timedelta(days=1), timedelta(days=1)):
+                entry = self.log_viewer.LogEntry(make_record('%s days old' % age.days))
+                entry.created = datetime.now() - age
+                session.add(entry)
+            session.commit()
+            self.log_viewer.purge(session)
+            session.commit()
+        finally:
+            session.close()
+        assert self.messages() == ['1 days old'], 'Messages older than the retention time should be purged'
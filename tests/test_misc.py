@@ -161,6 +161,49 @@ class TestEntryUnicodeError(object):
         e['invalid'] = b'\x8e'
 
 
+class TestEntryContainer(object):
+
+    def setup(self):
+        from flexget.task import EntryContainer
+        self.entries = EntryContainer(Entry('entry %s' % i, 'http://localhost/%s' % i) for i in range(5))
+
+    def test_state_counts(self):
+        self.entries[0].accept()
+        self.entries[1].reject()
+        self.entries[2].fail()
+        assert len(self.entries.accepted) == 1
+        assert len(self.entries.rejected) == 1
+        assert len(self.entries.failed) == 1
+        assert len(self.entries.undecided) == 2
+        assert len(self.entries.entries) == 3
+        assert not self.entries.accepted.find(title='entry 1')
+        self.entries.remove(self.entries[0])
+        assert not self.entries.accepted
+        del self.entries[:]
+        assert len(self.entries.entries) == 0
+        assert not list(self.entries.rejected)
+
+    def test_copies_are_not_tracked(self):
+        import copy
+        entry = copy.deepcopy(self.entries[0])
+        entry.accept()
+        assert entry.accepted and not self.entries.accepted
+
+    def test_find(self):
+        entries = self.entries.entries
+        assert entries.find(title='entry 3') is self.entries[3]
+        assert entries.find(title='entry 3', url='http://localhost/4') is None
+        self.entries[3]['url'] = 'http://localhost/changed'
+        assert entries.find(url='http://localhost/changed') is self.entries[3]
+        assert entries.find(url='http://localhost/3') is None
+        assert entries.find(original_url='http://localhost/3') is self.entries[3]
+        self.entries[3].reject()
+        assert entries.find(title='entry 3') is None
+        self.entries[1:2] = [Entry('entry 3', 'http://localhost/new')]
+        assert entries.find(title='entry 3')['url'] == 'http://localhost/new'
+        assert entries.find(title='entry 1') is None
+
+
 class TestFilterRequireField(FlexGetBase):
 
     __yaml__ = """
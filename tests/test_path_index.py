@@ -0,0 +1,99 @@
+from __future__ import unicode_literals, division, absolute_import
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from flexget.manager import Session
+from flexget.utils.path_index import PathIndex, IndexedDir
+from flexget.utils.simple_persistence import SimpleKeyValue
+from tests import FlexGetBase
+
+
+class TestPathIndex(FlexGetBase):
+
+    __tmp__ = True
+
+    def names(self, index):
+        return sorted(item.name for item in index.items(self.__tmp__))
+
+    def test_refresh(self):
+        os.mkdir(os.path.join(self.__tmp__, 'Some.Movie.2010.720p'))
+        open(os.path.join(self.__tmp__, 'Some.Movie.2010.720p', 'movie.mkv'), 'w').close()
+        index = PathIndex()
+        items = index.items(self.__tmp__)
+        movie_dir = [item for item in items if item.is_dir][0]
+        assert movie_dir.movie_name == 'Some Movie' and movie_dir.movie_year == 2010
+        assert self.names(index) == ['Some.Movie.2010.720p', 'movie.mkv']
+
+        open(os.path.join(self.__tmp__, 'new.mkv'), 'w').close()
+        os.remove(os.path.join(self.__tmp__, 'Some.Movie.2010.720p', 'movie.mkv'))
+        assert self.names(index) == ['Some.Movie.2010.720p', 'new.mkv'], 'Changes were not picked up'
+
+    def test_stored(self):
+        os.mkdir(os.path.join(self.__tmp__, 'dir'))
+        PathIndex().items(self.__tmp__)
+        session = Session()
+        try:
+            assert session.query(IndexedDir).count() == 2, 'Both directories should have been stored'
+        finally:
+            session.close()
+        # Store a listing old enough to be trusted
+        os.utime(self.__tmp__, (0, 0))
+        PathIndex().items(self.__tmp__)
+        # A file sneaked in without changing the mtime should not be seen, since the stored listing is used
+        open(os.path.join(self.__tmp__, 'new.mkv'), 'w').close()
+        os.utime(self.__tmp__, (0, 0))
+        assert self.names(PathIndex()) == ['dir'], 'Directory was listed again'
+
+
+class TestPathIndexConcurrent(FlexGetBase):
+
+    def setup(self):
+        # Threads have connections of their own, which can not share an in-memory database
+        self.tmpdir = tempfile.mkdtemp()
+        self.database_uri = 'sqlite:///%s' % os.path.join(self.tmpdir, 'test.sqlite')
+        self.path = os.path.join(self.tmpdir, 'movies')
+        for name in ('a', 'b', 'c'):
+            os.makedirs(os.path.join(self.path, name))
+        FlexGetBase.setup(self)
+
+    def teardown(self):
+        FlexGetBase.teardown(self)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_task_holding_write_lock(self):
+        index = PathIndex()
+        writing = threading.Event()
+
+        def writing_task():
+            session = Session()
+            try:
+                # Takes the database write lock, like a task which has already written in this phase
+                session.add(SimpleKeyValue('task', 'test', 'key', 'value'))
+                session.flush()
+                writing.set()
+                # Let the other task get to storing its listings first
+                time.sleep(0.3)
+                index.items(self.path, session=session)
+                session.commit()
+            finally:
+                session.close()
+
+        def scanning_task():
+            writing.wait(5)
+            session = Session()
+            try:
+                index.items(self.path, session=session)
+                session.commit()
+            finally:
+                session.close()
+
+        threads = [threading.Thread(target=writing_task), threading.Thread(target=scanning_task)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        assert not any(thread.is_alive() for thread in threads), 'Tasks should not deadlock on the index'
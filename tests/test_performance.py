@@ -0,0 +1,43 @@
+from __future__ import unicode_literals, division, absolute_import
+import sys
+
+from tests import FlexGetBase
+from flexget.plugins.cli import performance
+from flexget.plugins.cli.performance import get_records
+
+
+class TestPerformance(FlexGetBase):
+    __yaml__ = """
+        tasks:
+          test:
+            mock:
+              - {title: 'entry 1'}
+              - {title: 'entry 2'}
+            seen: yes
+            accept_all: yes
+    """
+
+    def test_records(self):
+        self.execute_task('test')
+        records = dict(((r['phase'], r['plugin']), r) for r in get_records('test'))
+        assert ('input', 'mock') in records, 'Should have recorded input plugin'
+        assert records[('input', 'mock')]['entries_out'] == 2
+        assert records[('filter', 'seen')]['entries_in'] == 2
+        assert records[('filter', 'seen')]['queries'] > 0, 'seen filter should have ran database queries'
+        assert self.task.performance, 'Records should be available from the task'
+
+    def test_cpu_time(self):
+        self.execute_task('test')
+        if sys.platform.startswith('linux'):
+            assert all('cpu_time' in r for r in self.task.performance), 'Linux should measure per thread cpu time'
+        rusage_thread = performance.RUSAGE_THREAD
+        performance.RUSAGE_THREAD = None
+        try:
+            self.execute_task('test')
+            assert all('cpu_time' in r for r in self.task.performance), 'Process cpu time is fine for one worker'
+            self.manager.config['task_workers'] = 2
+            self.execute_task('test')
+            assert not any('cpu_time' in r for r in self.task.performance), \
+                'Process cpu time should not be recorded for concurrent tasks'
+        finally:
+            performance.RUSAGE_THREAD = rusage_thread
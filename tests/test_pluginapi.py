@@ -1,12 +1,15 @@
 from __future__ import unicode_literals, division, absolute_import
 import os
+import sys
 import glob
+import shutil
+import tempfile
 
 from nose.tools import raises
 
 from tests import FlexGetBase
 from flexget import plugin, plugins
-from flexget.event import event
+from flexget.event import event, remove_event_handlers
 
 
 class TestPluginApi(object):
@@ -80,3 +83,57 @@ class TestExternalPluginLoading(FlexGetBase):
     def test_external_plugin_loading(self):
         self.execute_task('ext_plugin')
         assert self.task.find_entry(title='test entry'), 'External plugin did not create entry'
+
+
+class TestLazyPluginLoading(FlexGetBase):
+    __yaml__ = """
+        tasks:
+          lazy:
+            lazy_plugin: lazy entry
+    """
+
+    module = 'flexget.plugins.lazy_plugin'
+
+    def setup(self):
+        self.manifest = os.path.join(tempfile.mkdtemp(), 'plugin_manifest.json')
+        os.environ['FLEXGET_PLUGIN_PATH'] = os.path.join(self.base_path, 'lazy_plugins')
+        os.environ['FLEXGET_PLUGIN_MANIFEST'] = self.manifest
+        # First load imports everything and writes the manifest
+        plugin.load_plugins(lazy=True)
+        assert os.path.exists(self.manifest), 'Manifest was not written'
+        # Forget the module, as if this was a new process
+        del sys.modules[self.module]
+        del plugin.plugins['lazy_plugin']
+        remove_event_handlers('plugin.lazy_plugin.input')
+        plugin.load_plugins(lazy=True)
+        super(TestLazyPluginLoading, self).setup()
+
+    def teardown(self):
+        del os.environ['FLEXGET_PLUGIN_PATH']
+        del os.environ['FLEXGET_PLUGIN_MANIFEST']
+        shutil.rmtree(os.path.dirname(self.manifest))
+        # Forget the plugin, so the next test loads it from scratch
+        plugin.plugins.pop('lazy_plugin', None)
+        sys.modules.pop(self.module, None)
+        remove_event_handlers('plugin.lazy_plugin.input')
+        super(TestLazyPluginLoading, self).teardown()
+
+    def test_lazy_loading(self):
+        assert isinstance(plugin.plugins['lazy_plugin'], plugin.LazyPluginInfo), 'Plugin should not be loaded yet'
+        assert self.module not in sys.modules, 'Module should not have been imported'
+        self.execute_task('lazy')
+        assert self.task.find_entry(title='lazy entry'), 'Lazy plugin did not create entry'
+        assert self.module in sys.modules
+        assert not isinstance(plugin.plugins['lazy_plugin'], plugin.LazyPluginInfo)
+
+    def test_manifest_written_in_place(self):
+        assert os.listdir(os.path.dirname(self.manifest)) == ['plugin_manifest.json'], \
+            'Temporary manifest should have been renamed in place'
+
+    def test_invalid_manifest(self):
+        dirs = plugin._get_standard_plugins_path()
+        assert plugin._read_manifest(dirs), 'Written manifest should be valid'
+        for content in ('{"version": 1, "eag', '[]'):
+            with open(self.manifest, 'w') as f:
+                f.write(content)
+            assert plugin._read_manifest(dirs) is None, 'Invalid manifest should be treated as missing'
@@ -1,6 +1,7 @@
 from __future__ import unicode_literals, division, absolute_import
 from tests import FlexGetBase
-from flexget.utils.qualities import Quality
+from flexget.utils.qualities import (Quality, Requirements, ComponentMatcher, _resolutions, _sources, _codecs,
+                                     _audios)
 
 
 class TestQualityModule(object):
@@ -83,6 +84,29 @@ class TestQualityParser(object):
             quality = Quality(item[0]).name
             assert quality == item[1], '`%s` quality should be `%s` not `%s`' % (item[0], item[1], quality)
 
+    def test_matcher(self):
+        """All components of a type are found in one scan, at the same place searching for each would find them"""
+        for text in ['show.s01e01.720p.hdtv.x264-grp', 'movie.2010.1080p.bluray.dts-hd.ma.x264',
+                     'show.hdtv.720p.hdtvrip.dvdrip', 'movie.web.dl.webrip.hdcam.r5']:
+            for components in (_resolutions, _sources, _codecs, _audios):
+                found = ComponentMatcher(components).find_all(text)
+                for i, component in enumerate(components):
+                    match = component.regexp.search(text)
+                    assert (match.span(1) if match else None) == found.get(i), \
+                        '%s should be found at %s in %s' % (component, match and match.span(1), text)
+
+    def test_requirements_cache(self):
+        first = Requirements('720p+ hdtv|webdl !h264')
+        second = Requirements('720p+ hdtv|webdl !h264')
+        assert second.text == first.text
+        for req in (first, second):
+            assert req.allows('1080p hdtv')
+            assert not req.allows('720p hdtv h264')
+            assert not req.allows('480p webdl')
+        # Changing one must not affect requirements created later
+        first.parse_requirements('bluray')
+        assert Requirements('720p+ hdtv|webdl !h264').allows('720p hdtv')
+
 
 class TestFilterQuality(FlexGetBase):
 
@@ -0,0 +1,42 @@
+from __future__ import unicode_literals, division, absolute_import
+
+from nose.tools import assert_raises
+
+from flexget.utils import template
+from flexget.utils.template import render_from_entry, RenderError
+from tests import FlexGetBase
+
+
+class TestRenderFromEntry(FlexGetBase):
+    __yaml__ = """
+        tasks:
+          test:
+            mock:
+              - {title: 'Some.Title', url: 'http://localhost/'}
+    """
+
+    def setup(self):
+        super(TestRenderFromEntry, self).setup()
+        self.execute_task('test')
+        self.entry = self.task.find_entry(title='Some.Title')
+
+    def test_plain_string(self):
+        assert template.is_plain('/path/to/dir')
+        assert render_from_entry('/path/to/dir', self.entry) == '/path/to/dir'
+
+    def test_string_replacement(self):
+        assert template.is_plain('%(title)s.torrent')
+        assert render_from_entry('%(title)s.torrent', self.entry) == 'Some.Title.torrent'
+        assert_raises(RenderError, render_from_entry, '%(missing)s', self.entry)
+
+    def test_jinja(self):
+        assert not template.is_plain('{{title}}.torrent')
+        assert render_from_entry('{{title}}.torrent', self.entry) == 'Some.Title.torrent'
+        # Jinja drops the trailing newline, so such strings can't take the fast path
+        assert not template.is_plain('text\n')
+        assert render_from_entry('text\n', self.entry) == 'text'
+
+    def test_compiled_once(self):
+        compiled = template.get_template_from_string('{{url}}')
+        assert template.get_template_from_string('{{url}}') is compiled, 'Template should come from cache'
+        assert render_from_entry('{{url}}', self.entry) == 'http://localhost/'
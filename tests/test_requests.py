@@ -0,0 +1,45 @@
+from __future__ import unicode_literals, division, absolute_import
+import os
+import time
+import urllib
+
+from nose.tools import assert_raises
+
+from flexget.utils import requests
+
+
+class TestTokenBucket(object):
+    def test_reserve(self):
+        bucket = requests.TokenBucket(10)
+        assert bucket.time_until_ready() == 0, 'First slot should be available right away'
+        assert bucket.reserve() == 0
+        assert bucket.time_until_ready() > 9, 'Next slot should be about 10 seconds away'
+        # Reserving again hands out the slot after that one
+        wait = bucket.reserve()
+        assert 9 < wait <= 10, 'Expected to wait for the next slot, got %s' % wait
+
+
+class TestSubmit(object):
+    def setup(self):
+        self.url = 'file:' + urllib.pathname2url(os.path.join(os.path.dirname(__file__), 'rss.xml'))
+
+    def test_results_in_order(self):
+        session = requests.Session()
+        futures = session.map('get', [self.url] * 5)
+        for future in futures:
+            assert future.result(timeout=10).content.startswith(b'<?xml'), 'Should have returned file contents'
+
+    def test_exception(self):
+        session = requests.Session()
+        future = session.submit('get', 'file:///does/not/exist')
+        assert_raises(requests.RequestException, future.result, 10)
+
+    def test_domain_delay(self):
+        session = requests.Session()
+        session.set_domain_delay('rss.xml', '0.2 seconds')
+        start = time.time()
+        futures = session.map('get', [self.url] * 3)
+        for future in futures:
+            future.result(timeout=10)
+        # Three requests with a delay between each should take at least two intervals
+        assert time.time() - start >= 0.4, 'Domain delay was not honored'
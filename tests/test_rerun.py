@@ -0,0 +1,83 @@
+from __future__ import unicode_literals, division, absolute_import
+
+from flexget import plugin
+from flexget.entry import Entry
+from flexget.event import event
+from tests import FlexGetBase
+
+
+class CountingInput(object):
+    """Fake input plugin which counts how many times it has been ran."""
+
+    runs = 0
+
+    def on_task_input(self, task, config):
+        CountingInput.runs += 1
+        entry = Entry(title='counted', url='http://test/counted')
+        entry['tags'] = ['first']
+        return [entry]
+
+
+class RequeryInput(object):
+    """Fake input plugin which needs to be ran again on reruns."""
+
+    runs = 0
+
+    @plugin.requery_on_rerun
+    def on_task_input(self, task, config):
+        RequeryInput.runs += 1
+        return [Entry(title='requery %s' % RequeryInput.runs, url='http://test/requery')]
+
+
+class ModifyTags(object):
+    def on_task_filter(self, task, config):
+        for entry in task.entries:
+            if 'tags' in entry:
+                entry['tags'].append('filter')
+
+
+@event('plugin.register')
+def register():
+    plugin.register(CountingInput, 'test_counting_input', debug=True, api_ver=2)
+    plugin.register(RequeryInput, 'test_requery_input', debug=True, api_ver=2)
+    plugin.register(ModifyTags, 'test_modify_tags', debug=True, api_ver=2)
+
+
+class TestRerunInput(FlexGetBase):
+
+    __yaml__ = """
+        tasks:
+          test:
+            test_counting_input: yes
+            test_requery_input: yes
+            test_modify_tags: yes
+            accept_all: yes
+            rerun: 2
+            # Entries accepted on the first run would be rejected as seen on reruns
+            disable_builtins: [seen]
+    """
+
+    def setup(self):
+        FlexGetBase.setup(self)
+        CountingInput.runs = 0
+        RequeryInput.runs = 0
+
+    def test_input_reused(self):
+        self.execute_task('test')
+        assert self.task._rerun_count == 2, 'Task should have been rerun twice'
+        assert CountingInput.runs == 1, 'Input should only run once, ran %s times' % CountingInput.runs
+        entry = self.task.find_entry('accepted', title='counted')
+        assert entry, 'Reused entry should have been accepted again on the last rerun'
+        assert entry['tags'] == ['first', 'filter'], 'Changes made on earlier runs leaked: %s' % entry['tags']
+        assert entry.task is self.task
+
+    def test_requery(self):
+        self.execute_task('test')
+        assert RequeryInput.runs == 3, 'Input should run on every rerun, ran %s times' % RequeryInput.runs
+        assert self.task.find_entry('accepted', title='requery 3'), 'Entry from last requery missing'
+        assert not self.task.find_entry(title='requery 1'), 'Entry from first run should not be reused'
+
+    def test_entry_operations(self):
+        self.execute_task('test')
+        entry = self.task.find_entry('accepted', title='counted')
+        assert entry.get('accepted_by') == 'accept_all', 'Hooks should be added to reused entries on reruns'
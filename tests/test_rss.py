@@ -1,6 +1,7 @@
 from __future__ import unicode_literals, division, absolute_import
+import re
 import yaml
-from tests import FlexGetBase
+from tests import FlexGetBase, with_filecopy
 from nose.plugins.attrib import attr
 
 
@@ -34,6 +35,10 @@ class TestInputRSS(FlexGetBase):
           test_all_entries_yes:
             rss:
               all_entries: yes
+          test_all_entries_no_changed:
+            rss:
+              url: rss_changed.xml
+              all_entries: no
     """
 
     def test_rss(self):
@@ -119,6 +124,50 @@ class TestInputRSS(FlexGetBase):
         self.execute_task('test_all_entries_no')
         assert not self.task.entries, 'No entries should have been produced the second run.'
 
+    @with_filecopy('rss.xml', 'rss_changed.xml')
+    def test_all_entries_no_changed(self):
+        self.execute_task('test_all_entries_no_changed')
+        assert self.task.entries, 'Entries should have been produced on first run.'
+        from flexget.utils.cached_input import cached
+        cached.cache.clear()
+        # Remove the newest item, and add a new one
+        with open('rss_changed.xml') as f:
+            content = f.read()
+        content = re.sub(r'<item>.*?</item>', '<item><title>New</title><link>http://localhost/new</link></item>',
+                         content, count=1, flags=re.DOTALL)
+        with open('rss_changed.xml', 'w') as f:
+            f.write(content)
+        self.execute_task('test_all_entries_no_changed')
+        assert len(self.task.entries) == 1, 'Only the new item should have been produced the second run.'
+        assert self.task.find_entry(title='New')
+
+    def test_all_entries_no_upgrade(self):
+        from flexget.manager import Session
+        from flexget.utils.cached_input import cached
+        from flexget.utils.simple_persistence import SimpleKeyValue
+        self.execute_task('test_all_entries_no')
+        cached.cache.clear()
+        # Replace the remembered items with the newest item only, like older versions stored
+        session = Session()
+        try:
+            stored = session.query(SimpleKeyValue).filter(SimpleKeyValue.task == 'test_all_entries_no').\
+                filter(SimpleKeyValue.key.like('%_entry_ids')).one()
+            url_hash = stored.key[:-len('_entry_ids')]
+            entry_ids = stored.value
+            session.delete(stored)
+            session.add(SimpleKeyValue('test_all_entries_no', 'rss', '%s_last_entry' % url_hash, entry_ids[2]))
+            session.commit()
+        finally:
+            session.close()
+        self.execute_task('test_all_entries_no')
+        assert self.task.entries, 'Items newer than the remembered one should have been produced.'
+        for entry in self.task.entries:
+            assert any(entry_id.startswith(entry['title']) for entry_id in entry_ids[:2]), \
+                '%s is older than the remembered item, it should have been skipped' % entry['title']
+        cached.cache.clear()
+        self.execute_task('test_all_entries_no')
+        assert not self.task.entries, 'All items should be remembered after upgrading.'
+
     def test_all_entries_yes(self):
         self.execute_task('test_all_entries_yes')
         assert self.task.entries, 'Entries should have been produced on first run.'
@@ -0,0 +1,205 @@
+from __future__ import unicode_literals, division, absolute_import
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import sqlalchemy
+
+from flexget import plugin
+from flexget.event import event
+from flexget.manager import Session, db_write_lock, acquire_write_lock, release_write_lock, \
+    release_write_lock_on_reset
+from flexget.utils.simple_persistence import SimpleKeyValue
+from tests import FlexGetBase
+
+
+def write_lock_free():
+    """Returns whether another thread could take the database write lock."""
+    result = []
+
+    def try_lock():
+        result.append(db_write_lock.acquire(False))
+        if result[0]:
+            db_write_lock.release()
+
+    thread = threading.Thread(target=try_lock)
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+class TrackRunning(object):
+    """Fake input plugin which records the tasks running at the same time as it."""
+
+    lock = threading.Lock()
+    running = []
+    runs = []
+    max_running = 0
+    overlapped = False
+
+    def on_task_input(self, task, config):
+        cls = TrackRunning
+        with cls.lock:
+            if task.name in cls.running:
+                cls.overlapped = True
+            cls.running.append(task.name)
+            cls.runs.append(task.name)
+            cls.max_running = max(cls.max_running, len(cls.running))
+        time.sleep(config)
+        with cls.lock:
+            cls.running.remove(task.name)
+        return []
+
+
+class WriteLockHeld(object):
+    """
+    Fake plugin which writes to the database, and records whether the write lock is still held in a later phase.
+    Aborts the task afterwards when configured with `abort`.
+    """
+
+    held = None
+
+    def on_task_filter(self, task, config):
+        task.session.add(SimpleKeyValue(task.name, 'test', 'key', 'value'))
+        task.session.flush()
+
+    def on_task_output(self, task, config):
+        WriteLockHeld.held = not write_lock_free()
+        if config == 'abort':
+            task.abort('test abort')
+
+
+@event('plugin.register')
+def register():
+    plugin.register(TrackRunning, 'test_track_running', debug=True, api_ver=2)
+    plugin.register(WriteLockHeld, 'test_write_lock_held', debug=True, api_ver=2)
+
+
+class TestScheduler(FlexGetBase):
+
+    __yaml__ = """
+        task_workers: 2
+        tasks:
+          test1:
+            test_track_running: 0.5
+            seen: local
+          test2:
+            test_track_running: 0.5
+            seen: local
+    """
+
+    def setup(self):
+        # Worker threads have connections of their own, which can not share an in-memory database
+        self.tmpdir = tempfile.mkdtemp()
+        self.database_uri = 'sqlite:///%s' % os.path.join(self.tmpdir, 'test.sqlite')
+        FlexGetBase.setup(self)
+        TrackRunning.running = []
+        TrackRunning.runs = []
+        TrackRunning.max_running = 0
+        TrackRunning.overlapped = False
+
+    def teardown(self):
+        FlexGetBase.teardown(self)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_num_workers(self):
+        scheduler = self.manager.scheduler
+        assert scheduler.num_workers == 2
+        del self.manager.config['task_workers']
+        assert scheduler.num_workers == 1, 'There should be one worker by default'
+
+    def test_get_job_exclusive(self):
+        scheduler = self.manager.scheduler
+        scheduler.execute(options={'tasks': ['test1']})
+        scheduler.execute(options={'tasks': ['test1']})
+        first = scheduler.get_job(timeout=0)
+        assert first.task == 'test1'
+        assert scheduler.get_job(timeout=0) is None, 'Second job of a running task should not be started'
+        assert len(scheduler.waiting_jobs['test1']) == 1, 'Second job should wait for the first one to finish'
+        scheduler.job_done(first)
+        assert first.finished_event.is_set()
+        second = scheduler.get_job(timeout=0)
+        assert second is not None and second is not first, 'Waiting job should have been queued again'
+        scheduler.job_done(second)
+        assert not scheduler.running_tasks
+        assert not scheduler.run_queue.unfinished_tasks
+
+    def test_workers(self):
+        # Tasks with a modified config write in their start phase, and hold the write lock until they end
+        for task in ('test1', 'test2'):
+            self.execute_task(task)
+        TrackRunning.runs = []
+        TrackRunning.max_running = 0
+        scheduler = self.manager.scheduler
+        finished = scheduler.execute(options={'tasks': ['test1', 'test2']})
+        finished.extend(scheduler.execute(options={'tasks': ['test1']}))
+        scheduler.start(run_schedules=False)
+        for finished_event in finished:
+            assert finished_event.wait(30), 'Jobs should have finished'
+        assert sorted(TrackRunning.runs) == ['test1', 'test1', 'test2']
+        assert TrackRunning.max_running == 2, 'Different tasks should run at the same time'
+        assert not TrackRunning.overlapped, 'Same task should never run twice at the same time'
+
+
+class TestWriteLock(FlexGetBase):
+
+    __yaml__ = """
+        tasks:
+          test:
+            test_write_lock_held: yes
+          test_abort:
+            test_write_lock_held: abort
+    """
+
+    def setup(self):
+        FlexGetBase.setup(self)
+        WriteLockHeld.held = None
+        self.tmpdir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        FlexGetBase.teardown(self)
+
+    def stored(self, task):
+        session = Session()
+        try:
+            return session.query(SimpleKeyValue).filter(SimpleKeyValue.task == task).count()
+        finally:
+            session.close()
+
+    def test_released_after_task(self):
+        self.execute_task('test')
+        assert WriteLockHeld.held, 'Write lock should be held until the task ends'
+        assert write_lock_free(), 'Write lock should have been released when the task ended'
+        assert self.stored('test') == 1
+
+    def test_abort_rolls_back_task(self):
+        self.execute_task('test_abort', abort_ok=True)
+        assert self.task.aborted
+        assert write_lock_free()
+        assert self.stored('test_abort') == 0, 'Writes of earlier phases should be rolled back by an abort'
+
+    def test_held_per_connection(self):
+        # Two databases, so both connections can write at once
+        connections = []
+        for name in ('first', 'second'):
+            engine = sqlalchemy.create_engine('sqlite:///%s' % os.path.join(self.tmpdir, name + '.sqlite'))
+            sqlalchemy.event.listen(engine, 'before_cursor_execute', acquire_write_lock)
+            sqlalchemy.event.listen(engine, 'commit', release_write_lock)
+            sqlalchemy.event.listen(engine, 'rollback', release_write_lock)
+            sqlalchemy.event.listen(engine.pool, 'reset', release_write_lock_on_reset)
+            engine.execute('CREATE TABLE test (value TEXT)')
+            conn = engine.connect()
+            connections.append((conn, conn.begin()))
+        try:
+            for conn, transaction in connections:
+                conn.execute('INSERT INTO test VALUES (?)', ('test',))
+            connections[0][1].commit()
+            assert not write_lock_free(), 'Write lock should be held until both connections end their transaction'
+            connections[1][1].commit()
+            assert write_lock_free()
+        finally:
+            for conn, transaction in connections:
+                conn.close()
@@ -145,3 +145,21 @@ class TestFilterSeenMovies(FlexGetBase):
         self.execute_task('strict')
         assert len(self.task.rejected) == 1, 'Too many movies were rejected'
         assert not self.task.find_entry(title='Seen movie title 10'), 'strict should not have passed movie 10'
+
+
+class TestSeenManyEntries(FlexGetBase):
+
+    # More values than fit in one query
+    __yaml__ = """
+        tasks:
+          test:
+            accept_all: yes
+            mock:
+    """ + ''.join("""
+              - {title: 'Item %s', url: 'http://localhost/item%s'}""" % (i, i) for i in range(600))
+
+    def test_many_entries(self):
+        self.execute_task('test')
+        assert len(self.task.accepted) == 600, 'all entries should have been accepted'
+        self.execute_task('test')
+        assert len(self.task.rejected) == 600, 'all entries should have been rejected as seen'
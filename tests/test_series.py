@@ -1788,3 +1788,39 @@ class TestSpecials(FlexGetBase):
         entry = self.task.find_entry(title='the show SOMETHING')
         assert entry.get('series_id_type') != 'special', 'Entry which should not have been flagged as a special was.'
         assert not entry.accepted, 'Entry which should not have been accepted was.'
+
+
+class TestBulkStore(FlexGetBase):
+
+    __yaml__ = """
+        tasks:
+          test:
+            mock:
+              - {title: 'Bulk Show S01E01 720p', url: 'http://test/1'}
+              - {title: 'Bulk Show S01E01 720p', url: 'http://test/2'}
+              - {title: 'Bulk Show S01E01 HDTV', url: 'http://test/3'}
+              - {title: 'Bulk Show S01E02-E03 HDTV', url: 'http://test/4'}
+              - {title: 'Other Show S01E01 HDTV', url: 'http://test/5'}
+            series:
+              - bulk show
+              - other show
+            disable_builtins: [seen]
+    """
+
+    def count_rows(self):
+        from flexget.plugins.filter.series import Episode, Release
+        from flexget.manager import Session
+        session = Session()
+        try:
+            return session.query(Episode).count(), session.query(Release).count()
+        finally:
+            session.close()
+
+    def test_rows_stored_once(self):
+        self.execute_task('test')
+        # Entries with the same title share a release, double episodes get one for each episode
+        assert self.count_rows() == (4, 5), 'Expected 4 episodes and 5 releases, got %s' % (self.count_rows(),)
+        assert len(self.task.find_entry(title='Bulk Show S01E02-E03 HDTV')['series_releases']) == 2
+        # Existing rows are reused on the next run
+        self.execute_task('test')
+        assert self.count_rows() == (4, 5), 'Rows were duplicated on the second run: %s' % (self.count_rows(),)
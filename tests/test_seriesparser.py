@@ -2,7 +2,8 @@
 
 from __future__ import unicode_literals, division, absolute_import
 from nose.tools import assert_raises, raises
-from flexget.utils.titles import SeriesParser, ParseWarning
+from flexget.utils import qualities
+from flexget.utils.titles import SeriesParser, SeriesNameIndex, ParseWarning
 
 #
 # NOTE:
@@ -616,3 +617,51 @@ class TestSeriesParser(object):
         assert s.episode == 14
         assert s.quality.name == '720p hdtv h264 aac'
         assert not s.proper, 'detected proper'
+
+    def test_shared_regexps(self):
+        """SeriesParser: parsers with the same custom regexps share compiled regexps"""
+        s1 = SeriesParser(name='Show (US)', ep_regexps=['chapter (\\d+)'])
+        s2 = SeriesParser(name='Show (US)', ep_regexps=['chapter (\\d+)'])
+        assert s1.ep_regexps is s2.ep_regexps
+        s1.parse('Show US chapter 5')
+        s2.parse('Show chapter 5')
+        assert s1.valid and s1.episode == 5
+        assert s2.strict_name, 'Name with parenthetical should turn on exact mode'
+        assert s1.name_regexps[0] is s2.name_regexps[0]
+
+    def test_parse_cache(self):
+        """SeriesParser: repeated parses give the same results, without sharing state between parsers"""
+        for i in range(2):
+            s = SeriesParser(name='Something Interesting')
+            s.parse('Something.Interesting.S01E02.Proper.720p-FlexGet')
+            assert s.valid and s.season == 1 and s.episode == 2
+            assert s.quality.name == '720p'
+            assert s.proper_count == 1
+        # Quality given to the parser is only used when none is found from the data
+        s.parse('Something.Interesting.S01E03-FlexGet', quality=qualities.Quality('1080p'))
+        assert s.episode == 3 and s.quality.name == '1080p'
+        s.parse('Something.Interesting.S01E03-FlexGet')
+        assert not s.quality, 'Quality from the earlier parse should not be used'
+        # Parsers with a different configuration do not use the same results, warnings are raised on each parse
+        s = SeriesParser(name='Something Interesting', identified_by='sequence')
+        for i in range(2):
+            assert_raises(ParseWarning, s.parse, 'Something.Interesting.S01E02.Proper.720p-FlexGet')
+            assert not s.valid
+
+
+class TestSeriesNameIndex(object):
+
+    def test_candidates(self):
+        show = SeriesParser('The Show', alternate_names=['Completely Different'])
+        us_show = SeriesParser('Other Show (US)')
+        and_show = SeriesParser('Tom and Jerry')
+        custom = SeriesParser('Custom', name_regexps=['cust.m'])
+        index = SeriesNameIndex([show, us_show, and_show, custom])
+
+        assert index.candidates('The.Show.S01E01') == set([show, custom])
+        assert index.candidates('TheShow S01E01') == set([show, custom])
+        assert index.candidates('[group] Completely_Different - 01') == set([show, custom])
+        assert index.candidates('Other Show (UK) S01E01') == set([us_show, custom])
+        assert index.candidates('Tom & Jerry S01E01') == set([and_show, custom])
+        # Name must be at the start of the title
+        assert index.candidates('Not The Show S01E01') == set([custom])
@@ -1,4 +1,9 @@
 from __future__ import unicode_literals, division, absolute_import
+import os
+import shutil
+import tempfile
+import threading
+import time
 
 from flexget.manager import Session
 from flexget.utils.simple_persistence import SimplePersistence
@@ -40,3 +45,84 @@ class TestSimplePersistence(FlexGetBase):
         # Make sure it didn't commit or close our session
         session.rollback()
         assert 'aoeu' not in persist
+
+    def test_flush(self):
+        from flexget.utils.simple_persistence import SimpleKeyValue, flush
+        persist = SimplePersistence('testplugin')
+        persist['aoeu'] = 'test'
+        persist['snth'] = 'test'
+        del persist['snth']
+        flush()
+        session = Session()
+        try:
+            values = dict((skv.key, skv.value) for skv in
+                          session.query(SimpleKeyValue).filter(SimpleKeyValue.plugin == 'testplugin'))
+        finally:
+            session.close()
+        assert values == {'aoeu': 'test'}, 'Changes should have been written to the database'
+
+    def test_flush_after_task(self):
+        from flexget.utils.simple_persistence import SimpleKeyValue
+        persist = SimplePersistence('testplugin')
+        persist['aoeu'] = 'test'
+        # Daemon never completes an execution, task completion should be enough
+        self.execute_task('test')
+        session = Session()
+        try:
+            assert session.query(SimpleKeyValue).filter(SimpleKeyValue.plugin == 'testplugin').\
+                filter(SimpleKeyValue.key == 'aoeu').first(), 'Changes should be written when a task completes'
+        finally:
+            session.close()
+
+
+class TestConcurrentFlush(FlexGetBase):
+
+    __yaml__ = """
+        tasks: {}
+    """
+
+    def setup(self):
+        # Threads have connections of their own, which can not share an in-memory database
+        self.tmpdir = tempfile.mkdtemp()
+        self.database_uri = 'sqlite:///%s' % os.path.join(self.tmpdir, 'test.sqlite')
+        FlexGetBase.setup(self)
+
+    def teardown(self):
+        FlexGetBase.teardown(self)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_flush_while_writing(self):
+        from flexget.utils.simple_persistence import SimpleKeyValue, flush
+        persist = SimplePersistence('testplugin')
+        persist['flushed'] = 'test'
+        writing = threading.Event()
+        flushing = threading.Event()
+
+        def task():
+            session = Session()
+            try:
+                # Takes the database write lock, like a task in the middle of a phase
+                session.add(SimpleKeyValue('task', 'testplugin', 'key', 'value'))
+                session.flush()
+                writing.set()
+                flushing.wait(5)
+                time.sleep(0.2)
+                persist['changed'] = 'test'
+                session.commit()
+            finally:
+                session.close()
+
+        def flusher():
+            writing.wait(5)
+            flushing.set()
+            flush()
+
+        threads = [threading.Thread(target=task), threading.Thread(target=flusher)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        assert not any(thread.is_alive() for thread in threads), 'Flushing while a task writes should not deadlock'
+        flush()
+        assert SimplePersistence('testplugin')['changed'] == 'test'
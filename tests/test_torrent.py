@@ -1,9 +1,11 @@
 from __future__ import unicode_literals, division, absolute_import
 import os
+import hashlib
 
 from nose.plugins.attrib import attr
+from nose.tools import assert_raises
 from tests import FlexGetBase, with_filecopy
-from flexget.utils.bittorrent import Torrent
+from flexget.utils.bittorrent import Torrent, bdecode, bencode
 
 
 class TestInfoHash(FlexGetBase):
@@ -36,6 +38,33 @@ class TestInfoHash(FlexGetBase):
         assert self.task.all_entries[1]['torrent_info_hash'] == '2B3959BED2BE445BB0E3EA96F497D873D5FAED05'
 
 
+class TestBencode(object):
+
+    def test_roundtrip(self):
+        data = {'announce': 'http://tracker', 'info': {'name': 'caf\xe9', 'length': 10, 'pieces': b'\xff\x00' * 10},
+                'announce-list': [['a', 'b'], ['c']]}
+        encoded = bencode(data)
+        assert encoded.startswith(b'd8:announce14:http://tracker'), 'Keys should be sorted'
+        decoded = bdecode(encoded)
+        assert decoded == data
+        assert isinstance(decoded['info']['pieces'], bytes), 'pieces should be left as bytes'
+        assert isinstance(decoded['info']['name'], unicode), 'strings should be decoded'
+
+    def test_invalid(self):
+        for data in [b'd3:abc', b'i12', b'5:ab', b'x', b'i1ei2e', b'l']:
+            assert_raises(SyntaxError, bdecode, data)
+
+    def test_info_hash_original_encoding(self):
+        # Keys are not sorted, so encoding the info dictionary again would give a different hash
+        info = b'd6:lengthi10e4:name4:test12:piece lengthi1e6:pieces2:\xff\x00e'
+        content = b'd4:info' + info + b'e'
+        torrent = Torrent(content)
+        assert torrent.info_hash == hashlib.sha1(info).hexdigest().upper()
+        torrent.content['info']['name'] = 'changed'
+        torrent.modified = True
+        assert torrent.info_hash == hashlib.sha1(bencode(torrent.content['info'])).hexdigest().upper()
+
+
 class TestSeenInfoHash(FlexGetBase):
 
     __yaml__ = """
@@ -0,0 +1,34 @@
+from __future__ import unicode_literals, division, absolute_import
+from mock import patch
+
+from flexget.plugins.filter import torrent_alive
+
+
+class TestScrape(object):
+
+    def setup(self):
+        torrent_alive.scrape_cache.clear()
+
+    def test_batched(self):
+        hashes = {'http://a/announce': ['AA', 'BB', 'AA'], 'udp://b:80': ['BB']}
+        with patch('flexget.plugins.filter.torrent_alive.scrape') as scrape:
+            scrape.side_effect = lambda tracker, info_hashes: dict((h, 5) for h in info_hashes if h == 'AA')
+            results = torrent_alive.scrape_trackers(hashes)
+            assert scrape.call_count == 2, 'Each tracker should be scraped once'
+            assert results == {('http://a/announce', 'AA'): 5}, 'Unanswered torrents should be left out'
+            # Results are cached
+            assert torrent_alive.scrape_trackers({'http://a/announce': ['AA']}) == results
+            assert scrape.call_count == 2, 'Cached results should not be scraped again'
+
+    def test_failed_not_cached(self):
+        hashes = {'http://a/announce': ['AA']}
+        with patch('flexget.plugins.filter.torrent_alive.scrape') as scrape:
+            scrape.side_effect = IOError('timed out')
+            assert torrent_alive.scrape_trackers(hashes) == {}
+            scrape.side_effect = lambda tracker, info_hashes: {'AA': 3}
+            assert torrent_alive.scrape_trackers(hashes) == {('http://a/announce', 'AA'): 3}
+            assert scrape.call_count == 2, 'Failed scrape should be tried again'
+
+    def test_scrape_url(self):
+        url = torrent_alive.get_scrape_url('http://a/announce?key=1', ['AA' * 20, 'BB' * 20])
+        assert url == 'http://a/scrape?key=1&info_hash=%s&info_hash=%s' % ('%AA' * 20, '%BB' * 20)